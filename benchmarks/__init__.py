@@ -0,0 +1,9 @@
+"""
+Hive benchmark suite. Run from the repository root:
+
+    python -m benchmarks --output run.json
+    python -m benchmarks --compare baseline.json run.json
+
+Workers are replaced by zero-sleep stubs, so the numbers measure the hive's
+own overhead (dispatch, storage, messaging, dashboard API).
+"""
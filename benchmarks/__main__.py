@@ -0,0 +1,102 @@
+import argparse
+import json
+import logging
+import os
+import platform
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from benchmarks.report import compare
+
+BENCHMARKS = ("dispatch", "latency", "memory", "bus", "api")
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run(names, quick, workdir, storage="sqlite"):
+    from benchmarks.api import bench_api
+    from benchmarks.bus import bench_bus
+    from benchmarks.dispatch import bench_dispatch, bench_latency
+    from benchmarks.memory import bench_memory
+
+    scale = 0.1 if quick else 1.0
+    suite = {
+        "dispatch": lambda: bench_dispatch(workdir, tasks=int(2000 * scale), storage=storage),
+        "latency": lambda: bench_latency(workdir, tasks=int(500 * scale), storage=storage),
+        "memory": lambda: bench_memory(workdir, ops=int(2000 * scale), storage=storage),
+        "bus": lambda: bench_bus(messages=int(100000 * scale)),
+        "api": lambda: bench_api(workdir, sizes=(1000, 10000) if quick else (1000, 10000, 100000)),
+    }
+    results = {}
+    for name in names:
+        print(f"[bench] {name}...", file=sys.stderr)
+        results[name] = suite[name]()
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description="Benchmark the hive core with zero-sleep stub workers")
+    parser.add_argument("--only", default=",".join(BENCHMARKS), help=f"comma-separated subset of {','.join(BENCHMARKS)}")
+    parser.add_argument("--quick", action="store_true", help="about a tenth of the default sizes")
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    parser.add_argument("--compare", nargs=2, metavar=("BASELINE", "CURRENT"), help="compare two reports instead of running")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative regression for --compare")
+    parser.add_argument("--storage", choices=["sqlite", "memory"], default="sqlite",
+                        help="storage engine for the dispatch, latency and memory benchmarks")
+    parser.add_argument("--verbose", action="store_true", help="keep the hive's INFO logging")
+    args = parser.parse_args()
+
+    if args.compare:
+        with open(args.compare[0]) as f:
+            baseline = json.load(f)["results"]
+        with open(args.compare[1]) as f:
+            current = json.load(f)["results"]
+        rows, regressions = compare(baseline, current, args.tolerance)
+        for metric, old, new, change in rows:
+            flag = "  REGRESSION" if metric in regressions else ""
+            print(f"{metric:60} {old:>12} -> {new:>12} {change:+.1%}{flag}")
+        sys.exit(1 if regressions else 0)
+
+    names = [name.strip() for name in args.only.split(",") if name.strip()]
+    unknown = set(names) - set(BENCHMARKS)
+    if unknown:
+        parser.error(f"unknown benchmarks: {', '.join(sorted(unknown))}")
+    if not args.verbose:
+        logging.getLogger("HiveCore").setLevel(logging.WARNING)
+
+    root = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix="hive-bench-") as workdir:
+        # Work in a scratch directory so nothing touches the real hive_memory.db or current_session.txt
+        os.chdir(workdir)
+        try:
+            started = time.time()
+            results = run(names, args.quick, workdir, args.storage)
+        finally:
+            os.chdir(root)
+
+    report = {
+        "meta": {
+            "timestamp": started,
+            "git_revision": git_revision(),
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "quick": args.quick,
+            "storage": args.storage,
+        },
+        "results": results,
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,31 @@
+import os
+from hive_core import SharedMemory
+from benchmarks.report import SAMPLE_DESCRIPTIONS, fresh_db, percentiles, timed
+
+def bench_api(workdir, sizes=(1000, 10000, 100000), requests=50):
+    """/api/data response time (full page, and the 304 path) versus session size."""
+    import dashboard
+
+    results = {}
+    previous = dashboard.DB_PATH
+    try:
+        for size in sizes:
+            path = fresh_db(workdir, f"api_{size}")
+            memory = SharedMemory(path)
+            session_id = f"bench-{size}"
+            memory.create_tasks_bulk(({"description": SAMPLE_DESCRIPTIONS[i % 9], "priority": i % 5} for i in range(size)),
+                                     session_id=session_id)
+            memory.close()
+
+            # The dashboard follows the session in current_session.txt; the suite runs inside workdir
+            with open(os.path.join(workdir, "current_session.txt"), "w") as f:
+                f.write(session_id)
+            dashboard.DB_PATH = path
+            client = dashboard.app.test_client()
+            version = client.get("/api/data").get_json()["version"]
+            full = timed(lambda: client.get("/api/data"), requests)
+            not_modified = timed(lambda: client.get(f"/api/data?since_version={version}"), requests)
+            results[str(size)] = {"full": percentiles(full), "not_modified": percentiles(not_modified)}
+    finally:
+        dashboard.DB_PATH = previous
+    return results
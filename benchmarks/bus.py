@@ -0,0 +1,26 @@
+import time
+from hive_core import Message, MessageBus, MessageType
+from benchmarks.report import rate
+
+def bench_bus(messages=100000, subscribers=64, executors=("sync", "thread", "asyncio")):
+    """Publish rate (publish() returning) and delivery rate (all handlers run) per executor."""
+    results = {}
+    for executor in executors:
+        bus = MessageBus(executor=executor)
+        agent_ids = [f"agent-{i}" for i in range(subscribers)]
+        for agent_id in agent_ids:
+            bus.subscribe(agent_id, lambda message: None)
+        content = {"task_id": "t", "status": "COMPLETED", "result": "ok"}
+        start = time.perf_counter()
+        for i in range(messages):
+            bus.publish(Message("bench", agent_ids[i % subscribers], MessageType.TASK_RESULT, content))
+        published = time.perf_counter() - start
+        bus.join()
+        delivered = time.perf_counter() - start
+        bus.shutdown()
+        results[executor] = {
+            "messages": messages,
+            "publish_per_sec": rate(messages, published),
+            "delivered_per_sec": rate(messages, delivered),
+        }
+    return results
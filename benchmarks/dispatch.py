@@ -0,0 +1,74 @@
+import time
+import uuid
+from hive_core import MessageBus
+from queen import QueenAgent
+from benchmarks.report import SAMPLE_DESCRIPTIONS, open_store, percentiles, rate
+from storage import COMPLETED_AT, CREATED_AT
+from benchmarks.stubs import stub_workers
+
+def _wait_for_completion(memory, session_id, count, timeout):
+    deadline = time.monotonic() + timeout
+    done = 0
+    while time.monotonic() < deadline:
+        done = memory.status_counts(session_id).get("COMPLETED", 0)
+        if done >= count:
+            break
+        time.sleep(0.02)
+    memory.flush()
+    return done
+
+def _latencies(memory, session_id):
+    rows = [(task[CREATED_AT], task[COMPLETED_AT]) for task in memory.get_session_tasks(session_id, "COMPLETED")]
+    return [completed - created for created, completed in rows], max((completed for _, completed in rows), default=None)
+
+def _run_hive(workdir, name, inject, count, timeout, storage):
+    memory = open_store(workdir, name, storage)
+    bus = MessageBus()
+    # SessionControl is per session id and stop() cancels it, so every run gets its own
+    session_id = f"bench-{uuid.uuid4()}"
+    with stub_workers():
+        start = time.time()
+        queen = None
+        try:
+            queen = inject(memory, session_id, lambda: QueenAgent("Queen-Bench", memory, bus, session_id=session_id))
+            done = _wait_for_completion(memory, session_id, count, timeout)
+            latencies, finished = _latencies(memory, session_id)
+        finally:
+            if queen:
+                queen.stop()
+            bus.shutdown(wait=False)
+            memory.close()
+    return start, done, latencies, finished
+
+def bench_dispatch(workdir, tasks=2000, timeout=120, storage="sqlite"):
+    """Burst: inject every task up front, then measure how fast the Queen drains them."""
+    def inject(memory, session_id, start_queen):
+        memory.create_tasks_bulk(({"description": SAMPLE_DESCRIPTIONS[i % len(SAMPLE_DESCRIPTIONS)], "priority": i % 5}
+                                  for i in range(tasks)), session_id=session_id)
+        return start_queen()
+
+    start, done, latencies, finished = _run_hive(workdir, "dispatch", inject, tasks, timeout, storage)
+    elapsed = (finished - start) if finished else None
+    return {
+        "tasks": tasks,
+        "completed": done,
+        "elapsed_s": round(elapsed, 3) if elapsed else None,
+        "tasks_per_sec": rate(done, elapsed) if elapsed else None,
+        # Includes queueing, since the whole burst is pending at once
+        "queued_latency": percentiles(latencies),
+    }
+
+def bench_latency(workdir, tasks=500, per_second=100, timeout=120, storage="sqlite"):
+    """Paced: inject at a steady rate below capacity and measure created_at -> completed_at."""
+    def inject(memory, session_id, start_queen):
+        queen = start_queen()
+        interval = 1.0 / per_second
+        next_at = time.monotonic()
+        for i in range(tasks):
+            memory.create_task(SAMPLE_DESCRIPTIONS[i % len(SAMPLE_DESCRIPTIONS)], session_id=session_id)
+            next_at += interval
+            time.sleep(max(0.0, next_at - time.monotonic()))
+        return queen
+
+    _, done, latencies, _ = _run_hive(workdir, "latency", inject, tasks, timeout, storage)
+    return {"tasks": tasks, "offered_per_sec": per_second, "completed": done, "latency": percentiles(latencies)}
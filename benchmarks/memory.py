@@ -0,0 +1,44 @@
+import uuid
+from benchmarks.report import SAMPLE_DESCRIPTIONS, open_store, rate, timed, percentiles
+
+def bench_memory(workdir, ops=2000, storage="sqlite"):
+    """Operations/sec for each storage method, against a file database or the in-memory engine."""
+    memory = open_store(workdir, "memory", storage)
+    session_id = "bench"
+    agent_id = str(uuid.uuid4())
+    results = {}
+
+    def measure(name, fn, count=ops):
+        durations = timed(fn, count)
+        total = sum(durations)
+        results[name] = dict(ops=count, ops_per_sec=rate(count, total), **percentiles(durations))
+
+    def measure_write_behind(name, fn, count=ops):
+        # Queued writes: time the submits plus the flush that lands them
+        durations = timed(fn, count)
+        durations += timed(memory.flush, 1)
+        results[name] = {"ops": count, "ops_per_sec": rate(count, sum(durations))}
+
+    try:
+        ids = []
+        measure("create_task", lambda: ids.append(memory.create_task(SAMPLE_DESCRIPTIONS[len(ids) % 9], session_id=session_id)))
+        bulk = ops * 10
+        seconds = sum(timed(lambda: memory.create_tasks_bulk(({"description": SAMPLE_DESCRIPTIONS[i % 9]} for i in range(bulk)),
+                                                              session_id=session_id), 1))
+        results["create_tasks_bulk"] = {"ops": bulk, "ops_per_sec": rate(bulk, seconds)}
+
+        measure("get_pending_tasks", lambda: memory.get_pending_tasks(session_id=session_id), max(ops // 100, 10))
+        measure("get_task_statuses", lambda: memory.get_task_statuses(ids[:100]))
+        assign = iter(ids)
+        measure("assign_task", lambda: memory.assign_task(next(assign), agent_id), len(ids) // 2)
+        measure("claim_next_task", lambda: memory.claim_next_task(session_id=session_id, agent_id=agent_id))
+        progress = iter(ids * 5)
+        measure_write_behind("update_task_progress", lambda: memory.update_task_progress(next(progress), 50), len(ids) * 5)
+        complete = iter(ids)
+        measure_write_behind("complete_task", lambda: memory.complete_task(next(complete), "ok"), len(ids))
+        measure_write_behind("log_action", lambda: memory.log_action(agent_id, "BENCH", "details", session_id=session_id))
+        measure("set_system_state", lambda: memory.set_system_state("status", "RUNNING", session_id))
+        measure("get_system_state", lambda: memory.get_system_state("status", session_id))
+    finally:
+        memory.close()
+    return results
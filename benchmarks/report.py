@@ -0,0 +1,79 @@
+import os
+import time
+
+# One description per role, cycled to build workloads that exercise every agent type
+SAMPLE_DESCRIPTIONS = [
+    "Design Microservice Layout",
+    "Implement Payment Service",
+    "Test Auth Service",
+    "Analyze Database Performance",
+    "Research Quantum Algorithms",
+    "Visualize Signal Spectrogram",
+    "Calculate Variance and Standard Deviation",
+    "Document API Endpoints",
+    "Cite Epidemiological Studies",
+]
+
+def fresh_db(workdir, name):
+    path = os.path.join(workdir, f"{name}.db")
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+    return path
+
+def open_store(workdir, name, storage="sqlite"):
+    # A fresh store for one benchmark: a new database file, or an empty in-memory engine
+    from hive_core import open_storage
+    return open_storage(storage, fresh_db(workdir, name) if storage == "sqlite" else None)
+
+def percentiles(values, points=(50, 90, 99)):
+    # Nearest-rank percentiles plus max, in milliseconds
+    if not values:
+        return {}
+    values = sorted(values)
+    summary = {f"p{p}_ms": round(values[min(len(values) - 1, int(len(values) * p / 100))] * 1000, 3) for p in points}
+    summary["max_ms"] = round(values[-1] * 1000, 3)
+    return summary
+
+def rate(count, seconds):
+    return round(count / seconds, 1) if seconds > 0 else None
+
+def timed(fn, repeat):
+    # Per-call durations in seconds
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        durations.append(time.perf_counter() - start)
+    return durations
+
+def flatten(results, prefix=""):
+    flat = {}
+    for key, value in results.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(flatten(value, name + "."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = value
+    return flat
+
+def higher_is_better(metric):
+    return metric.endswith("per_sec")
+
+def compare(baseline, current, tolerance=0.2):
+    """
+    Compare two result dicts metric by metric. Rates (…per_sec) should not
+    drop and timings (…_ms) should not grow by more than `tolerance`.
+    Returns (rows, regressions) where rows are (metric, old, new, change).
+    """
+    old, new = flatten(baseline), flatten(current)
+    rows, regressions = [], []
+    for metric in sorted(old.keys() & new.keys()):
+        if not (higher_is_better(metric) or metric.endswith("_ms")) or not old[metric]:
+            continue
+        change = (new[metric] - old[metric]) / old[metric]
+        rows.append((metric, old[metric], new[metric], change))
+        worse = -change if higher_is_better(metric) else change
+        if worse > tolerance:
+            regressions.append(metric)
+    return rows, regressions
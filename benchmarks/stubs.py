@@ -0,0 +1,24 @@
+from contextlib import contextmanager
+from queen import AgentFactory
+
+def stub_class(agent_class):
+    # Same role and capabilities, but perform_work returns immediately and never fails
+    def perform_work(self, task):
+        return f"Stubbed {task['description']}"
+    return type(f"Stub{agent_class.__name__}", (agent_class,), {"perform_work": perform_work})
+
+@contextmanager
+def stub_workers():
+    """Swap every registered agent class for its zero-sleep stub, on threads."""
+    agent_types = dict(AgentFactory.AGENT_TYPES)
+    backends = dict(AgentFactory.BACKENDS)
+    try:
+        for role, (agent_class, prefix) in agent_types.items():
+            AgentFactory.register(role, stub_class(agent_class), prefix)
+        AgentFactory.BACKENDS.clear()
+        yield
+    finally:
+        AgentFactory.AGENT_TYPES.clear()
+        AgentFactory.AGENT_TYPES.update(agent_types)
+        AgentFactory.BACKENDS.clear()
+        AgentFactory.BACKENDS.update(backends)
@@ -0,0 +1,74 @@
+import argparse
+import csv
+import json
+import sys
+import time
+from hive_core import BulkInputConsumed, SharedMemory
+
+DB_PATH = "hive_memory.db"
+
+# Columns holding lists; in CSV they are separated by LIST_SEP
+LIST_FIELDS = ("deps", "dep_ids")
+LIST_SEP = ";"
+
+def default_session():
+    try:
+        with open("current_session.txt", "r") as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        return "default"
+
+def read_jsonl(f):
+    for line_no, line in enumerate(f, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            task = json.loads(line)
+        except ValueError as e:
+            raise ValueError(f"line {line_no}: {e}")
+        yield check_task(task, line_no)
+
+def read_csv(f):
+    for line_no, row in enumerate(csv.DictReader(f), 2):
+        task = {k: v for k, v in row.items() if k and v not in (None, "")}
+        for field in LIST_FIELDS:
+            if field in task:
+                task[field] = [item.strip() for item in task[field].split(LIST_SEP) if item.strip()]
+        yield check_task(task, line_no)
+
+def check_task(task, line_no):
+    if not isinstance(task, dict) or not task.get("description"):
+        raise ValueError(f"line {line_no}: a task needs a description")
+    if "priority" in task:
+        task["priority"] = int(task["priority"])
+    return task
+
+def main():
+    parser = argparse.ArgumentParser(description="Load a JSONL or CSV task file into the hive in one transaction")
+    parser.add_argument("file", help="task file, or - for stdin")
+    parser.add_argument("--format", choices=["jsonl", "csv"], help="defaults to the file extension")
+    parser.add_argument("--db", default=DB_PATH)
+    parser.add_argument("--session", default=None, help="defaults to the running hive's session")
+    parser.add_argument("--namespace", default="default")
+    args = parser.parse_args()
+
+    fmt = args.format or ("csv" if args.file.lower().endswith(".csv") else "jsonl")
+    session_id = args.session or default_session()
+    f = sys.stdin if args.file == "-" else open(args.file, newline="", encoding="utf-8")
+    memory = SharedMemory(args.db)
+    try:
+        reader = read_csv(f) if fmt == "csv" else read_jsonl(f)
+        start = time.time()
+        count = memory.create_tasks_bulk(reader, namespace=args.namespace, session_id=session_id)
+        print(f"Injected {count} tasks into session {session_id} in {time.time() - start:.2f}s")
+    except (ValueError, BulkInputConsumed) as e:
+        print(f"Error: {e}; nothing was injected.")
+        sys.exit(1)
+    finally:
+        memory.close()
+        if f is not sys.stdin:
+            f.close()
+
+if __name__ == "__main__":
+    main()
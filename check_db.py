@@ -1,5 +1,5 @@
-import sqlite3
 import os
+from hive_core import connect
 
 if not os.path.exists("current_session.txt"):
     print("current_session.txt not found")
@@ -10,7 +10,7 @@ with open("current_session.txt", "r") as f:
 
 print(f"Checking DB for Session ID: {session_id}")
 
-conn = sqlite3.connect("hive_memory.db")
+conn = connect("hive_memory.db")
 c = conn.cursor()
 
 c.execute("SELECT count(*) FROM agents WHERE session_id = ?", (session_id,))
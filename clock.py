@@ -0,0 +1,244 @@
+import heapq
+import itertools
+import logging
+import random
+import threading
+import time
+
+logger = logging.getLogger("HiveCore")
+
+class RealClock:
+    """
+    Wall-clock time. Everything that sleeps or timestamps in the hive goes
+    through a clock (SharedMemory.clock), so a run can be replayed faster
+    than real time by swapping in a ScaledClock or SimulatedClock.
+
+    With a seed, rng(key) hands out a generator per key (e.g. per task), so
+    simulated durations and failures don't depend on thread interleaving.
+    """
+    def __init__(self, seed=None):
+        self.seed = seed
+
+    def time(self) -> float:
+        return time.time()
+
+    def monotonic(self) -> float:
+        return time.monotonic()
+
+    def sleep(self, seconds: float):
+        time.sleep(seconds)
+
+    def wait(self, cond: threading.Condition, timeout: float = None, max_real: float = None) -> bool:
+        # cond.wait() with the timeout in clock seconds; max_real caps the real wait (for polling)
+        return cond.wait(_shortest(timeout, max_real))
+
+    def notify_all(self, cond: threading.Condition):
+        # cond.notify_all() for conditions waited on with wait(); the caller holds `cond`
+        cond.notify_all()
+
+    def touch(self):
+        # Something happened that may lead to new sleepers; only SimulatedClock cares
+        pass
+
+    def hold(self, count: int = 1):
+        # Work is in flight (e.g. an undelivered message); SimulatedClock won't advance until released
+        pass
+
+    def release(self, count: int = 1):
+        pass
+
+    def rng(self, key):
+        if self.seed is None:
+            return random
+        return random.Random(f"{self.seed}:{key}")
+
+class ScaledClock(RealClock):
+    """Real time sped up by `speed`: a 3s sleep takes 3/speed seconds, timestamps advance speed times faster."""
+    def __init__(self, speed: float, seed=None, start: float = None):
+        super().__init__(seed)
+        if speed <= 0:
+            raise ValueError("speed must be positive")
+        self.speed = speed
+        self._start = time.time() if start is None else start
+        self._origin = time.monotonic()
+
+    def time(self) -> float:
+        return self._start + self.monotonic()
+
+    def monotonic(self) -> float:
+        return (time.monotonic() - self._origin) * self.speed
+
+    def sleep(self, seconds: float):
+        time.sleep(max(0.0, seconds) / self.speed)
+
+    def wait(self, cond: threading.Condition, timeout: float = None, max_real: float = None) -> bool:
+        return cond.wait(_shortest(None if timeout is None else max(0.0, timeout) / self.speed, max_real))
+
+class SimulatedClock(RealClock):
+    """
+    Discrete-event clock. Virtual time stands still while the hive is busy
+    and jumps straight to the earliest pending wake-up once it is idle, so
+    hours of simulated work take as long as the hive's own bookkeeping.
+
+    "Busy" is counted with hold()/release(): the MessageBus holds the clock
+    for every message in flight, and a thread gives its hold back while it
+    sleeps or waits on the clock. Time advances only when nothing is held
+    and nothing has happened for `idle_grace` real seconds, so a slow host
+    takes longer but reaches the same virtual times. Holds left unbalanced
+    stop the clock; that is logged after `stall_timeout` real seconds.
+    """
+    def __init__(self, seed=None, start: float = None, idle_grace: float = 0.0002, stall_timeout: float = 5.0,
+                 poll: float = 0.002):
+        super().__init__(seed)
+        self.now = time.time() if start is None else start
+        self._origin = self.now
+        self.idle_grace = idle_grace
+        self.stall_timeout = stall_timeout
+        self.poll = poll
+        self._cond = threading.Condition()
+        self._timers = []       # heap of [wake, seq, live, event, resume]
+        self._waiters = {}      # condition -> {seq: timer} of the threads in wait() on it
+        self._seq = itertools.count()
+        self._activity = 0
+        self._busy = 0
+        self._stopped = False
+        self._thread = threading.Thread(target=self._advance, name="sim-clock", daemon=True)
+        self._thread.start()
+
+    def __reduce__(self):
+        # Virtual time lives in this process's advancer thread; a pool process can't follow it
+        raise TypeError("A SimulatedClock can't be shared with other processes")
+
+    def time(self) -> float:
+        return self.now
+
+    def monotonic(self) -> float:
+        return self.now - self._origin
+
+    def sleep(self, seconds: float):
+        if seconds <= 0:
+            return
+        with self._cond:
+            self._release(1)
+            timer = self._add_timer(self.now + seconds, resume=True)
+        # Each sleeper waits on its own event, so an advance only wakes the threads that are due
+        timer[3].wait()
+
+    def wait(self, cond: threading.Condition, timeout: float = None, max_real: float = None) -> bool:
+        # The caller holds `cond`; poll it briefly so we also notice virtual time passing.
+        # Whatever ends the wait in virtual terms (our timeout firing, or notify_all through
+        # the clock) takes our hold back at once, so time can't move on before we have run
+        with self._cond:
+            self._release(1)
+            if timeout is None:
+                timer = [None, next(self._seq), True, threading.Event(), True]
+            else:
+                timer = self._add_timer(self.now + max(0.0, timeout), resume=True)
+            self._waiters.setdefault(cond, {})[timer[1]] = timer
+        started = time.monotonic()
+        try:
+            while True:
+                if cond.wait(_shortest(self.poll, max_real)):
+                    return True
+                if not timer[2]:
+                    # The clock ended the wait (notify_all racing our poll timing out, or the timeout firing)
+                    return timeout is None or self.now < timer[0]
+                if max_real is not None and time.monotonic() - started >= max_real:
+                    return False
+        finally:
+            with self._cond:
+                self._waiters.get(cond, {}).pop(timer[1], None)
+                if timer[2]:
+                    # Back on real time (max_real) or a plain notify: take the hold ourselves
+                    timer[2] = False
+                    self._busy += 1
+                self._activity += 1
+
+    def notify_all(self, cond: threading.Condition):
+        with self._cond:
+            for timer in self._waiters.pop(cond, {}).values():
+                if timer[2]:
+                    timer[2] = False
+                    self._busy += 1
+            self._activity += 1
+        cond.notify_all()
+
+    def touch(self):
+        with self._cond:
+            self._activity += 1
+
+    def hold(self, count: int = 1):
+        with self._cond:
+            self._busy += count
+            self._activity += 1
+
+    def release(self, count: int = 1):
+        with self._cond:
+            self._release(count)
+
+    def _release(self, count):
+        self._busy -= count
+        self._activity += 1
+        if self._busy <= 0:
+            self._cond.notify_all()
+
+    def stop(self):
+        with self._cond:
+            self._stopped = True
+            for timer in self._timers:
+                timer[3].set()
+            self._cond.notify_all()
+
+    def _add_timer(self, wake: float, resume: bool = False):
+        # resume: the advancer takes the hold back on the sleeper's behalf when it fires
+        timer = [wake, next(self._seq), True, threading.Event(), resume]
+        if self._stopped:
+            timer[3].set()
+            return timer
+        heapq.heappush(self._timers, timer)
+        self._activity += 1
+        self._cond.notify_all()
+        return timer
+
+    def _advance(self):
+        with self._cond:
+            while not self._stopped:
+                while self._timers and not self._timers[0][2]:
+                    heapq.heappop(self._timers)
+                if not self._timers:
+                    self._cond.wait()
+                    continue
+                seen = self._activity
+                if self._busy > 0:
+                    # Work in flight: time stands still however long it takes the host
+                    self._cond.wait(self.stall_timeout)
+                    if self._activity == seen and self._busy > 0:
+                        logger.warning(f"Simulated clock held for {self.stall_timeout}s with no activity ({self._busy} holds)")
+                    continue
+                self._cond.wait(self.idle_grace)
+                if self._activity != seen or self._busy > 0 or not self._timers or not self._timers[0][2]:
+                    continue
+                self.now = max(self.now, self._timers[0][0])
+                # Release everything due at the new time in one step
+                while self._timers and self._timers[0][0] <= self.now:
+                    timer = heapq.heappop(self._timers)
+                    if timer[2] and timer[4]:
+                        self._busy += 1
+                    timer[2] = False
+                    timer[3].set()
+
+def _shortest(a, b):
+    if a is None:
+        return b
+    if b is None:
+        return a
+    return min(a, b)
+
+def make_clock(mode: str = "real", speed: float = None, seed=None):
+    if mode == "real":
+        return RealClock(seed)
+    if mode == "scaled":
+        return ScaledClock(speed or 10.0, seed)
+    if mode == "simulated":
+        return SimulatedClock(seed)
+    raise ValueError(f"Unknown clock: {mode}")
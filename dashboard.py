@@ -1,7 +1,13 @@
-import sqlite3
 import os
 import json
-from flask import Flask, jsonify, render_template_string, request
+import time
+import gzip
+import queue
+import sqlite3
+import threading
+from flask import Flask, Response, jsonify, render_template_string, request
+from hive_core import connect, summarize_sessions, SESSION_HISTORY_QUERY
+import metrics
 
 app = Flask(__name__)
 DB_PATH = "hive_memory.db"
@@ -28,6 +34,7 @@ HTML_TEMPLATE = """
         .status-IN_PROGRESS { color: #2196f3; }
         .status-COMPLETED { color: #4caf50; }
         .status-FAILED { color: #f44336; }
+        .status-RETRY_SCHEDULED { color: #ff9800; }
         .log-entry { font-family: monospace; font-size: 0.9em; border-bottom: 1px solid #333; padding: 5px 0; }
         .timestamp { color: #888; margin-right: 10px; }
         .agent-id { color: #00bcd4; font-weight: bold; }
@@ -85,6 +92,7 @@ HTML_TEMPLATE = """
                     <thead><tr><th>Description</th><th>Status</th><th>Progress</th><th>Output</th></tr></thead>
                     <tbody></tbody>
                 </table>
+                <button id="btn-older" class="tab-btn" style="display: none; margin-top: 10px;" onclick="loadOlderTasks()">Load older</button>
             </div>
         </div>
 
@@ -99,9 +107,13 @@ HTML_TEMPLATE = """
         <h1>📜 Session History</h1>
         <div class="card">
             <table id="history-table">
-                <thead><tr><th>Session ID</th><th>Tasks</th><th>Start Time</th></tr></thead>
+                <thead><tr><th>Session ID</th><th>Tasks</th><th>Completed</th><th>Tasks/s</th><th>Start Time</th></tr></thead>
                 <tbody></tbody>
             </table>
+            <div style="margin-top: 10px;">
+                <button id="history-prev" class="tab-btn" onclick="loadHistory(historyPage - 1)">Prev</button>
+                <button id="history-next" class="tab-btn" onclick="loadHistory(historyPage + 1)">Next</button>
+            </div>
         </div>
     </div>
 
@@ -125,76 +137,132 @@ HTML_TEMPLATE = """
             if(tab === 'history') loadHistory();
         }
 
+        function setSystemStatus(status) {
+            currentStatus = status;
+            const statusEl = document.getElementById('system-status');
+            const btnEl = document.getElementById('btn-control');
+            statusEl.innerText = currentStatus;
+            if(currentStatus === "PAUSED") {
+                statusEl.style.color = "orange";
+                btnEl.innerText = "RESUME";
+                btnEl.className = "control-btn btn-resume";
+            } else {
+                statusEl.style.color = "#4caf50";
+                btnEl.innerText = "PAUSE";
+                btnEl.className = "control-btn btn-pause";
+            }
+        }
+
+        // Rows are keyed by id and updated in place, so a delta only touches what changed
+        function upsertRow(tbody, prefix, id, html, prepend) {
+            let tr = document.getElementById(prefix + id);
+            if(!tr) {
+                tr = document.createElement('tr');
+                tr.id = prefix + id;
+                if(prepend) tbody.prepend(tr); else tbody.appendChild(tr);
+            }
+            tr.innerHTML = html;
+        }
+
+        function renderAgent(agent) {
+            upsertRow(document.querySelector('#agent-table tbody'), 'agent-', agent[0], `
+                <td class="agent-id">${agent[0].substring(0, 8)}...</td>
+                <td>${agent[1]}</td>
+                <td class="status-${agent[2]}">${agent[2]}</td>`);
+        }
+
+        function renderTask(t, prepend) {
+            const progress = t[4] || 0;
+            let outputBtn = '-';
+            if(t[5]) {
+                outputBtn = `<button onclick="viewOutput('${t[5]}')">View</button>`;
+            }
+            upsertRow(document.querySelector('#task-table tbody'), 'task-', t[0], `
+                <td>${t[1]}</td>
+                <td class="status-${t[3]}">${t[3]}</td>
+                <td>
+                    <div class="progress-bar"><div class="progress-fill" style="width:${progress}%"></div></div>
+                    ${progress}%
+                </td>
+                <td>${outputBtn}</td>`, prepend);
+        }
+
+        // logs arrive newest first; keep the latest 20 on screen
+        function renderLogs(logs) {
+            const logContainer = document.getElementById('log-container');
+            logs.slice().reverse().forEach(log => {
+                if(document.getElementById('log-' + log[0])) return;
+                const date = new Date(log[4] * 1000).toLocaleTimeString();
+                const entry = document.createElement('div');
+                entry.className = 'log-entry';
+                entry.id = 'log-' + log[0];
+                entry.innerHTML = `<span class="timestamp">[${date}]</span>
+                    <span class="agent-id">${log[1].substring(0, 8)}</span>
+                    <span class="action">${log[2]}</span>: ${log[3]}`;
+                logContainer.prepend(entry);
+            });
+            while(logContainer.children.length > 20) logContainer.lastChild.remove();
+        }
+
+        function applySnapshot(data) {
+            document.getElementById('session-display').innerText = `Session: ${data.session_id || 'N/A'}`;
+            setSystemStatus(data.system_status);
+            document.querySelector('#agent-table tbody').innerHTML = '';
+            document.querySelector('#task-table tbody').innerHTML = '';
+            document.getElementById('log-container').innerHTML = '';
+            data.agents.forEach(renderAgent);
+            data.tasks.forEach(t => renderTask(t, false));
+            renderLogs(data.logs);
+            setNextAfter(data.next_after);
+        }
+
+        function applyDelta(delta) {
+            if(delta.system_status) setSystemStatus(delta.system_status);
+            (delta.agents || []).forEach(renderAgent);
+            (delta.tasks || []).forEach(t => renderTask(t, true));
+            if(delta.logs) renderLogs(delta.logs);
+        }
+
+        // Fallback for browsers without EventSource: poll, skipping unchanged versions (304)
+        let dataVersion = '';
         function updateDashboard() {
             if(!document.getElementById('live').classList.contains('active')) return;
 
-            fetch('/api/data')
+            fetch(`/api/data?since_version=${encodeURIComponent(dataVersion)}`)
+                .then(response => response.status === 304 ? null : response.json())
+                .then(data => {
+                    if(!data) return;
+                    dataVersion = data.version;
+                    applySnapshot(data);
+                });
+        }
+
+        function loadOlderTasks() {
+            if(!nextAfter) return;
+            fetch(`/api/data?after=${encodeURIComponent(nextAfter)}`)
                 .then(response => response.json())
                 .then(data => {
-                    document.getElementById('session-display').innerText = `Session: ${data.session_id || 'N/A'}`;
-                    
-                    // Update System Status
-                    currentStatus = data.system_status;
-                    const statusEl = document.getElementById('system-status');
-                    const btnEl = document.getElementById('btn-control');
-                    statusEl.innerText = currentStatus;
-                    if(currentStatus === "PAUSED") {
-                        statusEl.style.color = "orange";
-                        btnEl.innerText = "RESUME";
-                        btnEl.className = "control-btn btn-resume";
-                    } else {
-                        statusEl.style.color = "#4caf50";
-                        btnEl.innerText = "PAUSE";
-                        btnEl.className = "control-btn btn-pause";
-                    }
-
-                    // Agents
-                    const agentTable = document.querySelector('#agent-table tbody');
-                    agentTable.innerHTML = '';
-                    data.agents.forEach(agent => {
-                        const row = `<tr>
-                            <td class="agent-id">${agent[0].substring(0, 8)}...</td>
-                            <td>${agent[1]}</td>
-                            <td class="status-${agent[2]}">${agent[2]}</td>
-                        </tr>`;
-                        agentTable.innerHTML += row;
-                    });
+                    data.tasks.forEach(t => renderTask(t, false));
+                    setNextAfter(data.next_after);
+                });
+        }
 
-                    // Tasks
-                    const taskTable = document.querySelector('#task-table tbody');
-                    taskTable.innerHTML = '';
-                    data.tasks.forEach(t => {
-                        const progress = t[4] || 0;
-                        let outputBtn = '-';
-                        if(t[5]) {
-                            outputBtn = `<button onclick="viewOutput('${t[5]}')">View</button>`;
-                        }
-                        
-                        const row = `<tr>
-                            <td>${t[1]}</td>
-                            <td class="status-${t[3]}">${t[3]}</td>
-                            <td>
-                                <div class="progress-bar"><div class="progress-fill" style="width:${progress}%"></div></div>
-                                ${progress}%
-                            </td>
-                            <td>${outputBtn}</td>
-                        </tr>`;
-                        taskTable.innerHTML += row;
-                    });
+        let nextAfter = null;
+        function setNextAfter(cursor) {
+            nextAfter = cursor;
+            document.getElementById('btn-older').style.display = cursor ? 'inline-block' : 'none';
+        }
 
-                    // Logs
-                    const logContainer = document.getElementById('log-container');
-                    logContainer.innerHTML = '';
-                    data.logs.forEach(log => {
-                        const date = new Date(log[4] * 1000).toLocaleTimeString();
-                        const entry = `<div class="log-entry">
-                            <span class="timestamp">[${date}]</span>
-                            <span class="agent-id">${log[1].substring(0, 8)}</span>
-                            <span class="action">${log[2]}</span>: ${log[3]}
-                        </div>`;
-                        logContainer.innerHTML += entry;
-                    });
-                });
+        let stream = null;
+        function connectStream() {
+            stream = new EventSource('/api/stream');
+            stream.addEventListener('snapshot', e => applySnapshot(JSON.parse(e.data)));
+            stream.addEventListener('delta', e => applyDelta(JSON.parse(e.data)));
+            stream.addEventListener('reset', () => {
+                // New session or we fell behind: reconnect for a fresh snapshot
+                stream.close();
+                setTimeout(connectStream, 500);
+            });
         }
 
         function toggleSystem() {
@@ -203,19 +271,24 @@ HTML_TEMPLATE = """
                 method: 'POST',
                 headers: {'Content-Type': 'application/json'},
                 body: JSON.stringify({action: action})
-            }).then(() => updateDashboard());
+            }).then(() => { if(!stream) updateDashboard(); });
         }
 
-        function loadHistory() {
-            fetch('/api/history')
+        let historyPage = 1;
+        function loadHistory(page) {
+            if(page) historyPage = page;
+            fetch(`/api/history?page=${historyPage}`)
                 .then(res => res.json())
                 .then(data => {
-                    const tbody = document.querySelector('#history-table tbody');
-                    tbody.innerHTML = '';
-                    data.forEach(h => {
+                    const rows = data.sessions.map(h => {
                         const date = new Date(h.start_time * 1000).toLocaleString();
-                        tbody.innerHTML += `<tr><td>${h.session_id}</td><td>${h.task_count}</td><td>${date}</td></tr>`;
+                        const completed = h.status_counts.COMPLETED || 0;
+                        const throughput = h.throughput ? h.throughput.toFixed(2) : '-';
+                        return `<tr><td>${h.session_id}</td><td>${h.task_count}</td><td>${completed}</td><td>${throughput}</td><td>${date}</td></tr>`;
                     });
+                    document.querySelector('#history-table tbody').innerHTML = rows.join('');
+                    document.getElementById('history-prev').disabled = data.page <= 1;
+                    document.getElementById('history-next').disabled = !data.has_more;
                 });
         }
 
@@ -239,8 +312,12 @@ HTML_TEMPLATE = """
             document.getElementById('modal').style.display = 'none';
         }
 
-        setInterval(updateDashboard, 2000);
-        updateDashboard();
+        if(window.EventSource) {
+            connectStream();
+        } else {
+            setInterval(updateDashboard, 2000);
+            updateDashboard();
+        }
     </script>
 </body>
 </html>
@@ -257,52 +334,281 @@ def get_current_session():
     except FileNotFoundError:
         return None
 
+TASK_COLUMNS = "id, description, assigned_to, status, progress, output_path, created_at"
+DEFAULT_PAGE_SIZE = 200
+MAX_PAGE_SIZE = 1000
+
+def load_tasks(c, session_id, limit=DEFAULT_PAGE_SIZE, after=None, statuses=None):
+    # Keyset page, newest first; `after` is the (created_at, id) of the last row already seen
+    query = f"SELECT {TASK_COLUMNS} FROM tasks WHERE session_id = ?"
+    params = [session_id]
+    if statuses:
+        query += f" AND status IN ({','.join('?' * len(statuses))})"
+        params += statuses
+    if after:
+        query += " AND (created_at < ? OR (created_at = ? AND id < ?))"
+        params += [after[0], after[0], after[1]]
+    query += " ORDER BY created_at DESC, id DESC LIMIT ?"
+    params.append(limit)
+    return c.execute(query, params).fetchall()
+
+def load_snapshot(c, session_id, limit=DEFAULT_PAGE_SIZE, after=None, statuses=None):
+    if not session_id:
+        return {"agents": [], "tasks": [], "logs": [], "session_id": session_id, "system_status": "OFFLINE", "next_after": None}
+
+    c.execute("SELECT id, role, status FROM agents WHERE session_id = ?", (session_id,))
+    agents = c.fetchall()
+    
+    tasks = load_tasks(c, session_id, limit, after, statuses)
+    next_after = f"{tasks[-1][6]!r},{tasks[-1][0]}" if len(tasks) == limit else None
+    
+    c.execute("SELECT id, agent_id, action, details, timestamp FROM logs WHERE session_id = ? ORDER BY timestamp DESC LIMIT 20", (session_id,))
+    logs = c.fetchall()
+    
+    return {"agents": agents, "tasks": tasks, "logs": logs, "session_id": session_id, "system_status": get_system_status(c, session_id), "next_after": next_after}
+
+def get_system_status(c, session_id):
+    c.execute("SELECT value FROM system_state WHERE key = 'status' AND session_id = ?", (session_id,))
+    row = c.fetchone()
+    return row[0] if row else "RUNNING"
+
+def data_version(c, session_id):
+    # Cheap, index-only fingerprint of everything /api/data can show for a session
+    task_seq = c.execute("SELECT COALESCE(MAX(seq), 0) FROM changes WHERE session_id = ?", (session_id,)).fetchone()[0]
+    row = c.execute("SELECT id FROM logs WHERE session_id = ? ORDER BY timestamp DESC LIMIT 1", (session_id,)).fetchone()
+    return f"{task_seq}.{row[0] if row else 0}.{get_system_status(c, session_id)}"
+
+def compact_json_response(payload, etag=None):
+    body = json.dumps(payload, separators=(',', ':')).encode()
+    response = Response(body, mimetype="application/json")
+    if len(body) > 1024 and "gzip" in request.headers.get("Accept-Encoding", ""):
+        response.set_data(gzip.compress(body, compresslevel=5))
+        response.headers["Content-Encoding"] = "gzip"
+    response.headers["Vary"] = "Accept-Encoding"
+    if etag:
+        response.headers["ETag"] = f'W/"{etag}"'
+    return response
+
 @app.route('/api/data')
 def get_data():
     session_id = get_current_session()
-    conn = sqlite3.connect(DB_PATH)
+    limit = min(max(request.args.get('limit', DEFAULT_PAGE_SIZE, type=int), 1), MAX_PAGE_SIZE)
+    statuses = [st for st in request.args.get('status', '').split(',') if st] or None
+    after = None
+    if request.args.get('after'):
+        try:
+            created_at, task_id = request.args['after'].split(',', 1)
+            after = (float(created_at), task_id)
+        except ValueError:
+            return jsonify({"error": "after must be <created_at>,<id>"}), 400
+
+    conn = connect(DB_PATH)
     c = conn.cursor()
-    
-    if session_id:
-        c.execute("SELECT id, role, status FROM agents WHERE session_id = ?", (session_id,))
-        agents = c.fetchall()
-        
-        # Added progress and output_path to query
-        c.execute("SELECT id, description, assigned_to, status, progress, output_path FROM tasks WHERE session_id = ? ORDER BY created_at DESC", (session_id,))
-        tasks = c.fetchall()
-        
-        c.execute("SELECT id, agent_id, action, details, timestamp FROM logs WHERE session_id = ? ORDER BY timestamp DESC LIMIT 20", (session_id,))
-        logs = c.fetchall()
-        
-        # Get System Status
-        c.execute("SELECT value FROM system_state WHERE key = 'status' AND session_id = ?", (session_id,))
-        row = c.fetchone()
-        system_status = row[0] if row else "RUNNING"
-    else:
-        agents = []
-        tasks = []
-        logs = []
-        system_status = "OFFLINE"
-    
+    version = data_version(c, session_id) if session_id else "offline"
+    view = "&".join(f"{k}={v}" for k, v in sorted(request.args.items()) if k != "since_version")
+    etag = f"data-{session_id}-{version}-{view}"
+    # Nothing changed since the caller's copy: skip the queries and the payload
+    if request.args.get('since_version') == version or request.if_none_match.contains_weak(etag):
+        conn.close()
+        response = Response(status=304)
+        response.headers["ETag"] = f'W/"{etag}"'
+        return response
+
+    data = load_snapshot(c, session_id, limit, after, statuses)
     conn.close()
-    return jsonify({"agents": agents, "tasks": tasks, "logs": logs, "session_id": session_id, "system_status": system_status})
+    data["version"] = version
+    return compact_json_response(data, etag)
+
+class ChangeFeed:
+    """
+    One poller shared by every /api/stream client. It follows the hive's
+    `changes` table and the logs id from a cursor, loads only the rows that
+    changed, and pushes the delta to each subscriber of that session, so DB
+    load doesn't grow with the number of open dashboards.
+    """
+    def __init__(self, db_path, interval=0.5, batch=5000):
+        self.db_path = db_path
+        self.interval = interval
+        self.batch = batch
+        self.subscribers = {}
+        self.lock = threading.Lock()
+        self.thread = None
+
+    def subscribe(self, session_id):
+        sub = queue.Queue(maxsize=256)
+        with self.lock:
+            self.subscribers[sub] = session_id
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, daemon=True)
+                self.thread.start()
+        return sub
+
+    def unsubscribe(self, sub):
+        with self.lock:
+            self.subscribers.pop(sub, None)
+
+    def _run(self):
+        try:
+            self._poll()
+        finally:
+            # Whatever stopped the loop, the next subscriber starts a fresh poller
+            with self.lock:
+                self.thread = None
+
+    def _poll(self):
+        conn = connect(self.db_path)
+        c = conn.cursor()
+        cursor = None
+        statuses = {}
+        current = get_current_session()
+        while True:
+            try:
+                if cursor is None:
+                    cursor = (c.execute("SELECT COALESCE(MAX(seq), 0) FROM changes").fetchone()[0],
+                              c.execute("SELECT COALESCE(MAX(id), 0) FROM logs").fetchone()[0])
+            except sqlite3.Error as e:
+                # E.g. the hive hasn't created its schema yet; start from the head once it has
+                app.logger.warning(f"Change feed: {e}")
+            time.sleep(self.interval)
+            with self.lock:
+                sessions = set(self.subscribers.values())
+            if not sessions or cursor is None:
+                continue
+
+            session_id = get_current_session()
+            if session_id != current:
+                # A new hive run started; clients reload from a fresh snapshot
+                current = session_id
+                self._broadcast(None, {"reset": True})
+                continue
+
+            try:
+                cursor = self._push_deltas(c, sessions, cursor, statuses)
+            except sqlite3.Error as e:
+                # A locked or busy DB: the cursor hasn't moved, so the next pass picks the rows up
+                app.logger.warning(f"Change feed: {e}")
+
+    def _push_deltas(self, c, sessions, cursor, statuses):
+        seq, log_id = cursor
+        changes = c.execute("SELECT seq, entity, entity_id, session_id FROM changes WHERE seq > ? ORDER BY seq LIMIT ?", (seq, self.batch)).fetchall()
+        logs = c.execute("SELECT id, agent_id, action, details, timestamp, session_id FROM logs WHERE id > ? ORDER BY id LIMIT ?", (log_id, self.batch)).fetchall()
+        if changes:
+            seq = changes[-1][0]
+        if logs:
+            log_id = logs[-1][0]
+
+        for session in sessions:
+            delta = {}
+            task_ids = {row[2] for row in changes if row[1] == "task" and row[3] == session}
+            agent_ids = {row[2] for row in changes if row[1] == "agent" and row[3] == session}
+            if task_ids:
+                delta["tasks"] = self._fetch(c, f"SELECT {TASK_COLUMNS} FROM tasks", task_ids)
+            if agent_ids:
+                delta["agents"] = self._fetch(c, "SELECT id, role, status FROM agents", agent_ids)
+            session_logs = [row[:5] for row in logs if row[5] == session]
+            if session_logs:
+                delta["logs"] = session_logs[::-1][:20]
+            status = get_system_status(c, session)
+            # Piggy-back the status on every delta so a client never misses a change
+            if delta or statuses.get(session) != status:
+                statuses[session] = status
+                delta["system_status"] = status
+            if delta:
+                self._broadcast(session, delta)
+        return seq, log_id
+
+    @staticmethod
+    def _fetch(c, query, ids):
+        ids = list(ids)
+        rows = []
+        for i in range(0, len(ids), 500):
+            chunk = ids[i:i + 500]
+            rows += c.execute(f"{query} WHERE id IN ({','.join('?' * len(chunk))})", chunk).fetchall()
+        return rows
+
+    def _broadcast(self, session_id, event):
+        with self.lock:
+            targets = [sub for sub, sess in self.subscribers.items() if session_id is None or sess == session_id]
+        for sub in targets:
+            try:
+                sub.put_nowait(event)
+            except queue.Full:
+                # Slow client: make it start over from a snapshot instead of buffering forever
+                self.unsubscribe(sub)
+                try:
+                    sub.get_nowait()
+                except queue.Empty:
+                    pass
+                sub.put_nowait({"reset": True})
+
+feed = ChangeFeed(DB_PATH)
+
+def sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
+
+@app.route('/api/stream')
+def stream():
+    session_id = get_current_session()
+    sub = feed.subscribe(session_id)
+
+    def generate():
+        try:
+            # Subscribe first, then snapshot: anything committed in between arrives
+            # as a delta too, and applying a row twice is harmless
+            conn = connect(DB_PATH)
+            snapshot = load_snapshot(conn.cursor(), session_id)
+            conn.close()
+            yield sse("snapshot", snapshot)
+            while True:
+                try:
+                    event = sub.get(timeout=15)
+                except queue.Empty:
+                    yield ": keepalive\n\n"
+                    continue
+                if event.get("reset"):
+                    yield sse("reset", event)
+                    return
+                yield sse("delta", event)
+        finally:
+            feed.unsubscribe(sub)
+
+    return Response(generate(), mimetype="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+HISTORY_TTL = 5.0
+history_cache = {}
 
 @app.route('/api/history')
 def get_history():
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    # Get distinct sessions
-    c.execute("SELECT DISTINCT session_id FROM tasks")
-    sessions = [row[0] for row in c.fetchall()]
-    history = []
-    for sess in sessions:
-        c.execute("SELECT COUNT(*) FROM tasks WHERE session_id = ?", (sess,))
-        task_count = c.fetchone()[0]
-        c.execute("SELECT MIN(created_at) FROM tasks WHERE session_id = ?", (sess,))
-        start_time = c.fetchone()[0]
-        history.append({"session_id": sess, "task_count": task_count, "start_time": start_time})
-    conn.close()
-    return jsonify(history)
+    page = max(request.args.get('page', 1, type=int), 1)
+    per_page = min(max(request.args.get('per_page', 50, type=int), 1), 500)
+    key = (page, per_page)
+
+    # Serve repeated requests from a short TTL cache; past that, the change
+    # feed's head seq tells us cheaply whether any task moved since
+    cached = history_cache.get(key)
+    now = time.time()
+    if cached is None or cached["expires"] < now:
+        conn = connect(DB_PATH)
+        c = conn.cursor()
+        version = c.execute("SELECT COALESCE(MAX(seq), 0) FROM changes").fetchone()[0]
+        etag = f'W/"history-{version}-{page}-{per_page}"'
+        if cached is None or cached["etag"] != etag:
+            # Fetch one extra row to know whether there is a next page
+            rows = c.execute(SESSION_HISTORY_QUERY, (per_page + 1, (page - 1) * per_page)).fetchall()
+            sessions = summarize_sessions(rows)
+            body = {"sessions": sessions[:per_page], "page": page, "per_page": per_page, "has_more": len(sessions) > per_page}
+            cached = {"etag": etag, "body": json.dumps(body, separators=(',', ':'))}
+        conn.close()
+        cached["expires"] = now + HISTORY_TTL
+        history_cache[key] = cached
+
+    if request.if_none_match.contains_weak(cached["etag"].split('"')[1]):
+        response = Response(status=304)
+    else:
+        response = Response(cached["body"], mimetype="application/json")
+    response.headers["ETag"] = cached["etag"]
+    response.headers["Cache-Control"] = f"max-age={int(HISTORY_TTL)}"
+    return response
 
 @app.route('/api/control', methods=['POST'])
 def control_system():
@@ -310,16 +616,49 @@ def control_system():
     session_id = get_current_session()
     if not session_id: return jsonify({"error": "No active session"}), 400
     
-    conn = sqlite3.connect(DB_PATH)
+    conn = connect(DB_PATH)
     c = conn.cursor()
     if action == "pause":
         c.execute("INSERT OR REPLACE INTO system_state (key, value, session_id) VALUES ('status', 'PAUSED', ?)", (session_id,))
     elif action == "resume":
         c.execute("INSERT OR REPLACE INTO system_state (key, value, session_id) VALUES ('status', 'RUNNING', ?)", (session_id,))
+    elif action == "cancel":
+        c.execute("INSERT OR REPLACE INTO system_state (key, value, session_id) VALUES ('status', 'CANCELLED', ?)", (session_id,))
     conn.commit()
     conn.close()
     return jsonify({"status": "ok"})
 
+# The dashboard runs apart from the hive, so its gauges come from the database;
+# the hive's own histograms and counters are served by `main.py --metrics-port`
+def db_queue_depths():
+    session_id = get_current_session()
+    if not session_id:
+        return {}
+    conn = connect(DB_PATH)
+    try:
+        return {(namespace,): count for namespace, count in conn.execute(
+            "SELECT namespace, COUNT(*) FROM tasks WHERE session_id = ? AND status = 'PENDING' GROUP BY namespace", (session_id,))}
+    finally:
+        conn.close()
+
+def db_agent_counts():
+    session_id = get_current_session()
+    if not session_id:
+        return {}
+    conn = connect(DB_PATH)
+    try:
+        return {(role, status): count for role, status, count in conn.execute(
+            "SELECT role, status, COUNT(*) FROM agents WHERE session_id = ? AND status != 'TERMINATED' GROUP BY role, status", (session_id,))}
+    finally:
+        conn.close()
+
+metrics.QUEUE_DEPTH.set_function(db_queue_depths)
+metrics.AGENTS.set_function(db_agent_counts)
+
+@app.route('/metrics')
+def get_metrics():
+    return Response(metrics.render(), content_type=metrics.CONTENT_TYPE)
+
 import webbrowser
 import threading
 
@@ -0,0 +1,152 @@
+import importlib
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Optional
+from hive_core import Message, MessageType, SessionControl, TaskCancelled, get_codec, logger
+
+# Set in each pool process by _init_process
+_progress_queue = None
+_session_states = None
+
+class _ProgressReporter:
+    # Stands in for SharedMemory inside a pool process; perform_work only reports progress
+    def update_task_progress(self, task_id, progress, output_path=None):
+        _progress_queue.put((task_id, progress, output_path))
+
+class _RemoteControl:
+    """Child-side SessionControl that reads the session state mirrored by the parent."""
+    def __init__(self, session_id: str):
+        self.session_id = session_id
+
+    @property
+    def state(self) -> str:
+        return _session_states.get(self.session_id, "RUNNING")
+
+    def checkpoint(self):
+        state = self.state
+        while state == "PAUSED":
+            time.sleep(0.1)
+            state = self.state
+        if state == "CANCELLED":
+            raise TaskCancelled(f"Session {self.session_id} cancelled")
+
+def _init_process(progress_queue, session_states):
+    global _progress_queue, _session_states
+    _progress_queue = progress_queue
+    _session_states = session_states
+
+def _run_task(codec_name: str, module: str, qualname: str, agent_id: str, name: str, role: str, session_id: str, clock,
+              payload: bytes) -> bytes:
+    # Rebuild a detached copy of the agent: no bus subscription, no registration
+    agent_class = importlib.import_module(module)
+    for part in qualname.split("."):
+        agent_class = getattr(agent_class, part)
+    agent = agent_class.__new__(agent_class)
+    agent.id, agent.name, agent.role, agent.session_id = agent_id, name, role, session_id
+    agent.memory = _ProgressReporter()
+    # A copy of the agent's clock: same timeline and seed, so draws and sleeps match the thread backend
+    agent.clock = clock
+    agent.control = _RemoteControl(session_id)
+    codec = get_codec(codec_name)
+    message = codec.decode(payload)
+    outcome = agent.run_task(message.content)
+    return codec.encode(Message(agent_id, message.sender_id, MessageType.TASK_RESULT, outcome, message.id))
+
+class ProcessPool:
+    """
+    Runs WorkerAgent.run_task in a pool of worker processes so CPU-bound
+    perform_work implementations aren't serialized by the GIL. The agent stays
+    a thread-side object on the bus; only the work is shipped out, as a
+    Message encoded with `codec` (see hive_core.CODECS), and the result comes
+    back the same way. The agent's clock goes with it, so seeded draws
+    and scaled time carry over; a SimulatedClock can't leave its process.
+    Progress is sent back over a queue and applied by a drain thread, and
+    session pause/cancel is mirrored into the pool through a managed dict.
+    """
+    _shared: Optional["ProcessPool"] = None
+    _shared_lock = threading.Lock()
+
+    def __init__(self, max_workers: int = None, start_method: str = "spawn", codec: str = None):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.codec = get_codec(codec)
+        context = multiprocessing.get_context(start_method)
+        self._manager = context.Manager()
+        self._states = self._manager.dict()
+        self._progress = context.Queue()
+        self._executor = ProcessPoolExecutor(self.max_workers, mp_context=context,
+                                             initializer=_init_process, initargs=(self._progress, self._states))
+        self._inflight: Dict[str, object] = {}     # task_id -> SharedMemory
+        self._lock = threading.Lock()
+        self._closed = False
+        SessionControl.add_listener(self._mirror_state)
+        self._drain_thread = threading.Thread(target=self._drain_progress, daemon=True)
+        self._drain_thread.start()
+
+    @classmethod
+    def shared(cls) -> "ProcessPool":
+        with cls._shared_lock:
+            if cls._shared is None:
+                cls._shared = cls()
+            return cls._shared
+
+    @classmethod
+    def shutdown_shared(cls, wait: bool = True):
+        with cls._shared_lock:
+            pool, cls._shared = cls._shared, None
+        if pool is not None:
+            pool.shutdown(wait)
+
+    def submit(self, agent, message: Message):
+        task_id = message.content['id']
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("Process pool is shut down")
+            self._inflight[task_id] = agent.memory
+        self._states[agent.session_id] = agent.control.state
+        agent_class = type(agent)
+        future = self._executor.submit(_run_task, self.codec.name, agent_class.__module__, agent_class.__qualname__,
+                                       agent.id, agent.name, agent.role, agent.session_id, agent.clock, self.codec.encode(message))
+        future.add_done_callback(lambda f: self._finished(agent, message, f))
+
+    def _finished(self, agent, message: Message, future):
+        with self._lock:
+            self._inflight.pop(message.content['id'], None)
+        try:
+            outcome = self.codec.decode(future.result()).content
+        except Exception as e:
+            # The pool process died or the payload couldn't be marshalled
+            outcome = {"task_id": message.content['id'], "status": "FAILED", "error": f"{type(e).__name__}: {e}"}
+        agent.finish_task(message, outcome)
+
+    def _mirror_state(self, session_id: str, state: str):
+        if not self._closed:
+            self._states[session_id] = state
+
+    def _drain_progress(self):
+        while True:
+            try:
+                item = self._progress.get()
+            except (EOFError, OSError):
+                return
+            if item is None:
+                return
+            task_id, progress, output_path = item
+            with self._lock:
+                memory = self._inflight.get(task_id)
+            if memory is not None:
+                memory.update_task_progress(task_id, progress, output_path)
+
+    def shutdown(self, wait: bool = True):
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+        SessionControl.remove_listener(self._mirror_state)
+        self._executor.shutdown(wait=wait, cancel_futures=not wait)
+        self._progress.put(None)
+        self._drain_thread.join(timeout=5)
+        self._manager.shutdown()
+        logger.info("Process pool shut down")
@@ -1,10 +1,28 @@
 import sqlite3
 import json
+import struct
+import sys
+import itertools
 import time
 import uuid
+import os
 import logging
+import asyncio
+import threading
+import queue
+import functools
+import metrics
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from enum import Enum
 from typing import List, Dict, Any, Optional, Callable
+from clock import RealClock
+from storage import StorageBase, InMemoryStorage, summarize_sessions
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
@@ -17,16 +35,35 @@ class MessageType(Enum):
     KNOWLEDGE_SHARE = "KNOWLEDGE_SHARE"
     SYSTEM_ALERT = "SYSTEM_ALERT"
 
+# Monotonic per-process message ids; cheaper than a uuid4 string per message
+_message_ids = itertools.count(1)
+
 class Message:
-    def __init__(self, sender_id: str, receiver_id: str, msg_type: MessageType, content: Dict[str, Any], parent_msg_id: str = None):
-        self.id = str(uuid.uuid4())
-        self.sender_id = sender_id
-        self.receiver_id = receiver_id
+    __slots__ = ("id", "sender_id", "receiver_id", "msg_type", "content", "parent_msg_id", "timestamp")
+
+    def __init__(self, sender_id: str, receiver_id: str, msg_type: MessageType, content: Dict[str, Any], parent_msg_id: int = None):
+        self.id = next(_message_ids)
+        # Agent ids are used as inbox keys on every hop; interned strings compare by identity
+        self.sender_id = sys.intern(sender_id) if sender_id else sender_id
+        self.receiver_id = sys.intern(receiver_id) if receiver_id else receiver_id
         self.msg_type = msg_type
         self.content = content
         self.parent_msg_id = parent_msg_id
         self.timestamp = time.time()
 
+    @classmethod
+    def restore(cls, msg_id, sender_id, receiver_id, msg_type, content, parent_msg_id, timestamp) -> "Message":
+        # Rebuild a decoded message, keeping its original id and timestamp
+        msg = cls.__new__(cls)
+        msg.id = msg_id
+        msg.sender_id = sys.intern(sender_id) if sender_id else sender_id
+        msg.receiver_id = sys.intern(receiver_id) if receiver_id else receiver_id
+        msg.msg_type = msg_type
+        msg.content = content
+        msg.parent_msg_id = parent_msg_id
+        msg.timestamp = timestamp
+        return msg
+
     def to_json(self):
         return json.dumps({
             "id": self.id,
@@ -41,16 +78,271 @@ class Message:
     @staticmethod
     def from_json(json_str):
         data = json.loads(json_str)
-        msg = Message(data['sender_id'], data['receiver_id'], MessageType(data['msg_type']), data['content'], data['parent_msg_id'])
-        msg.id = data['id']
-        msg.timestamp = data['timestamp']
-        return msg
+        return Message.restore(data['id'], data['sender_id'], data['receiver_id'], MessageType(data['msg_type']),
+                               data['content'], data['parent_msg_id'], data['timestamp'])
+
+class JSONCodec:
+    """Message.to_json as bytes; readable and works with any message."""
+    name = "json"
+
+    def encode(self, msg: Message) -> bytes:
+        return msg.to_json().encode()
+
+    def decode(self, data: bytes) -> Message:
+        return Message.from_json(data)
+
+_MESSAGE_TYPES = list(MessageType)
+_MESSAGE_TYPE_CODES = {msg_type: code for code, msg_type in enumerate(_MESSAGE_TYPES)}
+
+class StructCodec:
+    """
+    Fixed struct header (type code, id, parent id, timestamp, id lengths)
+    followed by the sender/receiver ids and a compact JSON body. The enum
+    travels as one byte instead of its name. Ids must be the integers
+    Message assigns; parent id 0 means none.
+    """
+    name = "struct"
+    HEADER = struct.Struct("!BQQdHH")
+
+    def encode(self, msg: Message) -> bytes:
+        sender = (msg.sender_id or "").encode()
+        receiver = (msg.receiver_id or "").encode()
+        header = self.HEADER.pack(_MESSAGE_TYPE_CODES[msg.msg_type], msg.id, msg.parent_msg_id or 0, msg.timestamp,
+                                  len(sender), len(receiver))
+        return b"".join((header, sender, receiver, json.dumps(msg.content, separators=(",", ":")).encode()))
+
+    def decode(self, data: bytes) -> Message:
+        code, msg_id, parent_id, timestamp, sender_len, receiver_len = self.HEADER.unpack_from(data)
+        offset = self.HEADER.size
+        sender = data[offset:offset + sender_len].decode()
+        offset += sender_len
+        receiver = data[offset:offset + receiver_len].decode()
+        offset += receiver_len
+        return Message.restore(msg_id, sender or None, receiver or None, _MESSAGE_TYPES[code],
+                               json.loads(data[offset:]), parent_id or None, timestamp)
+
+class MsgpackCodec:
+    """The message as one msgpack array; needs the optional msgpack package."""
+    name = "msgpack"
+
+    def encode(self, msg: Message) -> bytes:
+        return msgpack.packb((_MESSAGE_TYPE_CODES[msg.msg_type], msg.id, msg.sender_id, msg.receiver_id,
+                              msg.content, msg.parent_msg_id, msg.timestamp))
+
+    def decode(self, data: bytes) -> Message:
+        code, msg_id, sender, receiver, content, parent_id, timestamp = msgpack.unpackb(data)
+        return Message.restore(msg_id, sender, receiver, _MESSAGE_TYPES[code], content, parent_id, timestamp)
+
+CODECS = {codec.name: codec for codec in (JSONCodec, StructCodec, MsgpackCodec) if codec is not MsgpackCodec or msgpack is not None}
+
+DEFAULT_CODEC = "msgpack" if "msgpack" in CODECS else "struct"
+
+def get_codec(name: str = None):
+    name = name or DEFAULT_CODEC
+    if name not in CODECS:
+        raise ValueError(f"Unknown or unavailable message codec: {name}")
+    return CODECS[name]()
+
+
+def _timed(fn):
+    # Record each call's real latency in metrics.SQL_SECONDS, labelled with the method name
+    labels = (fn.__name__,)
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            metrics.SQL_SECONDS.observe(time.perf_counter() - start, labels)
+    return wrapper
+
+class WriteBehindWriter:
+    """
+    Background writer for SharedMemory's high-volume writes (progress, logs,
+    completions, agent rows). Operations go through a bounded queue; the
+    writer thread drains up to batch_size of them (or whatever arrived within
+    flush_interval), keeps only the last progress/status value per row, and
+    applies the batch in one transaction.
+    """
+    def __init__(self, memory: "SharedMemory", max_queue: int = 10000, batch_size: int = 500, flush_interval: float = 0.2):
+        self.memory = memory
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.thread = threading.Thread(target=self._run, name="hive-writer", daemon=True)
+        self.thread.start()
+
+    def submit(self, op: tuple):
+        # Blocks when the queue is full, which throttles producers
+        self.queue.put(op)
+
+    def flush(self, timeout: float = None) -> bool:
+        done = threading.Event()
+        self.queue.put(("flush", done))
+        return done.wait(timeout)
+
+    def close(self):
+        done = threading.Event()
+        self.queue.put(("stop", done))
+        done.wait()
+        self.thread.join()
+
+    def _run(self):
+        while True:
+            batch = [self.queue.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size and batch[-1][0] not in ("flush", "stop"):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self.queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            markers = [op for op in batch if op[0] in ("flush", "stop")]
+            try:
+                self.memory._apply_writes([op for op in batch if op[0] not in ("flush", "stop")])
+            except Exception:
+                logger.exception("Write-behind batch failed")
+            for kind, done in markers:
+                done.set()
+                if kind == "stop":
+                    return
+
+
+def connect(db_path, busy_timeout=5.0, journal_mode="WAL", synchronous="NORMAL"):
+    """Open a connection with the hive's concurrency settings (scripts and dashboard use this too)."""
+    conn = sqlite3.connect(db_path, timeout=busy_timeout, check_same_thread=False)
+    conn.execute(f"PRAGMA busy_timeout = {int(busy_timeout * 1000)}")
+    if journal_mode:
+        conn.execute(f"PRAGMA journal_mode = {journal_mode}")
+    if synchronous:
+        conn.execute(f"PRAGMA synchronous = {synchronous}")
+    return conn
+
+def is_locked_error(exc: Exception) -> bool:
+    message = str(exc).lower()
+    return isinstance(exc, sqlite3.OperationalError) and ("locked" in message or "busy" in message)
 
+class BulkInputConsumed(Exception):
+    # A bulk insert failed after reading part of a one-shot input; retrying can't replay it
+    pass
 
-class SharedMemory:
-    def __init__(self, db_path="hive_memory.db"):
-        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+class ConnectionPool:
+    """
+    One writer connection, serialised by a lock, plus one reader connection
+    per thread. In WAL mode readers never block the writer and vice versa.
+    """
+    def __init__(self, db_path, journal_mode="WAL", synchronous="NORMAL", busy_timeout=5.0):
+        self.db_path = db_path
+        self.journal_mode = journal_mode
+        self.synchronous = synchronous
+        self.busy_timeout = busy_timeout
+        self.write_lock = threading.RLock()
+        self.writer = connect(db_path, busy_timeout, journal_mode, synchronous)
+        # A private in-memory database only exists on the connection that created it
+        self.shared = db_path == ":memory:" or db_path.startswith("file::memory:")
+        self._local = threading.local()
+        self._readers = []
+        self._readers_lock = threading.Lock()
+
+    def reader(self) -> sqlite3.Connection:
+        if self.shared:
+            return self.writer
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # journal_mode is a property of the file, set once by the writer
+            conn = connect(self.db_path, self.busy_timeout, None, self.synchronous)
+            self._local.conn = conn
+            with self._readers_lock:
+                self._readers.append(conn)
+        return conn
+
+    def close(self):
+        with self._readers_lock:
+            for conn in self._readers:
+                conn.close()
+            self._readers = []
+        with self.write_lock:
+            self.writer.close()
+
+SESSION_HISTORY_QUERY = """
+    SELECT s.session_id, s.task_count, s.start_time, s.end_time, c.status, c.count
+    FROM (SELECT * FROM sessions ORDER BY start_time DESC LIMIT ? OFFSET ?) s
+    LEFT JOIN session_status_counts c ON c.session_id = s.session_id
+    ORDER BY s.start_time DESC
+"""
+
+class SharedMemory(StorageBase):
+    """
+    The SQLite engine of the Storage protocol (see storage.py). The database
+    can be shared by several hive processes, the dashboard and scripts.
+    """
+    def __init__(self, db_path="hive_memory.db", write_behind=True, write_queue_size=10000, write_batch_size=500, write_flush_interval=0.2,
+                 journal_mode="WAL", synchronous="NORMAL", busy_timeout=5.0, max_retries=5, retry_backoff=0.05, change_poll_interval=0.05,
+                 clock=None, log_policy=None, log_buffer_size=200, log_archive_dir=None, lease_duration=30.0):
+        super().__init__(clock, lease_duration, change_poll_interval, log_policy, log_buffer_size,
+                         log_archive_dir or os.path.splitext(db_path)[0] + "_logs")
+        self.db_path = db_path
+        self.pool = ConnectionPool(db_path, journal_mode, synchronous, busy_timeout)
+        self.conn = self.pool.writer
+        self._lock = self.pool.write_lock
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
         self._init_db()
+        self._data_version = self.data_version()
+        if write_behind:
+            self.writer = WriteBehindWriter(self, write_queue_size, write_batch_size, write_flush_interval)
+
+    def _transaction(self, fn):
+        # Run fn(cursor) on the writer connection and commit, retrying with
+        # exponential backoff if another process holds the database lock
+        for attempt in range(self.max_retries + 1):
+            with self._lock:
+                try:
+                    cursor = self.conn.cursor()
+                    result = fn(cursor)
+                    self.conn.commit()
+                    return result
+                except sqlite3.OperationalError as e:
+                    self.conn.rollback()
+                    if not is_locked_error(e) or attempt == self.max_retries:
+                        raise
+                except Exception:
+                    # Never leave a half-applied transaction open on the shared writer
+                    self.conn.rollback()
+                    raise
+            delay = self.retry_backoff * (2 ** attempt)
+            logger.warning(f"Database busy, retrying in {delay:.2f}s")
+            time.sleep(delay)
+
+    @_timed
+    def data_version(self):
+        # Changes whenever a connection other than the writer commits (scripts, dashboard, other hives)
+        with self._lock:
+            return self.conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def _poll_external(self):
+        version = self.data_version()
+        if version == self._data_version:
+            return False
+        self._data_version = version
+        return True
+
+    def _read(self, sql, params=()):
+        conn = self.pool.reader()
+        for attempt in range(self.max_retries + 1):
+            try:
+                if self.pool.shared:
+                    with self._lock:
+                        return conn.execute(sql, params).fetchall()
+                return conn.execute(sql, params).fetchall()
+            except sqlite3.OperationalError as e:
+                if not is_locked_error(e) or attempt == self.max_retries:
+                    raise
+            time.sleep(self.retry_backoff * (2 ** attempt))
 
     def _init_db(self):
         cursor = self.conn.cursor()
@@ -78,7 +370,12 @@ class SharedMemory:
                 namespace TEXT,
                 session_id TEXT,
                 progress INTEGER DEFAULT 0,
-                output_path TEXT
+                output_path TEXT,
+                role TEXT,
+                attempts INTEGER DEFAULT 0,
+                next_attempt_at REAL,
+                last_error TEXT,
+                lease_expires_at REAL
             )
         ''')
         cursor.execute('''
@@ -120,104 +417,798 @@ class SharedMemory:
             cursor.execute("CREATE TABLE IF NOT EXISTS system_state (key TEXT PRIMARY KEY, value TEXT, session_id TEXT)")
         except sqlite3.OperationalError:
             pass
+        try:
+            cursor.execute("ALTER TABLE tasks ADD COLUMN role TEXT")
+        except sqlite3.OperationalError:
+            pass
+        # Retry bookkeeping: runs that failed so far, when a RETRY_SCHEDULED task is due, and why it last failed
+        for column in ("attempts INTEGER DEFAULT 0", "next_attempt_at REAL", "last_error TEXT"):
+            try:
+                cursor.execute(f"ALTER TABLE tasks ADD COLUMN {column}")
+            except sqlite3.OperationalError:
+                pass
+        try:
+            cursor.execute("ALTER TABLE tasks ADD COLUMN lease_expires_at REAL")
+            # Work left IN_PROGRESS before leases existed has no owner to wait for
+            cursor.execute("UPDATE tasks SET lease_expires_at = 0 WHERE status = 'IN_PROGRESS'")
+        except sqlite3.OperationalError:
+            pass
+        # Dead-letter queue: tasks that used up their retry budget, kept until requeued by hand
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS dead_letters (
+                task_id TEXT PRIMARY KEY, session_id TEXT, namespace TEXT, role TEXT, description TEXT,
+                attempts INTEGER, error TEXT, failed_at REAL
+            )
+        """)
+        # Lease sweep: only IN_PROGRESS rows are indexed, so the index stays as small as the work in flight
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_tasks_lease ON tasks (lease_expires_at) WHERE status = 'IN_PROGRESS'")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_dead_letters_session ON dead_letters (session_id, failed_at)")
+        # Dispatch indexes: equality on session/namespace/status, then the claim order; the
+        # second serves fetches across all of a session's namespaces
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_tasks_dispatch ON tasks (session_id, namespace, status, priority DESC, created_at)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_tasks_dispatch_session ON tasks (session_id, status, priority DESC, created_at)")
+        # Dashboard paging: newest-first keyset scans over a session's tasks and logs
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_tasks_session_created ON tasks (session_id, created_at, id)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_logs_session_time ON logs (session_id, timestamp)")
+        # Change feed: triggers append a row per task/agent change, whichever process made it,
+        # so the dashboard can stream deltas from a cursor instead of re-reading whole tables
+        cursor.execute("CREATE TABLE IF NOT EXISTS changes (seq INTEGER PRIMARY KEY AUTOINCREMENT, entity TEXT, entity_id TEXT, session_id TEXT)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_changes_session ON changes (session_id, seq)")
+        for name, event, table, entity in (
+            ("trg_tasks_insert_change", "INSERT", "tasks", "task"),
+            ("trg_tasks_update_change", "UPDATE OF status, progress, output_path, assigned_to", "tasks", "task"),
+            ("trg_agents_insert_change", "INSERT", "agents", "agent"),
+            ("trg_agents_update_change", "UPDATE OF status", "agents", "agent"),
+        ):
+            cursor.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS {name} AFTER {event} ON {table}
+                BEGIN
+                    INSERT INTO changes (entity, entity_id, session_id) VALUES ('{entity}', NEW.id, NEW.session_id);
+                END
+            """)
+        self._migrate_session_summary(cursor)
         self.conn.commit()
 
-    def register_agent(self, agent_id, role, supervisor_id, capabilities, session_id="default"):
-        cursor = self.conn.cursor()
-        cursor.execute("INSERT OR REPLACE INTO agents (id, role, supervisor_id, capabilities, status, session_id) VALUES (?, ?, ?, ?, 'IDLE', ?)",
-                       (agent_id, role, supervisor_id, json.dumps(capabilities), session_id))
-        self.conn.commit()
+    def _migrate_session_summary(self, cursor):
+        # Per-session aggregates kept current by triggers, so history never scans tasks.
+        # Deleting tasks (pruning) deliberately leaves the summary intact.
+        exists = cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'sessions'").fetchone()
+        cursor.execute("CREATE TABLE IF NOT EXISTS sessions (session_id TEXT PRIMARY KEY, task_count INTEGER DEFAULT 0, start_time REAL, end_time REAL)")
+        cursor.execute("CREATE TABLE IF NOT EXISTS session_status_counts (session_id TEXT, status TEXT, count INTEGER DEFAULT 0, PRIMARY KEY (session_id, status))")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_sessions_start ON sessions (start_time DESC)")
+        cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS trg_tasks_insert_session AFTER INSERT ON tasks
+            BEGIN
+                INSERT OR IGNORE INTO sessions (session_id, task_count, start_time) VALUES (COALESCE(NEW.session_id, ''), 0, NEW.created_at);
+                UPDATE sessions SET task_count = task_count + 1, start_time = MIN(COALESCE(start_time, NEW.created_at), NEW.created_at)
+                    WHERE session_id = COALESCE(NEW.session_id, '');
+                INSERT OR IGNORE INTO session_status_counts (session_id, status, count) VALUES (COALESCE(NEW.session_id, ''), NEW.status, 0);
+                UPDATE session_status_counts SET count = count + 1 WHERE session_id = COALESCE(NEW.session_id, '') AND status = NEW.status;
+            END
+        """)
+        cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS trg_tasks_status_session AFTER UPDATE OF status ON tasks WHEN OLD.status IS NOT NEW.status
+            BEGIN
+                UPDATE session_status_counts SET count = count - 1 WHERE session_id = COALESCE(OLD.session_id, '') AND status = OLD.status;
+                INSERT OR IGNORE INTO session_status_counts (session_id, status, count) VALUES (COALESCE(NEW.session_id, ''), NEW.status, 0);
+                UPDATE session_status_counts SET count = count + 1 WHERE session_id = COALESCE(NEW.session_id, '') AND status = NEW.status;
+            END
+        """)
+        cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS trg_tasks_completed_session AFTER UPDATE OF completed_at ON tasks WHEN NEW.completed_at IS NOT NULL
+            BEGIN
+                UPDATE sessions SET end_time = MAX(COALESCE(end_time, 0), NEW.completed_at) WHERE session_id = COALESCE(NEW.session_id, '');
+            END
+        """)
+        if not exists:
+            # First run on an existing database: build the summary once from history
+            cursor.execute("""
+                INSERT INTO sessions (session_id, task_count, start_time, end_time)
+                SELECT COALESCE(session_id, ''), COUNT(*), MIN(created_at), MAX(completed_at) FROM tasks GROUP BY COALESCE(session_id, '')
+            """)
+            cursor.execute("""
+                INSERT INTO session_status_counts (session_id, status, count)
+                SELECT COALESCE(session_id, ''), status, COUNT(*) FROM tasks GROUP BY COALESCE(session_id, ''), status
+            """)
 
-    def create_task(self, description, priority=1, deps=[], namespace="default", session_id="default"):
+    @_timed
+    def get_session_history(self, limit=50, offset=0):
+        """
+        One page of session summaries, newest first: task counts by status,
+        start/end time and throughput (completed tasks per second).
+        """
+        return summarize_sessions(self._read(SESSION_HISTORY_QUERY, (limit, offset)))
+
+    @_timed
+    def create_task(self, description, priority=1, deps=[], namespace="default", session_id="default", role=None):
         task_id = str(uuid.uuid4())
-        cursor = self.conn.cursor()
-        cursor.execute('''
-            INSERT INTO tasks (id, description, assigned_to, status, priority, dependencies, created_at, namespace, session_id)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (task_id, description, None, "PENDING", priority, json.dumps(deps), time.time(), namespace, session_id))
-        self.conn.commit()
+        self._transaction(lambda cursor: cursor.execute('''
+            INSERT INTO tasks (id, description, assigned_to, status, priority, dependencies, created_at, namespace, session_id, role)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (task_id, description, None, "PENDING", priority, json.dumps(deps), self.clock.time(), namespace, session_id, role)))
+        self.notify_change()
         return task_id
 
+    @_timed
+    def create_tasks_bulk(self, tasks, namespace="default", session_id="default", batch_id=None):
+        """
+        Insert many tasks with one executemany in a single transaction. `tasks`
+        is any iterable of dicts and is consumed lazily, so memory stays flat
+        however large the input. Each dict needs a description and may set
+        priority, role, namespace, session_id, a client-side `key`, `deps`
+        (keys of other tasks in this batch, earlier or later) and `dep_ids`
+        (ids of tasks that already exist). Keys become ids via bulk_task_id,
+        so no key table is built. Returns the number of tasks inserted.
+        """
+        batch_id = batch_id or uuid.uuid4()
+        start = self.clock.time()
+        consumed = [False]
+
+        def rows():
+            for i, task in enumerate(tasks):
+                consumed[0] = True
+                key = task.get("key")
+                task_id = task.get("id") or (self.bulk_task_id(batch_id, key) if key is not None else str(uuid.uuid4()))
+                deps = [self.bulk_task_id(batch_id, dep) for dep in task.get("deps") or []]
+                deps.extend(task.get("dep_ids") or [])
+                # Microsecond offsets keep input order for FIFO dispatch on equal priority
+                yield (task_id, task["description"], "PENDING", task.get("priority", 1), json.dumps(deps), start + i * 1e-6,
+                       task.get("namespace", namespace), task.get("session_id", session_id), task.get("role"))
+
+        def insert(cursor):
+            if consumed[0]:
+                # The commit of an earlier attempt hit the lock after the input was read
+                raise BulkInputConsumed("database is locked; bulk insert input already consumed")
+            # Take the write lock up front so a busy database fails before any input is read
+            cursor.execute("BEGIN IMMEDIATE")
+            try:
+                cursor.executemany('''
+                    INSERT INTO tasks (id, description, status, priority, dependencies, created_at, namespace, session_id, role)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ''', rows())
+            except sqlite3.OperationalError as e:
+                # Not a lock error to _transaction: the input is a one-shot stream and a retry can't replay it
+                if consumed[0] and is_locked_error(e):
+                    raise BulkInputConsumed(f"{e}; bulk insert input already consumed") from e
+                raise
+            return cursor.rowcount
+
+        count = self._transaction(insert)
+        self.notify_change()
+        return count
+
+    @_timed
     def get_pending_tasks(self, namespace="default", session_id="default"):
-        cursor = self.conn.cursor()
-        cursor.execute("SELECT * FROM tasks WHERE status = 'PENDING' AND namespace = ? AND session_id = ? ORDER BY priority DESC", (namespace, session_id))
-        return cursor.fetchall()
+        # namespace=None: every namespace of the session. Two statements, so each one's
+        # equalities line up with a dispatch index
+        if namespace is None:
+            return self._read("SELECT * FROM tasks WHERE session_id = ? AND status = 'PENDING' ORDER BY priority DESC, created_at",
+                              (session_id,))
+        return self._read("SELECT * FROM tasks WHERE session_id = ? AND namespace = ? AND status = 'PENDING' ORDER BY priority DESC, created_at",
+                          (session_id, namespace))
+
+    @_timed
+    def get_pending_tasks_since(self, seq=None, namespace="default", session_id="default"):
+        """
+        Incremental get_pending_tasks: PENDING tasks inserted or changed after
+        change-feed position `seq`, plus the position to pass next time. With
+        seq=None, or once the feed has been pruned past `seq`, it falls back to
+        a full scan.
+        """
+        # Separate subqueries: SQLite only reads min/max off the end of the index for a lone aggregate
+        low, high = self._read("SELECT (SELECT MIN(seq) FROM changes), (SELECT MAX(seq) FROM changes)")[0]
+        high = high or 0
+        if seq is None or (low is not None and low > seq + 1):
+            return self.get_pending_tasks(namespace, session_id), high
+        if high == seq:
+            return [], seq
+        changed = "SELECT entity_id FROM changes WHERE session_id = ? AND seq > ? AND seq <= ? AND entity = 'task'"
+        if namespace is None:
+            rows = self._read(f"SELECT * FROM tasks WHERE id IN ({changed}) AND status = 'PENDING' ORDER BY priority DESC, created_at",
+                              (session_id, seq, high))
+        else:
+            rows = self._read(f"SELECT * FROM tasks WHERE id IN ({changed}) AND namespace = ? AND status = 'PENDING' ORDER BY priority DESC, created_at",
+                              (session_id, seq, high, namespace))
+        return rows, high
+
+    @_timed
+    def pending_counts(self, session_id="default"):
+        # (namespace, PENDING tasks) for a session
+        return self._read("SELECT namespace, COUNT(*) FROM tasks WHERE session_id = ? AND status = 'PENDING' GROUP BY namespace", (session_id,))
+
+    @_timed
+    def get_task_statuses(self, task_ids):
+        statuses = {}
+        task_ids = list(task_ids)
+        # Stay under SQLite's bound-parameter limit
+        for i in range(0, len(task_ids), 500):
+            chunk = task_ids[i:i + 500]
+            placeholders = ",".join("?" * len(chunk))
+            statuses.update(self._read(f"SELECT id, status FROM tasks WHERE id IN ({placeholders})", chunk))
+        return statuses
+
+    @_timed
+    def get_session_tasks(self, session_id, status=None):
+        # Full task rows of a session, optionally only those in one status
+        return self._read("SELECT * FROM tasks WHERE session_id = ? AND (? IS NULL OR status = ?)", (session_id, status, status))
 
+    @_timed
+    def status_counts(self, session_id):
+        # {status: tasks} for a session, from the trigger-maintained summary
+        return dict(self._read("SELECT status, count FROM session_status_counts WHERE session_id = ? AND count > 0", (session_id,)))
+
+    @_timed
     def assign_task(self, task_id, agent_id):
-        cursor = self.conn.cursor()
-        cursor.execute("UPDATE tasks SET assigned_to = ?, status = 'IN_PROGRESS' WHERE id = ?", (agent_id, task_id))
-        self.conn.commit()
+        # Only a PENDING row can be assigned, so two dispatchers can't both win it
+        row = self._transaction(lambda cursor: cursor.execute(
+            "UPDATE tasks SET assigned_to = ?, status = 'IN_PROGRESS', lease_expires_at = ? WHERE id = ? AND status = 'PENDING' RETURNING created_at",
+            (agent_id, self.lease_deadline(), task_id)).fetchone())
+        if row is None:
+            return False
+        self._task_started(task_id, row[0])
+        return True
 
-    def complete_task(self, task_id, result):
-        cursor = self.conn.cursor()
-        cursor.execute("UPDATE tasks SET status = 'COMPLETED', result = ?, completed_at = ? WHERE id = ?", (json.dumps(result), time.time(), task_id))
-        self.conn.commit()
+    @_timed
+    def claim_next_task(self, role=None, session_id="default", agent_id=None, namespace="default"):
+        """
+        Atomically pick the highest-priority PENDING task (oldest first on ties)
+        and mark it IN_PROGRESS. Tasks without a role can be claimed by anyone;
+        role=None claims regardless of role. Returns the task row or None.
+        """
+        row = self._transaction(lambda cursor: cursor.execute('''
+            UPDATE tasks SET status = 'IN_PROGRESS', assigned_to = ?, lease_expires_at = ?
+            WHERE id = (
+                SELECT id FROM tasks
+                WHERE session_id = ? AND namespace = ? AND status = 'PENDING'
+                  AND (? IS NULL OR role IS NULL OR role = ?)
+                ORDER BY priority DESC, created_at
+                LIMIT 1
+            ) AND status = 'PENDING'
+            RETURNING *
+        ''', (agent_id, self.lease_deadline(), session_id, namespace, role, role)).fetchone())
+        if row is not None:
+            self._task_started(row[0], row[7])
+        return row
 
-    def log_action(self, agent_id, action, details, namespace="default", session_id="default"):
-        cursor = self.conn.cursor()
-        cursor.execute("INSERT INTO logs (agent_id, action, details, timestamp, namespace, session_id) VALUES (?, ?, ?, ?, ?, ?)", 
-                            (agent_id, action, json.dumps(details), time.time(), namespace, session_id))
-        self.conn.commit()
+    @_timed
+    def archive_logs(self, max_age=3600, batch_size=5000):
+        """
+        Move log rows older than `max_age` wall-clock seconds into the log
+        archive, one segment per batch, walking the table in id order so no
+        timestamp index is needed. Returns the number of rows archived. A
+        crash between writing a segment and deleting its rows leaves them in
+        both places.
+        """
+        # Retention runs on wall time: a scaled or simulated clock can be far ahead of it,
+        # and the database is shared with hives and scripts on the real clock
+        cutoff = time.time() - max_age
+        self.flush()
+        archived = 0
+        while True:
+            rows = self._read("SELECT id, agent_id, action, details, timestamp, namespace, session_id FROM logs ORDER BY id LIMIT ?",
+                              (batch_size,))
+            old = list(itertools.takewhile(lambda row: row[4] < cutoff, rows))
+            if not old:
+                return archived
+            self.log_archive.write(old)
+            self._transaction(lambda cursor: cursor.execute("DELETE FROM logs WHERE id <= ?", (old[-1][0],)))
+            archived += len(old)
+            if len(old) < len(rows) or len(rows) < batch_size:
+                return archived
 
+    @_timed
     def dump_memory(self, filepath):
         # Backup the database to a file
-        with sqlite3.connect(filepath) as backup_conn:
+        self.flush()
+        with self._lock, sqlite3.connect(filepath) as backup_conn:
             self.conn.backup(backup_conn)
         logger.info(f"Memory dumped to {filepath}")
 
-    def prune_memory(self, days_to_keep=7):
+    @_timed
+    def prune_memory(self, days_to_keep=7, change_feed_keep=100000):
+        # Wall time, like archive_logs
         cutoff = time.time() - (days_to_keep * 86400)
-        cursor = self.conn.cursor()
-        cursor.execute("DELETE FROM logs WHERE timestamp < ?", (cutoff,))
-        cursor.execute("DELETE FROM tasks WHERE completed_at < ? AND status = 'COMPLETED'", (cutoff,))
-        self.conn.commit()
+        # Logs older than the cutoff leave SQLite through the archive, which keeps the same horizon
+        self.archive_logs(days_to_keep * 86400)
+        self.log_archive.prune(cutoff)
+        def prune(cursor):
+            cursor.execute("DELETE FROM tasks WHERE completed_at < ? AND status = 'COMPLETED'", (cutoff,))
+            # The change feed only needs to cover readers that are catching up
+            cursor.execute("DELETE FROM changes WHERE seq <= (SELECT MAX(seq) FROM changes) - ?", (change_feed_keep,))
+        self._transaction(prune)
         logger.info("Memory pruned.")
 
-    def update_task_progress(self, task_id, progress, output_path=None):
-        cursor = self.conn.cursor()
-        if output_path:
-            cursor.execute("UPDATE tasks SET progress = ?, output_path = ? WHERE id = ?", (progress, output_path, task_id))
-        else:
-            cursor.execute("UPDATE tasks SET progress = ? WHERE id = ?", (progress, task_id))
-        self.conn.commit()
+    @_timed
+    def requeue_task(self, task_id):
+        # Hand an IN_PROGRESS task back to the pending pool
+        self._task_stopped(task_id)
+        self._transaction(lambda cursor: cursor.execute(
+            "UPDATE tasks SET status = 'PENDING', assigned_to = NULL, lease_expires_at = NULL WHERE id = ? AND status = 'IN_PROGRESS'",
+            (task_id,)))
+        self.notify_change()
+
+    @_timed
+    def reclaim_expired_leases(self, session_id=None, now=None, namespaces=None):
+        """
+        Hand IN_PROGRESS tasks whose lease has run out back to PENDING in one
+        UPDATE over the partial lease index; session_id=None sweeps every
+        session, namespaces=None every namespace. Pass now=float("inf") to
+        reclaim regardless of expiry, e.g. when resuming a session whose hive
+        was killed. Returns the ids.
+        """
+        now = self.clock.time() if now is None else now
+        namespaces = None if namespaces is None else json.dumps(sorted(namespaces))
+        rows = self._transaction(lambda cursor: cursor.execute('''
+            UPDATE tasks SET status = 'PENDING', assigned_to = NULL, lease_expires_at = NULL
+            WHERE status = 'IN_PROGRESS' AND lease_expires_at < ? AND (? IS NULL OR session_id = ?)
+              AND (? IS NULL OR namespace IN (SELECT value FROM json_each(?)))
+            RETURNING id
+        ''', (now, session_id, session_id, namespaces, namespaces)).fetchall())
+        for (task_id,) in rows:
+            self._started_at.pop(task_id, None)
+        if rows:
+            self.notify_change()
+        return [task_id for (task_id,) in rows]
+
+    @_timed
+    def terminate_agents(self, session_id):
+        # Agents left registered by a hive that is gone
+        self.flush()
+        self._transaction(lambda cursor: cursor.execute(
+            "UPDATE agents SET status = 'TERMINATED' WHERE session_id = ? AND status != 'TERMINATED'", (session_id,)))
+
+    @_timed
+    def renew_leases(self, session_id):
+        # Keep a paused session's tasks owned; their workers send no progress while they wait
+        self._transaction(lambda cursor: cursor.execute(
+            "UPDATE tasks SET lease_expires_at = ? WHERE status = 'IN_PROGRESS' AND lease_expires_at IS NOT NULL AND session_id = ?",
+            (self.lease_deadline(), session_id)))
+
+    @_timed
+    def schedule_retry(self, task_id, error, retry_at):
+        # A failed run with budget left: park the task until retry_at
+        self._task_stopped(task_id)
+        return self._transaction(lambda cursor: cursor.execute('''
+            UPDATE tasks SET status = 'RETRY_SCHEDULED', assigned_to = NULL, attempts = COALESCE(attempts, 0) + 1,
+                next_attempt_at = ?, last_error = ?, lease_expires_at = NULL
+            WHERE id = ? AND status = 'IN_PROGRESS'
+        ''', (retry_at, error, task_id)).rowcount == 1)
 
+    @_timed
+    def release_retry(self, task_id):
+        # Backoff elapsed: the task is dispatchable again
+        released = self._transaction(lambda cursor: cursor.execute(
+            "UPDATE tasks SET status = 'PENDING', next_attempt_at = NULL WHERE id = ? AND status = 'RETRY_SCHEDULED'", (task_id,)
+        ).rowcount == 1)
+        if released:
+            self.notify_change()
+        return released
+
+    @_timed
+    def fail_task(self, task_id, error, role=None):
+        # Out of retries: mark the task FAILED and file it in the dead-letter queue
+        self._task_stopped(task_id)
+        now = self.clock.time()
+        def fail(cursor):
+            cursor.execute('''
+                UPDATE tasks SET status = 'FAILED', assigned_to = NULL, attempts = COALESCE(attempts, 0) + 1,
+                    next_attempt_at = NULL, last_error = ?, lease_expires_at = NULL
+                WHERE id = ? AND status IN ('IN_PROGRESS', 'RETRY_SCHEDULED')
+            ''', (error, task_id))
+            if cursor.rowcount != 1:
+                return False
+            cursor.execute('''
+                INSERT OR REPLACE INTO dead_letters (task_id, session_id, namespace, role, description, attempts, error, failed_at)
+                SELECT id, session_id, namespace, COALESCE(role, ?), description, attempts, last_error, ? FROM tasks WHERE id = ?
+            ''', (role, now, task_id))
+            return True
+        return self._transaction(fail)
+
+    @_timed
+    def get_scheduled_retries(self, session_id="default"):
+        # (task_id, next_attempt_at, namespace) for a session's RETRY_SCHEDULED tasks, e.g. to rebuild timers after a restart
+        return self._read("SELECT id, next_attempt_at, namespace FROM tasks WHERE session_id = ? AND status = 'RETRY_SCHEDULED'", (session_id,))
+
+    @_timed
+    def get_dead_letters(self, session_id="default", limit=100):
+        return self._read('''
+            SELECT task_id, role, description, attempts, error, failed_at FROM dead_letters
+            WHERE session_id = ? ORDER BY failed_at DESC LIMIT ?
+        ''', (session_id, limit))
+
+    @_timed
+    def requeue_dead_letter(self, task_id):
+        # Give a dead-lettered task a fresh retry budget
+        def requeue(cursor):
+            cursor.execute("UPDATE tasks SET status = 'PENDING', attempts = 0 WHERE id = ? AND status = 'FAILED'", (task_id,))
+            if cursor.rowcount != 1:
+                return False
+            cursor.execute("DELETE FROM dead_letters WHERE task_id = ?", (task_id,))
+            return True
+        requeued = self._transaction(requeue)
+        if requeued:
+            self.notify_change()
+        return requeued
+
+    @_timed
     def set_system_state(self, key, value, session_id):
-        cursor = self.conn.cursor()
-        cursor.execute("INSERT OR REPLACE INTO system_state (key, value, session_id) VALUES (?, ?, ?)", (key, value, session_id))
-        self.conn.commit()
+        self._transaction(lambda cursor: cursor.execute(
+            "INSERT OR REPLACE INTO system_state (key, value, session_id) VALUES (?, ?, ?)", (key, value, session_id)))
+        self.notify_change()
 
+    @_timed
     def get_system_state(self, key, session_id):
-        cursor = self.conn.cursor()
-        cursor.execute("SELECT value FROM system_state WHERE key = ? AND session_id = ?", (key, session_id))
-        row = cursor.fetchone()
-        return row[0] if row else None
+        rows = self._read("SELECT value FROM system_state WHERE key = ? AND session_id = ?", (key, session_id))
+        return rows[0][0] if rows else None
+
+    # Queens sharing a session: membership rows "queen:<session>:<member>" hold
+    # the member's heartbeat expiry, shard rows "shard:<session>:<namespace>"
+    # a {"owner", "expires"} lease
+    @_timed
+    def heartbeat_member(self, session_id, member_id, expires_at):
+        self._transaction(lambda cursor: cursor.execute(
+            "INSERT OR REPLACE INTO system_state (key, value, session_id) VALUES (?, ?, ?)",
+            (f"queen:{session_id}:{member_id}", str(expires_at), session_id)))
+
+    @_timed
+    def live_members(self, session_id, now=None):
+        now = self.clock.time() if now is None else now
+        prefix = f"queen:{session_id}:"
+        rows = self._read("SELECT key FROM system_state WHERE session_id = ? AND key LIKE ? AND CAST(value AS REAL) > ?",
+                          (session_id, prefix + "%", now))
+        return [key[len(prefix):] for key, in rows]
+
+    @_timed
+    def acquire_shards(self, session_id, shards, member_id, expires_at, now=None):
+        """
+        Take or renew the lease on each shard that is free, expired or already
+        ours. Returns the shards now held by member_id.
+        """
+        now = self.clock.time() if now is None else now
+        lease = json.dumps({"owner": member_id, "expires": expires_at})
+        def acquire(cursor):
+            held = set()
+            for shard in shards:
+                row = cursor.execute('''
+                    INSERT INTO system_state (key, value, session_id) VALUES (?, ?, ?)
+                    ON CONFLICT(key) DO UPDATE SET value = excluded.value
+                    WHERE json_extract(system_state.value, '$.owner') = ? OR json_extract(system_state.value, '$.expires') <= ?
+                    RETURNING key
+                ''', (f"shard:{session_id}:{shard}", lease, session_id, member_id, now)).fetchone()
+                if row is not None:
+                    held.add(shard)
+            return held
+        return self._transaction(acquire)
+
+    @_timed
+    def release_shards(self, session_id, shards, member_id):
+        keys = [f"shard:{session_id}:{shard}" for shard in shards]
+        if not keys:
+            return
+        placeholders = ",".join("?" * len(keys))
+        self._transaction(lambda cursor: cursor.execute(
+            f"DELETE FROM system_state WHERE key IN ({placeholders}) AND json_extract(value, '$.owner') = ?", (*keys, member_id)))
+
+    @_timed
+    def leave_session(self, session_id, member_id):
+        # Drop a Queen's membership and every shard lease it holds, so the others rebalance straight away
+        self._transaction(lambda cursor: cursor.execute('''
+            DELETE FROM system_state WHERE session_id = ?
+              AND (key = ? OR CASE WHEN key LIKE ? THEN json_extract(value, '$.owner') END = ?)
+        ''', (session_id, f"queen:{session_id}:{member_id}", f"shard:{session_id}:%", member_id)))
+
+    @_timed
+    def shard_owners(self, session_id):
+        # {namespace: (owner, lease expiry)}
+        prefix = f"shard:{session_id}:"
+        rows = self._read("SELECT key, value FROM system_state WHERE session_id = ? AND key LIKE ?", (session_id, prefix + "%"))
+        owners = {}
+        for key, value in rows:
+            lease = json.loads(value)
+            owners[key[len(prefix):]] = (lease["owner"], lease["expires"])
+        return owners
+
+    @_timed
+    def _apply_writes(self, ops):
+        agents, completions, logs = [], [], []
+        progress, statuses = {}, {}
+        for op in ops:
+            kind = op[0]
+            if kind == "agent":
+                agents.append(op[1])
+            elif kind == "complete":
+                completions.append(op[1])
+            elif kind == "log":
+                logs.append(op[1])
+            elif kind == "progress":
+                # Last value wins, but never drop an output path seen earlier
+                _, task_id, value, output_path, lease = op
+                previous = progress.get(task_id)
+                if output_path is None and previous:
+                    output_path = previous[1]
+                progress[task_id] = (value, output_path, lease)
+            elif kind == "agent_status":
+                statuses[op[1]] = op[2]
+        if not ops:
+            return
+
+        def apply(cursor):
+            if agents:
+                cursor.executemany("INSERT OR REPLACE INTO agents (id, role, supervisor_id, capabilities, status, session_id) VALUES (?, ?, ?, ?, 'IDLE', ?)", agents)
+            if completions:
+                cursor.executemany("UPDATE tasks SET status = 'COMPLETED', result = ?, completed_at = ?, lease_expires_at = NULL WHERE id = ?",
+                                   completions)
+            if progress:
+                cursor.executemany('''
+                    UPDATE tasks SET progress = ?, output_path = COALESCE(?, output_path),
+                        lease_expires_at = CASE WHEN status = 'IN_PROGRESS' THEN ? ELSE lease_expires_at END
+                    WHERE id = ?
+                ''', [(value, output_path, lease, task_id) for task_id, (value, output_path, lease) in progress.items()])
+            if statuses:
+                cursor.executemany("UPDATE agents SET status = ? WHERE id = ?", [(status, agent_id) for agent_id, status in statuses.items()])
+            if logs:
+                cursor.executemany("INSERT INTO logs (agent_id, action, details, timestamp, namespace, session_id) VALUES (?, ?, ?, ?, ?, ?)", logs)
+        self._transaction(apply)
 
+    def close(self):
+        if self.writer:
+            self.writer.close()
+            self.writer = None
+        self.pool.close()
+
+    @_timed
     def get_all_agents(self, session_id="default"):
-        cursor = self.conn.cursor()
-        cursor.execute("SELECT id, role, capabilities, status FROM agents WHERE session_id = ?", (session_id,))
-        return cursor.fetchall()
+        return self._read("SELECT id, role, capabilities, status FROM agents WHERE session_id = ?", (session_id,))
+
+def open_storage(engine="sqlite", path="hive_memory.db", **kwargs):
+    """
+    A Storage for `engine`: "sqlite" is a SharedMemory on the database at
+    `path`; "memory" is an InMemoryStorage that starts from, and snapshots
+    to, `path` if given (pass snapshot_interval to snapshot periodically).
+    """
+    if engine == "sqlite":
+        return SharedMemory(path, **kwargs)
+    if engine == "memory":
+        return InMemoryStorage(path, **kwargs)
+    raise ValueError(f"Unknown storage engine: {engine}")
 
 class MessageBus:
-    def __init__(self):
+    """
+    Routes messages to per-agent inboxes and drains them on an executor, so
+    publish() returns immediately and different agents run in parallel while
+    each agent still sees its own messages one at a time, in order.
+
+    executor: "thread" (ThreadPoolExecutor), "asyncio" (event loop on a
+    background thread) or "sync" (inline delivery, the old behaviour).
+    """
+    def __init__(self, executor: str = "thread", max_workers: int = 64, clock=None):
         self.subscribers: Dict[str, List[Callable]] = {}
+        # Held once per queued message, so a simulated clock waits for deliveries
+        self.clock = clock or RealClock()
+        self.inboxes: Dict[str, deque] = {}
+        self.executor_type = executor
+        self._draining = set()
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._idle = threading.Condition(self._lock)
+        self._pool = None
+        self._loop = None
+        self._loop_thread = None
+
+        if executor == "thread":
+            self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="hive-bus")
+        elif executor == "asyncio":
+            self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="hive-bus")
+            self._loop = asyncio.new_event_loop()
+            self._loop.set_default_executor(self._pool)
+            self._loop_thread = threading.Thread(target=self._loop.run_forever, name="hive-bus-loop", daemon=True)
+            self._loop_thread.start()
+        elif executor != "sync":
+            raise ValueError(f"Unknown MessageBus executor: {executor}")
 
     def subscribe(self, agent_id: str, callback: Callable):
-        if agent_id not in self.subscribers:
-            self.subscribers[agent_id] = []
-        self.subscribers[agent_id].append(callback)
+        with self._lock:
+            if agent_id not in self.subscribers:
+                self.subscribers[agent_id] = []
+                self.inboxes[agent_id] = deque()
+            self.subscribers[agent_id].append(callback)
+
+    def unsubscribe(self, agent_id: str):
+        with self._lock:
+            self.subscribers.pop(agent_id, None)
+            inbox = self.inboxes.pop(agent_id, None)
+            # Undelivered messages are dropped
+            if inbox:
+                self._pending -= len(inbox)
+                self.clock.release(len(inbox))
+                if self._pending == 0:
+                    self._idle.notify_all()
 
     def publish(self, message: Message):
-        # Direct delivery
-        if message.receiver_id in self.subscribers:
-            for callback in self.subscribers[message.receiver_id]:
+        receiver_id = message.receiver_id
+        if self.executor_type == "sync":
+            # Direct delivery
+            for callback in self.subscribers.get(receiver_id, []):
                 callback(message)
+        else:
+            with self._lock:
+                inbox = self.inboxes.get(receiver_id)
+                if inbox is not None:
+                    inbox.append(message)
+                    self._pending += 1
+                    self.clock.hold()
+                    schedule = receiver_id not in self._draining
+                    if schedule:
+                        self._draining.add(receiver_id)
+                else:
+                    schedule = False
+            if schedule:
+                self._schedule(receiver_id)
         self.process_message(message)
 
+    def _schedule(self, agent_id: str):
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._loop.create_task, self._drain_async(agent_id))
+        else:
+            self._pool.submit(self._drain, agent_id)
+
+    def _next_message(self, agent_id: str) -> Optional[Message]:
+        with self._lock:
+            inbox = self.inboxes.get(agent_id)
+            if not inbox:
+                # Nothing left; release the agent so the next publish reschedules it
+                self._draining.discard(agent_id)
+                return None
+            return inbox.popleft()
+
+    def _deliver(self, agent_id: str, message: Message):
+        metrics.BUS_DELIVERY_SECONDS.observe(time.time() - message.timestamp, (message.msg_type.value,))
+        try:
+            for callback in list(self.subscribers.get(agent_id, [])):
+                try:
+                    callback(message)
+                except Exception:
+                    logger.exception(f"Delivery of {message.msg_type.value} to {agent_id} failed")
+        finally:
+            with self._lock:
+                self._pending -= 1
+                self.clock.release()
+                if self._pending == 0:
+                    self._idle.notify_all()
+
+    def _drain(self, agent_id: str):
+        while True:
+            message = self._next_message(agent_id)
+            if message is None:
+                return
+            self._deliver(agent_id, message)
+
+    async def _drain_async(self, agent_id: str):
+        while True:
+            message = self._next_message(agent_id)
+            if message is None:
+                return
+            callbacks = self.subscribers.get(agent_id, [])
+            if callbacks and all(asyncio.iscoroutinefunction(cb) for cb in callbacks):
+                metrics.BUS_DELIVERY_SECONDS.observe(time.time() - message.timestamp, (message.msg_type.value,))
+                try:
+                    for callback in callbacks:
+                        await callback(message)
+                except Exception:
+                    logger.exception(f"Delivery of {message.msg_type.value} to {agent_id} failed")
+                finally:
+                    with self._lock:
+                        self._pending -= 1
+                        self.clock.release()
+                        if self._pending == 0:
+                            self._idle.notify_all()
+            else:
+                # Blocking agent code runs on the loop's executor, not the loop itself
+                await self._loop.run_in_executor(None, self._deliver, agent_id, message)
+
+    async def _finish_drains(self, wait: bool):
+        tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+        if not wait:
+            for task in tasks:
+                task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def join(self, timeout: float = None) -> bool:
+        """Block until every published message has been handled."""
+        with self._lock:
+            return self._idle.wait_for(lambda: self._pending == 0, timeout)
+
+    def shutdown(self, wait: bool = True):
+        if wait:
+            self.join()
+        if self._loop is not None:
+            # Let drain tasks unwind (or cancel them) before stopping the loop under them
+            asyncio.run_coroutine_threadsafe(self._finish_drains(wait), self._loop).result()
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._loop_thread.join()
+            self._loop.close()
+        if self._pool is not None:
+            self._pool.shutdown(wait=wait)
+
     def process_message(self, message: Message):
         # Override in subclasses
         pass
 
+class TaskCancelled(Exception):
+    pass
+
+class SessionControl:
+    """
+    Cooperative pause/cancel switch shared by every agent of a session.
+    Workers call checkpoint() between units of work: it blocks while the
+    session is PAUSED and raises TaskCancelled once it is CANCELLED.
+    """
+    _sessions: Dict[str, "SessionControl"] = {}
+    _sessions_lock = threading.Lock()
+    _listeners: List[Callable[[str, str], None]] = []   # fn(session_id, state), e.g. to mirror into worker processes
+
+    def __init__(self, session_id: str):
+        self.session_id = session_id
+        self.state = "RUNNING"
+        self._cond = threading.Condition()
+
+    @classmethod
+    def for_session(cls, session_id: str) -> "SessionControl":
+        with cls._sessions_lock:
+            control = cls._sessions.get(session_id)
+            if control is None:
+                control = cls._sessions[session_id] = cls(session_id)
+            return control
+
+    @classmethod
+    def add_listener(cls, fn: Callable[[str, str], None]):
+        with cls._sessions_lock:
+            cls._listeners.append(fn)
+
+    @classmethod
+    def remove_listener(cls, fn: Callable[[str, str], None]):
+        with cls._sessions_lock:
+            if fn in cls._listeners:
+                cls._listeners.remove(fn)
+
+    @property
+    def paused(self) -> bool:
+        return self.state == "PAUSED"
+
+    @property
+    def cancelled(self) -> bool:
+        return self.state == "CANCELLED"
+
+    def set_state(self, state: str):
+        with self._cond:
+            if state == self.state:
+                return
+            self.state = state
+            self._cond.notify_all()
+        for listener in list(self._listeners):
+            listener(self.session_id, state)
+        logger.info(f"Session {self.session_id} is now {state}")
+
+    def pause(self):
+        self.set_state("PAUSED")
+
+    def resume(self):
+        self.set_state("RUNNING")
+
+    def cancel(self):
+        self.set_state("CANCELLED")
+
+    def checkpoint(self):
+        with self._cond:
+            while self.state == "PAUSED":
+                self._cond.wait()
+            if self.state == "CANCELLED":
+                raise TaskCancelled(f"Session {self.session_id} cancelled")
+
 class BaseAgent:
+    # Keywords describing the work this agent takes on; used for task routing
+    capabilities: List[str] = []
+
     def __init__(self, name: str, role: str, shared_memory: SharedMemory, message_bus: MessageBus, supervisor_id: str = None, session_id: str = "default"):
         self.id = str(uuid.uuid4())
         self.name = name
@@ -227,7 +1218,9 @@ class BaseAgent:
         self.supervisor_id = supervisor_id
         self.session_id = session_id
         self.subordinates = []
-        self.capabilities = []
+        self.capabilities = list(self.capabilities)
+        self.clock = shared_memory.clock
+        self.control = SessionControl.for_session(session_id)
         
         # Register self
         self.memory.register_agent(self.id, self.role, self.supervisor_id, self.capabilities, self.session_id)
@@ -1,25 +1,16 @@
-import sqlite3
-import uuid
-import time
+from hive_core import SharedMemory
 
 DB_PATH = "hive_memory.db"
 
 def inject_citation_task():
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
+    memory = SharedMemory(DB_PATH)
     
-    task_id = str(uuid.uuid4())
     desc = "Cite sources for CRISPR-Cas9 gene editing mechanisms"
     
     print(f"Injecting Citation Task: {desc}")
     
-    cursor.execute('''
-        INSERT INTO tasks (id, description, assigned_to, status, priority, dependencies, created_at, namespace)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-    ''', (task_id, desc, None, "PENDING", 5, "[]", time.time(), "default"))
-        
-    conn.commit()
-    conn.close()
+    memory.create_task(desc, priority=5)
+    memory.close()
     print("Injection complete.")
 
 if __name__ == "__main__":
@@ -1,13 +1,9 @@
-import sqlite3
-import uuid
-import time
-import json
+from hive_core import SharedMemory
 
 DB_PATH = "hive_memory.db"
 
 def inject_scientific_load():
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
+    memory = SharedMemory(DB_PATH)
     
     tasks = [
         ("Visualize Experimental Data Set X", 5),
@@ -20,15 +16,8 @@ def inject_scientific_load():
     
     print(f"Injecting {len(tasks)} scientific tasks...")
     
-    for desc, priority in tasks:
-        task_id = str(uuid.uuid4())
-        cursor.execute('''
-            INSERT INTO tasks (id, description, assigned_to, status, priority, dependencies, created_at, namespace)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (task_id, desc, None, "PENDING", priority, "[]", time.time(), "default"))
-        
-    conn.commit()
-    conn.close()
+    memory.create_tasks_bulk({"description": desc, "priority": priority} for desc, priority in tasks)
+    memory.close()
     print("Scientific Injection complete.")
 
 if __name__ == "__main__":
@@ -0,0 +1,109 @@
+import glob
+import gzip
+import itertools
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict, deque
+from typing import Dict, Iterator, List
+
+# Level of each action; anything not listed is INFO
+DEFAULT_LEVELS = {
+    "RESOURCE": logging.DEBUG,      # "no suitable agent", once per unassignable task per tick
+    "WARNING": logging.WARNING,
+    "TASK_FAILED": logging.WARNING,
+    "DEAD_LETTER": logging.WARNING,
+    "LEASE_EXPIRED": logging.WARNING,
+}
+# Store only every Nth event of these actions (the first one always)
+DEFAULT_SAMPLE = {
+    "DECISION": 20,                 # the coordination mode, logged on every Queen tick
+}
+
+class LogPolicy:
+    """Decides which log events are written to SQLite: a minimum level, then per-action sampling."""
+    def __init__(self, level: int = logging.INFO, levels: Dict[str, int] = None, sample: Dict[str, int] = None):
+        self.level = level
+        self.levels = dict(DEFAULT_LEVELS, **(levels or {}))
+        self.sample = dict(DEFAULT_SAMPLE, **(sample or {}))
+        self._counters = {action: itertools.count() for action in self.sample}
+
+    def should_store(self, action: str) -> bool:
+        if self.levels.get(action, logging.INFO) < self.level:
+            return False
+        counter = self._counters.get(action)
+        # next() on itertools.count is atomic under the GIL
+        return counter is None or next(counter) % self.sample[action] == 0
+
+class RecentLogs:
+    """Ring buffer of the latest log events per session, kept for the most recently active sessions."""
+    def __init__(self, size: int = 200, max_sessions: int = 16):
+        self.size = size
+        self.max_sessions = max_sessions
+        self._buffers: "OrderedDict[str, deque]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def append(self, session_id: str, entry: tuple):
+        with self._lock:
+            buffer = self._buffers.get(session_id)
+            if buffer is None:
+                buffer = self._buffers[session_id] = deque(maxlen=self.size)
+                if len(self._buffers) > self.max_sessions:
+                    self._buffers.popitem(last=False)
+            else:
+                self._buffers.move_to_end(session_id)
+            buffer.append(entry)
+
+    def get(self, session_id: str, limit: int = 20) -> List[tuple]:
+        # Newest first, like the dashboard's log query
+        with self._lock:
+            buffer = self._buffers.get(session_id)
+            if not buffer:
+                return []
+            return list(itertools.islice(reversed(buffer), limit))
+
+LOG_COLUMNS = ("id", "agent_id", "action", "details", "timestamp", "namespace", "session_id")
+
+class LogArchive:
+    """
+    Append-only store for log rows moved out of SQLite: every archival batch
+    becomes one gzip'd JSONL segment, named by its last timestamp and id range
+    so old segments can be dropped without opening them.
+    """
+    def __init__(self, directory: str):
+        self.directory = directory
+
+    def write(self, rows) -> str:
+        if not rows:
+            return None
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, f"{int(rows[-1][4])}-{rows[0][0]}-{rows[-1][0]}.jsonl.gz")
+        # Written under a temporary name, so a reader never sees half a segment
+        with gzip.open(path + ".tmp", "wt", encoding="utf-8") as f:
+            for row in rows:
+                f.write(json.dumps(dict(zip(LOG_COLUMNS, row)), separators=(",", ":")) + "\n")
+        os.replace(path + ".tmp", path)
+        return path
+
+    def segments(self) -> List[str]:
+        def first_id(path):
+            return int(os.path.basename(path).split("-")[1])
+        return sorted(glob.glob(os.path.join(self.directory, "*.jsonl.gz")), key=first_id)
+
+    def read(self, session_id: str = None) -> Iterator[dict]:
+        for path in self.segments():
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                for line in f:
+                    entry = json.loads(line)
+                    if session_id is None or entry["session_id"] == session_id:
+                        yield entry
+
+    def prune(self, before: float) -> int:
+        # Drop segments whose newest entry is older than `before`
+        removed = 0
+        for path in self.segments():
+            if int(os.path.basename(path).split("-")[0]) + 1 <= before:
+                os.remove(path)
+                removed += 1
+        return removed
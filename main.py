@@ -6,29 +6,58 @@ import os
 import signal
 import atexit
 import uuid
-from hive_core import SharedMemory, MessageBus
-from queen import QueenAgent
+import argparse
+from hive_core import MessageBus, open_storage
+from queen import QueenAgent, AgentFactory
+from execution import ProcessPool
+from clock import make_clock
+from sharding import ShardCoordinator
+import metrics
 
 LOCK_FILE = "hive.lock"
 DB_FILE = "hive_memory.db"
+SNAPSHOT_FILE = "hive_snapshot.db"
+# Set by the first cleanup; the signal handler's cleanup is followed by the atexit one
+_cleanup_done = threading.Event()
 
 def cleanup(queen, memory, lock_file):
+    if _cleanup_done.is_set():
+        return
+    _cleanup_done.set()
     print("\n[SYSTEM] Initiating Graceful Shutdown...")
     if queen:
         queen.stop()
+        # Stop accepting deliveries; in-flight tasks finish on their own threads
+        queen.bus.shutdown(wait=False)
+        ProcessPool.shutdown_shared(wait=False)
     
     if memory:
-        print("[SYSTEM] Dumping memory...")
-        memory.dump_memory(f"memory_dump_{int(time.time())}.db")
-        memory.prune_memory()
+        # Only the process holding the lock dumps and prunes the shared store
+        if lock_file:
+            print("[SYSTEM] Dumping memory...")
+            memory.dump_memory(f"memory_dump_{int(time.time())}.db")
+            memory.prune_memory()
+        memory.close()
         
-    if os.path.exists(lock_file):
+    if lock_file and os.path.exists(lock_file):
         os.remove(lock_file)
     print("[SYSTEM] Hive Shutdown Complete. Bye! 🐝")
 
-def run_simulation():
-    # 1. Lock File Check
-    if os.path.exists(LOCK_FILE):
+def previous_session():
+    try:
+        with open("current_session.txt", "r") as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+def run_simulation(process_roles=(), clock=None, metrics_port=None, resume=False, namespace_weights=None, join=False,
+                   storage="sqlite", snapshot_interval=5.0, db_path=DB_FILE):
+    # 1. Lock File Check; a joining process shares the running hive's session instead
+    lock_file = None if join else LOCK_FILE
+    if join and not previous_session():
+        print("[ERROR] No running hive to join (current_session.txt not found).")
+        sys.exit(1)
+    if lock_file and os.path.exists(LOCK_FILE):
         try:
             with open(LOCK_FILE, 'r') as f:
                 pid = int(f.read().strip())
@@ -44,35 +73,61 @@ def run_simulation():
             print("[SYSTEM] Corrupt lock file found. Overwriting.")
 
     # Create Lock File
-    with open(LOCK_FILE, 'w') as f:
-        f.write(str(os.getpid()))
+    if lock_file:
+        with open(LOCK_FILE, 'w') as f:
+            f.write(str(os.getpid()))
 
     # 2. Session Management
-    session_id = str(uuid.uuid4())
+    session_id = previous_session() if resume or join else None
+    if resume and not session_id:
+        print("[SYSTEM] No previous session to resume; starting a new one.")
+        resume = False
+    session_id = session_id or str(uuid.uuid4())
     project_name = f"Project-Hive-{int(time.time())}"
     print(f"Initializing AI Hive System...")
     print(f"Project: {project_name}")
     print(f"Session ID: {session_id}")
     
-    with open("current_session.txt", "w") as f:
-        f.write(session_id)
+    if not join:
+        with open("current_session.txt", "w") as f:
+            f.write(session_id)
     
-    # Setup Infrastructure
-    memory = SharedMemory(DB_FILE)
-    bus = MessageBus()
+    # CPU-bound roles run their work in a process pool instead of agent threads
+    for role in process_roles:
+        AgentFactory.set_backend(role, "process")
+
+    # Setup Infrastructure; the in-memory engine snapshots to db_path, its own file (see --db)
+    if storage == "memory":
+        memory = open_storage("memory", db_path, clock=clock, snapshot_interval=snapshot_interval)
+    else:
+        memory = open_storage("sqlite", db_path, clock=clock)
+    bus = MessageBus(clock=clock)
+
+    if resume and not memory.live_members(session_id):
+        # We hold the lock file and no joined process is alive, so nothing else owns this session's IN_PROGRESS tasks
+        reclaimed = memory.reclaim_expired_leases(session_id, now=float("inf"))
+        memory.terminate_agents(session_id)
+        print(f"Resuming session: {len(reclaimed)} interrupted tasks back in the queue.")
+    elif resume:
+        print("Resuming session: other hive processes are live; interrupted tasks return as their leases expire.")
     
-    # Initialize Queen with Session ID
-    queen = QueenAgent("Queen-Alpha", memory, bus, session_id=session_id)
+    # Initialize Queen with Session ID; namespaces are split between every hive process on the session
+    shards = ShardCoordinator(memory, session_id)
+    queen = QueenAgent("Queen-Joined" if join else "Queen-Alpha", memory, bus, session_id=session_id,
+                       namespace_weights=namespace_weights, shards=shards)
     print("Queen Agent Online.")
+    if metrics_port:
+        metrics.serve(metrics_port)
+        print(f"Metrics at http://localhost:{metrics_port}/metrics")
     
     # Register Cleanup
     def signal_handler(sig, frame):
-        cleanup(queen, memory, LOCK_FILE)
+        cleanup(queen, memory, lock_file)
         sys.exit(0)
         
     signal.signal(signal.SIGINT, signal_handler)
     signal.signal(signal.SIGTERM, signal_handler)
-    atexit.register(cleanup, queen, memory, LOCK_FILE)
+    atexit.register(cleanup, queen, memory, lock_file)
     
     # Simulate Task Injection
     tasks = [
@@ -88,13 +143,13 @@ def run_simulation():
         "Optimize API Latency"
     ]
     
-    print(f"Injecting {len(tasks)} tasks...")
-    
-    for i, task_desc in enumerate(tasks):
-        memory.create_task(task_desc, priority=1, session_id=session_id)
-        time.sleep(0.5) # Stagger injection slightly
-        
-    print("Tasks injected. Monitoring system...")
+    if join:
+        print(f"Joined the running hive as {shards.member_id}.")
+    elif not resume:
+        print(f"Injecting {len(tasks)} tasks...")
+        memory.create_tasks_bulk(({"description": task_desc, "priority": 1} for task_desc in tasks), session_id=session_id)
+        print("Tasks injected.")
+    print("Monitoring system...")
     print("NOTE: Run 'python dashboard.py' to view the Hive Matrix in your browser.")
     
     try:
@@ -106,4 +161,50 @@ def run_simulation():
         pass
 
 if __name__ == "__main__":
-    run_simulation()
+    parser = argparse.ArgumentParser(description="Run the AI Hive simulation")
+    parser.add_argument("--process-roles", default="",
+                        help="comma-separated roles whose work runs in a process pool, e.g. STATISTICIAN,VISUALIZER")
+    parser.add_argument("--clock", choices=["real", "scaled", "simulated"], default="real",
+                        help="scaled runs time --speed times faster; simulated jumps between events")
+    parser.add_argument("--speed", type=float, default=10.0, help="speed-up for --clock scaled")
+    parser.add_argument("--resume", action="store_true",
+                        help="continue the last session: reclaim its interrupted tasks instead of injecting new ones")
+    parser.add_argument("--metrics-port", type=int, default=None, help="serve Prometheus metrics on this port")
+    parser.add_argument("--seed", type=int, default=None, help="seed worker randomness for repeatable runs")
+    parser.add_argument("--join", action="store_true",
+                        help="add this process to the running hive's session; namespaces are split between the processes")
+    parser.add_argument("--db", default=None,
+                        help=f"database file (default {DB_FILE}, which the dashboard and scripts follow); "
+                             f"with --storage memory, the snapshot file (default {SNAPSHOT_FILE})")
+    parser.add_argument("--storage", choices=["sqlite", "memory"], default="sqlite",
+                        help="keep hive state in SQLite, or in memory with periodic snapshots to a file of its own")
+    parser.add_argument("--snapshot-interval", type=float, default=5.0, help="seconds between snapshots with --storage memory")
+    parser.add_argument("--namespace-weight", action="append", default=[], metavar="NAMESPACE=WEIGHT",
+                        help="share of dispatch for a namespace relative to the others (default 1); repeatable")
+    args = parser.parse_args()
+    if args.storage == "memory" and args.join:
+        parser.error("--join needs the shared database; it can't be combined with --storage memory")
+    if args.snapshot_interval <= 0:
+        parser.error("--snapshot-interval must be positive")
+    db_path = args.db or (SNAPSHOT_FILE if args.storage == "memory" else DB_FILE)
+    # A snapshot replaces the whole file, wiping whatever the dashboard and scripts wrote there
+    if args.storage == "memory" and os.path.abspath(db_path) == os.path.abspath(DB_FILE):
+        parser.error(f"--storage memory snapshots over its --db; give it a file of its own, not the shared {DB_FILE}")
+    weights = {}
+    for item in args.namespace_weight:
+        namespace, _, weight = item.rpartition("=")
+        try:
+            weights[namespace] = float(weight)
+        except ValueError:
+            parser.error(f"--namespace-weight expects NAMESPACE=WEIGHT, got {item!r}")
+        if not namespace or weights[namespace] <= 0:
+            parser.error(f"--namespace-weight expects NAMESPACE=WEIGHT with a positive weight, got {item!r}")
+    process_roles = [role.strip().upper() for role in args.process_roles.split(",") if role.strip()]
+    if process_roles and args.clock == "simulated":
+        parser.error("--process-roles needs --clock real or scaled: pool processes can't follow simulated time")
+    # Simulated time runs far ahead of the wall clock; its timestamps don't belong in the shared database
+    if args.clock == "simulated" and os.path.abspath(db_path) == os.path.abspath(DB_FILE):
+        parser.error(f"--clock simulated needs a private --db, not the shared {DB_FILE} "
+                     "(or replay offline with scenario_runner.py --replay)")
+    run_simulation(process_roles, make_clock(args.clock, args.speed, args.seed), args.metrics_port, args.resume, weights, args.join,
+                   args.storage, args.snapshot_interval, db_path)
@@ -0,0 +1,216 @@
+import threading
+import weakref
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Tuple
+
+# Seconds; spans sub-millisecond SQL statements up to multi-second tasks
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        # Prometheus text exposition format
+        with self._lock:
+            metrics = list(self.metrics)
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+REGISTRY = Registry()
+
+def _labels(names, values, extra=""):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _number(value) -> str:
+    value = float(value)
+    return str(int(value)) if value.is_integer() else repr(value)
+
+class _ShardedMetric:
+    """
+    Every thread updates its own dict of label values -> aggregate, so the hot
+    path never takes a lock; shards are only merged when someone scrapes.
+    Shards of threads that have exited are folded into `_retired` then.
+    """
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = (), registry: Registry = REGISTRY):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labels)
+        self._local = threading.local()
+        self._shards = []
+        self._retired: Dict[tuple, object] = {}
+        self._lock = threading.Lock()
+        if registry is not None:
+            registry.register(self)
+
+    def _shard(self) -> dict:
+        try:
+            return self._local.values
+        except AttributeError:
+            values = self._local.values = {}
+            with self._lock:
+                self._shards.append((threading.current_thread(), values))
+            return values
+
+    def collect(self) -> Dict[tuple, object]:
+        with self._lock:
+            merged = {labels: self._copy(value) for labels, value in self._retired.items()}
+            live = []
+            for thread, values in self._shards:
+                # list() copies in one step under the GIL, so a concurrent insert can't break iteration
+                items = list(values.items())
+                target = merged
+                if not thread.is_alive():
+                    target = self._retired
+                else:
+                    live.append((thread, values))
+                for labels, value in items:
+                    self._merge(target, labels, value)
+                    if target is self._retired:
+                        self._merge(merged, labels, value)
+            self._shards = live
+        return merged
+
+    def _copy(self, value):
+        return value
+
+    def _merge(self, target, labels, value):
+        raise NotImplementedError
+
+class Counter(_ShardedMetric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1.0, labels: tuple = ()):
+        values = self._shard()
+        values[labels] = values.get(labels, 0) + amount
+
+    def _merge(self, target, labels, value):
+        target[labels] = target.get(labels, 0) + value
+
+    def render(self):
+        return [f"{self.name}{_labels(self.labelnames, labels)} {_number(value)}" for labels, value in sorted(self.collect().items())]
+
+class Histogram(_ShardedMetric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = (), buckets=DEFAULT_BUCKETS, registry: Registry = REGISTRY):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, help, labels, registry)
+
+    def observe(self, value: float, labels: tuple = ()):
+        # Per-bucket (not cumulative) counts, one overflow slot, then the running sum
+        values = self._shard()
+        counts = values.get(labels)
+        if counts is None:
+            counts = values[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+        counts[bisect_left(self.buckets, value)] += 1
+        counts[-1] += value
+
+    def _copy(self, value):
+        return list(value)
+
+    def _merge(self, target, labels, value):
+        current = target.get(labels)
+        if current is None:
+            target[labels] = list(value)
+        else:
+            for i, v in enumerate(value):
+                current[i] += v
+
+    def render(self):
+        lines = []
+        for labels, counts in sorted(self.collect().items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = 'le="+Inf"' if bound == float("inf") else f'le="{bound!r}"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {_number(counts[-1])}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {cumulative}")
+        return lines
+
+class Gauge:
+    """
+    A value computed on scrape by a function returning {label values: value}.
+    Nothing is tracked between scrapes. Bound methods are held weakly, so
+    pointing a gauge at an object doesn't keep it alive.
+    """
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = (), registry: Registry = REGISTRY):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labels)
+        self._function = None
+        if registry is not None:
+            registry.register(self)
+
+    def set_function(self, fn: Callable[[], Dict[tuple, float]]):
+        self._function = weakref.WeakMethod(fn) if hasattr(fn, "__self__") else (lambda: fn)
+
+    def collect(self) -> Dict[tuple, float]:
+        fn = self._function() if self._function else None
+        return fn() if fn else {}
+
+    def render(self):
+        return [f"{self.name}{_labels(self.labelnames, labels)} {_number(value)}" for labels, value in sorted(self.collect().items())]
+
+# Hive metrics. Durations of hive events (time in state, dispatch) are in
+# clock seconds, so a simulated replay reports virtual time; SQLite and bus
+# latencies are real seconds.
+QUEUE_DEPTH = Gauge("hive_queue_depth", "PENDING tasks per namespace", ("namespace",))
+AGENTS = Gauge("hive_agents", "Worker agents per role and status", ("role", "status"))
+AGENT_BUSY_SECONDS = Counter("hive_agent_busy_seconds_total", "Time agents spent on tasks, per role; rate() over hive_agents is utilization", ("role",))
+DISPATCH_SECONDS = Histogram("hive_dispatch_latency_seconds", "Time from a task becoming ready (dependencies done) to its assignment", ("role",))
+TASK_STATE_SECONDS = Histogram("hive_task_state_seconds", "Time a task spent in a state before leaving it", ("state",))
+TASKS_FINISHED = Counter("hive_tasks_finished_total", "Task outcomes reported by workers", ("role", "status"))
+LEASES_RECLAIMED = Counter("hive_leases_reclaimed_total", "IN_PROGRESS tasks handed back to PENDING after their lease expired")
+TASK_FAILURES = Counter("hive_task_failures_total", "Failed runs by what happened next: retry or dead_letter", ("role", "outcome"))
+SQL_SECONDS = Histogram("hive_sqlite_seconds", "Latency of SharedMemory database calls", ("method",))
+BUS_DELIVERY_SECONDS = Histogram("hive_bus_delivery_seconds", "Time from creating a message to its handler starting", ("type",))
+
+def render() -> str:
+    return REGISTRY.render()
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def serve(port: int, host: str = "0.0.0.0") -> ThreadingHTTPServer:
+    """Expose render() at http://host:port/metrics from a daemon thread."""
+    server = ThreadingHTTPServer((host, port), _Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-exporter", daemon=True).start()
+    return server
@@ -1,145 +1,534 @@
 import time
 import threading
-from typing import List, Dict
-from hive_core import BaseAgent, Message, MessageType, SharedMemory, MessageBus
+import metrics
+from typing import List, Dict, Optional
+from hive_core import BaseAgent, Message, MessageType, SharedMemory, MessageBus, logger
 from cognitive_models import NeuralCortex
+from scheduler import DependencyScheduler
+from routing import CapabilityRouter
+from execution import ProcessPool
+from clock import RealClock
+from retry import RetryPolicy, TimerWheel
+from sharding import ShardCoordinator
 from workers import ArchitectAgent, CoderAgent, TesterAgent, AnalystAgent, ResearcherAgent, VisualizationAgent, StatisticianAgent, DocumentationAgent, CitationAgent
 
 class AgentFactory:
-    @staticmethod
-    def create_agent(agent_type: str, shared_memory, message_bus, supervisor_id, session_id="default") -> BaseAgent:
-        if agent_type == "ARCHITECT":
-            return ArchitectAgent("Architect-" + str(int(time.time())), "ARCHITECT", shared_memory, message_bus, supervisor_id, session_id)
-        elif agent_type == "CODER":
-            return CoderAgent("Coder-" + str(int(time.time())), "CODER", shared_memory, message_bus, supervisor_id, session_id)
-        elif agent_type == "TESTER":
-            return TesterAgent("Tester-" + str(int(time.time())), "TESTER", shared_memory, message_bus, supervisor_id, session_id)
-        elif agent_type == "ANALYST":
-            return AnalystAgent("Analyst-" + str(int(time.time())), "ANALYST", shared_memory, message_bus, supervisor_id, session_id)
-        elif agent_type == "RESEARCHER":
-            return ResearcherAgent("Researcher-" + str(int(time.time())), "RESEARCHER", shared_memory, message_bus, supervisor_id, session_id)
-        elif agent_type == "VISUALIZER":
-            return VisualizationAgent("Visualizer-" + str(int(time.time())), "VISUALIZER", shared_memory, message_bus, supervisor_id, session_id)
-        elif agent_type == "STATISTICIAN":
-            return StatisticianAgent("Statistician-" + str(int(time.time())), "STATISTICIAN", shared_memory, message_bus, supervisor_id, session_id)
-        elif agent_type == "DOCUMENTER":
-            return DocumentationAgent("Documenter-" + str(int(time.time())), "DOCUMENTER", shared_memory, message_bus, supervisor_id, session_id)
-        elif agent_type == "CITATION_MANAGER":
-            return CitationAgent("CitationMgr-" + str(int(time.time())), "CITATION_MANAGER", shared_memory, message_bus, supervisor_id, session_id)
-        return None
+    # role -> (agent class, name prefix). Registration order is the router's
+    # tie-break order, so the catch-all CODER goes last.
+    AGENT_TYPES = {
+        "ARCHITECT": (ArchitectAgent, "Architect"),
+        "TESTER": (TesterAgent, "Tester"),
+        "STATISTICIAN": (StatisticianAgent, "Statistician"),
+        "ANALYST": (AnalystAgent, "Analyst"),
+        "RESEARCHER": (ResearcherAgent, "Researcher"),
+        "VISUALIZER": (VisualizationAgent, "Visualizer"),
+        "DOCUMENTER": (DocumentationAgent, "Documenter"),
+        "CITATION_MANAGER": (CitationAgent, "CitationMgr"),
+        "CODER": (CoderAgent, "Coder"),
+    }
+    # role -> execution backend: "thread" (default) or "process" for CPU-bound roles
+    BACKENDS: Dict[str, str] = {}
+
+    @classmethod
+    def register(cls, agent_type: str, agent_class, name_prefix: str = None):
+        cls.AGENT_TYPES[agent_type] = (agent_class, name_prefix or agent_type.title())
+
+    @classmethod
+    def set_backend(cls, agent_type: str, backend: str):
+        if backend not in ("thread", "process"):
+            raise ValueError(f"Unknown execution backend: {backend}")
+        cls.BACKENDS[agent_type] = backend
+
+    @classmethod
+    def create_agent(cls, agent_type: str, shared_memory, message_bus, supervisor_id, session_id="default", backend: str = None) -> BaseAgent:
+        if agent_type not in cls.AGENT_TYPES:
+            return None
+        agent_class, prefix = cls.AGENT_TYPES[agent_type]
+        agent = agent_class(prefix + "-" + str(int(time.time())), agent_type, shared_memory, message_bus, supervisor_id, session_id)
+        if (backend or cls.BACKENDS.get(agent_type, "thread")) == "process":
+            agent.pool = ProcessPool.shared()
+        return agent
+
+    @classmethod
+    def build_router(cls, default_role: str = "CODER") -> CapabilityRouter:
+        return CapabilityRouter({role: agent_class.capabilities for role, (agent_class, _) in cls.AGENT_TYPES.items()}, default_role)
+
+class AgentRegistry:
+    """
+    In-memory view of the Queen's workers. Idle agents are kept in a
+    free-list per role, so finding one is a dict lookup instead of a scan
+    over the agents table. Status changes are buffered and written to the
+    agents table in one batch by flush().
+    """
+    def __init__(self, clock=None):
+        self.clock = clock or RealClock()
+        self.agents: Dict[str, BaseAgent] = {}
+        self.idle: Dict[str, Dict[str, BaseAgent]] = {}
+        self.busy: Dict[str, str] = {}
+        self.busy_since: Dict[str, float] = {}
+        self.idle_since: Dict[str, float] = {}
+        self.role_counts: Dict[str, int] = {}
+        self._dirty: Dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.agents)
+
+    def add(self, agent: BaseAgent, busy_with: str = None):
+        # busy_with: the task a freshly spawned agent takes at once; it never shows as free
+        with self._lock:
+            self.agents[agent.id] = agent
+            if busy_with is None:
+                self.idle.setdefault(agent.role, {})[agent.id] = agent
+                self.idle_since[agent.id] = self.clock.monotonic()
+            else:
+                self.busy[agent.id] = busy_with
+                self.busy_since[agent.id] = self.clock.monotonic()
+                self._dirty[agent.id] = "BUSY"
+            self.role_counts[agent.role] = self.role_counts.get(agent.role, 0) + 1
+
+    def remove(self, agent_id: str, status: str = "TERMINATED"):
+        with self._lock:
+            agent = self.agents.pop(agent_id, None)
+            if agent is None:
+                return None
+            self.idle.get(agent.role, {}).pop(agent_id, None)
+            self.busy.pop(agent_id, None)
+            self._record_busy(agent)
+            self.idle_since.pop(agent_id, None)
+            self.role_counts[agent.role] -= 1
+            self._dirty[agent_id] = status
+            return agent
+
+    def acquire(self, role: str, task_id: str = None) -> Optional[BaseAgent]:
+        with self._lock:
+            free = self.idle.get(role)
+            if not free:
+                return None
+            # Most recently released first
+            agent_id, agent = free.popitem()
+            self.idle_since.pop(agent_id, None)
+            self.busy[agent_id] = task_id
+            self.busy_since[agent_id] = self.clock.monotonic()
+            self._dirty[agent_id] = "BUSY"
+            return agent
+
+    def release(self, agent_id: str):
+        with self._lock:
+            agent = self.agents.get(agent_id)
+            if agent is None or agent_id not in self.busy:
+                return
+            del self.busy[agent_id]
+            self._record_busy(agent)
+            self.idle.setdefault(agent.role, {})[agent_id] = agent
+            self.idle_since[agent_id] = self.clock.monotonic()
+            self._dirty[agent_id] = "IDLE"
+
+    def _record_busy(self, agent: BaseAgent):
+        since = self.busy_since.pop(agent.id, None)
+        if since is not None:
+            metrics.AGENT_BUSY_SECONDS.inc(self.clock.monotonic() - since, (agent.role,))
+
+    def agent_counts(self) -> Dict[tuple, int]:
+        # (role, status) -> agents; read by the hive_agents gauge on scrape
+        with self._lock:
+            counts = {}
+            for agent_id, agent in self.agents.items():
+                key = (agent.role, "BUSY" if agent_id in self.busy else "IDLE")
+                counts[key] = counts.get(key, 0) + 1
+            return counts
+
+    def busy_tasks(self) -> Dict[str, str]:
+        # agent_id -> task_id for every busy agent
+        with self._lock:
+            return dict(self.busy)
+
+    def idle_count(self, role: str) -> int:
+        return len(self.idle.get(role, ()))
+
+    def role_count(self, role: str) -> int:
+        return self.role_counts.get(role, 0)
+
+    def idle_expired(self, ttl: float) -> List[BaseAgent]:
+        # Oldest idlers first
+        cutoff = self.clock.monotonic() - ttl
+        with self._lock:
+            expired = [agent_id for agent_id, since in self.idle_since.items() if since <= cutoff]
+            expired.sort(key=self.idle_since.get)
+            return [self.agents[agent_id] for agent_id in expired]
+
+    def rearm_idle(self, agent_id: str):
+        # An expired idler we decided to keep gets a fresh TTL instead of expiring on every pass
+        with self._lock:
+            if agent_id in self.idle_since:
+                self.idle_since[agent_id] = self.clock.monotonic()
+
+    def next_idle_expiry(self, ttl: float) -> Optional[float]:
+        # Seconds until the longest-idle agent passes the TTL, or None if nobody is idle
+        with self._lock:
+            if not self.idle_since:
+                return None
+            return max(0.0, min(self.idle_since.values()) + ttl - self.clock.monotonic())
+
+    def flush(self, memory: SharedMemory):
+        with self._lock:
+            if not self._dirty:
+                return
+            dirty, self._dirty = self._dirty, {}
+        memory.update_agent_statuses(dirty.items())
+
+# (minimum kept warm, maximum alive) per role
+DEFAULT_ROLE_LIMITS = {
+    "ARCHITECT": (0, 6),
+    "CODER": (1, 12),
+    "TESTER": (0, 10),
+    "ANALYST": (0, 8),
+    "RESEARCHER": (0, 8),
+    "VISUALIZER": (0, 4),
+    "STATISTICIAN": (0, 4),
+    "DOCUMENTER": (0, 4),
+    "CITATION_MANAGER": (0, 4),
+}
 
 class QueenAgent(BaseAgent):
-    def __init__(self, name: str, shared_memory: SharedMemory, message_bus: MessageBus, session_id: str = "default"):
+    def __init__(self, name: str, shared_memory: SharedMemory, message_bus: MessageBus, session_id: str = "default",
+                 role_limits: Dict[str, tuple] = None, idle_ttl: float = 30.0, log_max_age: float = 3600.0,
+                 log_archive_interval: float = 60.0, retry_policy: RetryPolicy = None, lease_sweep_interval: float = 5.0,
+                 namespace_weights: Dict[str, float] = None, shards: ShardCoordinator = None):
         super().__init__(name, "QUEEN", shared_memory, message_bus, None, session_id)
+        # The session's control is shared process-wide; a Queen stopped earlier in this process left it cancelled
+        if self.control.cancelled:
+            self.control.resume()
         self.cortex = NeuralCortex()
-        self.active_workers: Dict[str, BaseAgent] = {}
+        self.role_limits = dict(DEFAULT_ROLE_LIMITS, **(role_limits or {}))
+        self.idle_ttl = idle_ttl
+        # Log rows older than log_max_age are moved to the archive every log_archive_interval
+        self.log_max_age = log_max_age
+        self.log_archive_interval = log_archive_interval
+        self.next_log_archive = self.clock.monotonic() + log_archive_interval
+        self.registry = AgentRegistry(self.clock)
+        self.router = AgentFactory.build_router()
+        # Every namespace of the session is dispatched; namespace_weights sets their shares
+        self.scheduler = DependencyScheduler(self.clock, self.router.route_batch, namespace_weights)
+        self.change_seq = None          # change-feed position of the last pending-task fetch
+        # Failed runs wait out their backoff in a timer wheel; RETRY_SCHEDULED rows left by
+        # an earlier run of this session are picked up again
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.retries = TimerWheel(start=self.clock.time())
+        self._retry_lock = threading.Lock()
+        # Role ceilings are checked and agents spawned under one lock: the bus thread spawns too, when it steals work
+        self._spawn_lock = threading.Lock()
+        # Expired task leases (a worker or a whole hive died mid-task) are reclaimed this often
+        self.lease_sweep_interval = lease_sweep_interval
+        self.next_lease_sweep = self.clock.monotonic()
+        # With other hive processes on the same session, only the namespaces this Queen holds a shard of
+        self.shards = shards
+        self.rearm_retries()
+        self.next_shard_refresh = self.clock.monotonic()
+        self.active_workers: Dict[str, BaseAgent] = self.registry.agents
         self.task_queue = []
         self.running = True
+        # Gauges are computed only when someone scrapes /metrics
+        metrics.AGENTS.set_function(self.registry.agent_counts)
+        metrics.QUEUE_DEPTH.set_function(self.queue_depths)
         
         # Start management loop
         self.thread = threading.Thread(target=self.management_loop)
         self.thread.start()
 
     def management_loop(self):
-        while self.running:
-            self.check_pending_tasks()
-            self.optimize_resources()
-            time.sleep(2)
+        # The loop counts as in-flight work for a simulated clock, except while it waits
+        self.clock.hold()
+        try:
+            while self.running:
+                # Read the generation first so changes made during this pass wake us again
+                generation = self.memory.generation()
+                self.sync_control()
+                self.release_retries()
+                self.sweep_leases()
+                self.check_pending_tasks()
+                self.optimize_resources()
+                self.registry.flush(self.memory)
+                self.archive_logs()
+                # Sleep until a task is created, a result arrives, state changes,
+                # or another process writes to the database; wake for reaping too
+                self.memory.wait_for_change(generation, self.next_wakeup())
+        finally:
+            self.clock.release()
+
+    def next_wakeup(self) -> Optional[float]:
+        # Seconds until something is due without outside changes: an idle agent to reap, or a retry
+        timeout = max(0.0, self.next_lease_sweep - self.clock.monotonic())
+        idle = self.registry.next_idle_expiry(self.idle_ttl)
+        if idle is not None:
+            timeout = min(timeout, idle)
+        if len(self.retries):
+            timeout = min(timeout, self.retries.tick)
+        if self.shards is not None:
+            timeout = min(timeout, max(0.0, self.next_shard_refresh - self.clock.monotonic()))
+        return timeout
+
+    def sweep_leases(self):
+        if self.clock.monotonic() < self.next_lease_sweep:
+            return
+        self.next_lease_sweep = self.clock.monotonic() + self.lease_sweep_interval
+        if self.control.state == "PAUSED":
+            # Paused workers send no progress, so their leases would lapse
+            self.memory.renew_leases(self.session_id)
+            return
+        # Heartbeats and completions still in the write-behind queue would look like expired
+        # leases; the queue drains on real time while the hive clock may have jumped ahead
+        self.memory.flush()
+        # Another Queen's tasks are its to reclaim; its scheduler still counts them as running
+        owned = self.shards.owned if self.shards is not None else None
+        reclaimed = self.memory.reclaim_expired_leases(self.session_id, namespaces=owned)
+        if not reclaimed:
+            return
+        holders = {task_id: agent_id for agent_id, task_id in self.registry.busy_tasks().items()}
+        for task_id in reclaimed:
+            agent_id = holders.get(task_id)
+            if agent_id is not None:
+                # Silent past its lease: stop routing work to it
+                self.registry.remove(agent_id, "LOST")
+                self.bus.unsubscribe(agent_id)
+                if agent_id in self.subordinates:
+                    self.subordinates.remove(agent_id)
+            self.scheduler.retry(task_id)
+            self.log("LEASE_EXPIRED", f"Task {task_id} reclaimed from {agent_id or 'a previous hive'}")
+        metrics.LEASES_RECLAIMED.inc(len(reclaimed))
+
+    def rearm_retries(self):
+        # Timers for RETRY_SCHEDULED tasks this process isn't tracking: left by an earlier
+        # run, or by a Queen that gave the namespace up; other Queens' namespaces are theirs
+        with self._retry_lock:
+            for task_id, retry_at, namespace in self.memory.get_scheduled_retries(self.session_id):
+                if self.shards is None or self.shards.owns(namespace):
+                    self.retries.schedule(task_id, retry_at or 0.0)
+
+    def release_retries(self):
+        with self._retry_lock:
+            due = self.retries.advance(self.clock.time())
+        for task_id in due:
+            if self.memory.release_retry(task_id):
+                # Tasks only known from an earlier run arrive through the change feed instead
+                self.scheduler.retry(task_id)
+                self.log("RETRY", f"Task {task_id} released for another attempt")
+
+    def handle_failure(self, task_id: str, error: str):
+        node = self.scheduler.nodes.get(task_id)
+        role = node.role if node is not None else None
+        attempts = (node.attempts if node is not None else 0) + 1
+        if node is not None:
+            node.attempts = attempts
+        if self.retry_policy.should_retry(role, attempts):
+            delay = self.retry_policy.delay(attempts, self.clock.rng(f"{task_id}:{attempts}"))
+            retry_at = self.clock.time() + delay
+            if self.memory.schedule_retry(task_id, error, retry_at):
+                with self._retry_lock:
+                    self.retries.schedule(task_id, retry_at)
+                metrics.TASK_FAILURES.inc(labels=(role or "UNKNOWN", "retry"))
+                self.log("RETRY_SCHEDULED", f"Task {task_id} failed (attempt {attempts}): {error}; retrying in {delay:.1f}s")
+        elif self.memory.fail_task(task_id, error, role):
+            self.scheduler.mark_failed(task_id)
+            metrics.TASK_FAILURES.inc(labels=(role or "UNKNOWN", "dead_letter"))
+            self.log("DEAD_LETTER", f"Task {task_id} failed {attempts} times: {error}")
+        # Wake the loop so its timeout covers the new timer
+        self.memory.notify_change()
+
+    def archive_logs(self):
+        if self.clock.monotonic() < self.next_log_archive or (self.shards is not None and not self.shards.leader):
+            return
+        self.next_log_archive = self.clock.monotonic() + self.log_archive_interval
+        try:
+            archived = self.memory.archive_logs(self.log_max_age)
+        except OSError as e:
+            logger.warning(f"Log archival failed: {e}")
+            return
+        if archived:
+            logger.info(f"Archived {archived} log entries to {self.memory.log_archive.directory}")
+
+    def sync_control(self):
+        # The single watcher for pause/resume: one read per wake-up, fanned out
+        # to every agent of the session through the shared SessionControl
+        state = self.memory.get_system_state("status", self.session_id) or "RUNNING"
+        if not self.control.cancelled:
+            self.control.set_state(state)
 
     def check_pending_tasks(self):
-        # Fetch pending tasks from Shared Memory for THIS session
-        tasks = self.memory.get_pending_tasks(session_id=self.session_id)
-        if not tasks:
+        # Fetch pending tasks for THIS session, in any namespace, that are new since the last pass
+        tasks, self.change_seq = self.memory.get_pending_tasks_since(self.change_seq, namespace=None, session_id=self.session_id)
+        if self.shards is not None:
+            tasks = self.shard_tasks(tasks)
+        self.scheduler.add_tasks(tasks, self.memory.get_task_statuses)
+        self.scheduler.sync_external(self.memory.get_task_statuses)
+        pending = self.scheduler.pending_count()
+        if not pending or self.control.state != "RUNNING":
             return
 
         # Use Cortex to decide coordination mode
-        complexity_score = min(len(tasks), 10) # Simple proxy for complexity
-        mode = self.cortex.coordination.predict_mode("HIGH" if complexity_score > 5 else "LOW", len(tasks))
+        complexity_score = min(pending, 10) # Simple proxy for complexity
+        mode = self.cortex.coordination.predict_mode("HIGH" if complexity_score > 5 else "LOW", pending)
         
         self.log("DECISION", f"Selected Coordination Mode: {mode}")
 
-        for task_row in tasks:
-            task = {
-                "id": task_row[0],
-                "description": task_row[1],
-                "priority": task_row[4]
-            }
-            self.assign_task(task)
+        # Only tasks whose dependencies have completed, namespaces taking turns by weight
+        saturated = set()   # roles at their ceiling with no idle agent; skip them for the rest of this pass
+        while True:
+            node = self.scheduler.pop_ready(saturated)
+            if node is None:
+                break
+            if not self.assign_task(node.as_task()):
+                saturated.add(node.role)
+                self.scheduler.requeue(node.id)
+
+    def shard_tasks(self, tasks):
+        # Rebalance when due, or as soon as a namespace nobody was assigned shows up
+        if self.clock.monotonic() >= self.next_shard_refresh or any(row[9] not in self.shards.seen for row in tasks):
+            self.next_shard_refresh = self.clock.monotonic() + self.shards.refresh_interval
+            gained, lost = self.shards.refresh(namespace for namespace, _ in self.memory.pending_counts(self.session_id))
+            for namespace in lost:
+                self.scheduler.drop_namespace(namespace)
+                self.log("SHARD", f"Shard {namespace} handed over")
+            if gained:
+                self.log("SHARD", f"Took over shards {', '.join(sorted(gained))} ({len(self.shards.members)} Queens)")
+                # The change feed skipped their backlog while someone else owned them
+                tasks, self.change_seq = self.memory.get_pending_tasks_since(None, namespace=None, session_id=self.session_id)
+                # Backoff timers of the Queen that held them died with it or were left behind
+                self.rearm_retries()
+        return [row for row in tasks if self.shards.owns(row[9])]
+
+    def steal_work(self, agent_id: str):
+        # A worker just came free: give it the next task for its role from the
+        # longest namespace queue now, rather than on the next pass
+        agent = self.registry.agents.get(agent_id)
+        if agent is None or self.control.state != "RUNNING":
+            return
+        node = self.scheduler.steal(agent.role)
+        if node is not None and not self.assign_task(node.as_task()):
+            self.scheduler.requeue(node.id)
 
     def assign_task(self, task):
-        # Find suitable idle agent
-        best_agent = None
-        for agent_id, agent in self.active_workers.items():
-            # Check status in DB
-            rows = self.memory.get_all_agents(session_id=self.session_id)
-            status = next((r[2] for r in rows if r[0] == agent_id), "UNKNOWN")
-            
-            if status == "IDLE":
-                # Simple matching logic
-                desc = task['description'].lower()
-                if "code" in desc and isinstance(agent, CoderAgent): best_agent = agent
-                elif "test" in desc and isinstance(agent, TesterAgent): best_agent = agent
-                elif "design" in desc and isinstance(agent, ArchitectAgent): best_agent = agent
-                elif "analyze" in desc and isinstance(agent, AnalystAgent): best_agent = agent
-                elif "research" in desc and isinstance(agent, ResearcherAgent): best_agent = agent
-                elif "visual" in desc and isinstance(agent, VisualizationAgent): best_agent = agent
-                elif "statistic" in desc and isinstance(agent, StatisticianAgent): best_agent = agent
-                elif "document" in desc and isinstance(agent, DocumentationAgent): best_agent = agent
-                elif ("cite" in desc or "refer" in desc) and isinstance(agent, CitationAgent): best_agent = agent
-                
-                if best_agent: break
+        # Take an idle agent of the right role straight from the registry
+        agent_type = task.get('role') or self.router.route(task['description'])
+        best_agent = self.registry.acquire(agent_type, task['id'])
 
         if best_agent:
-            self.memory.assign_task(task['id'], best_agent.id)
+            if not self.memory.assign_task(task['id'], best_agent.id):
+                # Claimed by another dispatcher since we read it
+                self.registry.release(best_agent.id)
+                self.scheduler.mark_external(task['id'])
+                return True
+            self.record_dispatch(task, agent_type)
             self.send_message(best_agent.id, MessageType.TASK_ASSIGNMENT, task)
             self.log("ASSIGNMENT", f"Assigned task {task['id']} to {best_agent.name}")
+            return True
         else:
             # No agent found -> Auto-Scale
             self.log("RESOURCE", "No suitable agent found. Attempting to spawn new agent.")
-            self.spawn_agent_for_task(task)
+            return self.spawn_agent_for_task(task, agent_type)
 
-    def spawn_agent_for_task(self, task):
-        agent_type = "CODER" # Default
-        desc = task['description'].lower()
-        
-        if "design" in desc: agent_type = "ARCHITECT"
-        elif "test" in desc: agent_type = "TESTER"
-        elif "analyze" in desc: agent_type = "ANALYST"
-        elif "research" in desc: agent_type = "RESEARCHER"
-        elif "visual" in desc: agent_type = "VISUALIZER"
-        elif "statistic" in desc: agent_type = "STATISTICIAN"
-        elif "document" in desc: agent_type = "DOCUMENTER"
-        elif "cite" in desc or "refer" in desc: agent_type = "CITATION_MANAGER"
-
-        # Check limits (Heuristic: Max 50 agents now that we have more types)
-        if len(self.active_workers) < 50:
-            new_agent = AgentFactory.create_agent(agent_type, self.memory, self.bus, self.id, self.session_id)
-            self.active_workers[new_agent.id] = new_agent
-            self.subordinates.append(new_agent.id)
-            self.log("SPAWN", f"Spawned new {agent_type}: {new_agent.name}")
-            # Immediate assignment
-            self.memory.assign_task(task['id'], new_agent.id)
+    def spawn_agent_for_task(self, task, agent_type=None):
+        agent_type = agent_type or task.get('role') or self.router.route(task['description'])
+
+        # Check the per-role ceiling; the new agent is registered busy with this task
+        with self._spawn_lock:
+            if self.registry.role_count(agent_type) >= self.role_limits.get(agent_type, (0, 8))[1]:
+                self.log("WARNING", "Max agent limit reached. Task queued.")
+                return False
+            new_agent = self.spawn_agent(agent_type, busy_with=task['id'])
+        if self.memory.assign_task(task['id'], new_agent.id):
+            self.record_dispatch(task, agent_type)
             self.send_message(new_agent.id, MessageType.TASK_ASSIGNMENT, task)
         else:
-            self.log("WARNING", "Max agent limit reached. Task queued.")
+            self.registry.release(new_agent.id)
+            self.scheduler.mark_external(task['id'])
+        return True
+
+    def record_dispatch(self, task, role: str):
+        node = self.scheduler.nodes.get(task['id'])
+        if node is not None and node.ready_at is not None:
+            metrics.DISPATCH_SECONDS.observe(self.clock.time() - node.ready_at, (role,))
+
+    def queue_depths(self) -> Dict[tuple, int]:
+        return {(namespace,): count for namespace, count in self.memory.pending_counts(self.session_id)}
+
+    def spawn_agent(self, agent_type: str, busy_with: str = None) -> BaseAgent:
+        new_agent = AgentFactory.create_agent(agent_type, self.memory, self.bus, self.id, self.session_id)
+        self.registry.add(new_agent, busy_with)
+        self.subordinates.append(new_agent.id)
+        self.log("SPAWN", f"Spawned new {agent_type}: {new_agent.name}")
+        return new_agent
+
+    def decommission_agent(self, agent: BaseAgent):
+        self.registry.remove(agent.id, "TERMINATED")
+        self.bus.unsubscribe(agent.id)
+        if agent.id in self.subordinates:
+            self.subordinates.remove(agent.id)
+        self.log("DECOMMISSION", f"Reaped idle {agent.role}: {agent.name}")
 
     def optimize_resources(self):
-        # Check for idle agents to decommission (simple logic)
-        pass
+        # Demand per role: tasks known to the scheduler that are queued or waiting on parents
+        demand = self.scheduler.demand_by_role(self.router.route)
+
+        # Pre-warm: spawn agents for upcoming work (e.g. tasks blocked on a running
+        # parent) so construction happens off the dispatch path, within the
+        # Cortex's recommended pool size and each role's limits
+        complexity_score = min(sum(demand.values()), 10)
+        budget = self.cortex.coordination.recommend_agent_count(complexity_score) - len(self.registry)
+        for role, (minimum, maximum) in self.role_limits.items():
+            target = min(max(minimum, demand.get(role, 0)), maximum)
+            with self._spawn_lock:
+                missing = target - self.registry.role_count(role)
+                # Minimums are always honoured; demand-driven warming spends the budget
+                while missing > 0 and (budget > 0 or self.registry.role_count(role) < minimum):
+                    self.spawn_agent(role)
+                    missing -= 1
+                    budget -= 1
+
+        # Reap: agents idle past the TTL, down to what the role still needs
+        for agent in self.registry.idle_expired(self.idle_ttl):
+            minimum = self.role_limits.get(agent.role, (0, 8))[0]
+            keep = max(minimum, demand.get(agent.role, 0))
+            if self.registry.role_count(agent.role) > keep:
+                self.decommission_agent(agent)
+            else:
+                self.registry.rearm_idle(agent.id)
 
     def process_message(self, message: Message):
-        if message.msg_type == MessageType.TASK_RESULT:
-            self.memory.complete_task(message.content['task_id'], message.content['result'])
+        if message.msg_type == MessageType.TASK_RESULT and message.content.get('status') == "CANCELLED":
+            # Interrupted mid-task; hand it back so it isn't stranded IN_PROGRESS
+            self.registry.release(message.sender_id)
+            self.memory.requeue_task(message.content['task_id'])
+            self.scheduler.requeue(message.content['task_id'])
+            self.log("CANCELLED", f"Task {message.content['task_id']} interrupted on {message.sender_id}")
+        elif message.msg_type == MessageType.TASK_RESULT and message.content.get('status') == "FAILED":
+            # Retried after a backoff, or dead-lettered once the role's budget is spent
+            self.registry.release(message.sender_id)
+            self.handle_failure(message.content['task_id'], message.content.get('error'))
+        elif message.msg_type == MessageType.TASK_RESULT:
+            self.registry.release(message.sender_id)
+            self.memory.complete_task(message.content['task_id'], message.content.get('result'))
+            self.scheduler.task_completed(message.content['task_id'])
             self.log("COMPLETION", f"Task {message.content['task_id']} completed by {message.sender_id}")
+            self.steal_work(message.sender_id)
+            self.memory.notify_change()
 
     def stop(self):
         self.log("SYSTEM", "Initiating Hive Shutdown...")
         self.running = False
+        # Interrupt in-flight work at its next checkpoint
+        self.control.cancel()
+        self.memory.notify_change()
+        if self.shards is not None:
+            # The remaining Queens take over our namespaces on their next refresh
+            self.thread.join()
+            self.shards.leave()
         
         # Terminate all workers
-        for agent_id, agent in self.active_workers.items():
-            self.memory.update_agent_status(agent_id, "TERMINATED")
+        for agent_id in list(self.registry.agents):
+            self.registry.remove(agent_id, "TERMINATED")
             # In a real system, we'd send a kill signal. Here we just mark them.
+        self.registry.flush(self.memory)
             
         self.log("SYSTEM", "Hive Shutdown Complete.")
         self.thread.join()
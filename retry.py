@@ -0,0 +1,93 @@
+import math
+from typing import Dict, Hashable, List
+
+# Attempts (the first run included) per role before a task is dead-lettered
+DEFAULT_RETRY_BUDGETS = {
+    "CODER": 4,
+    "RESEARCHER": 4,
+    "STATISTICIAN": 3,
+    "VISUALIZER": 3,
+    "CITATION_MANAGER": 3,
+}
+
+class RetryPolicy:
+    """
+    Per-role retry budgets with capped exponential backoff: attempt n waits
+    base_delay * factor**(n-1), at most max_delay, spread by +/- jitter.
+    """
+    def __init__(self, max_attempts: int = 3, base_delay: float = 1.0, factor: float = 2.0, max_delay: float = 60.0,
+                 jitter: float = 0.2, budgets: Dict[str, int] = None):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.factor = factor
+        self.max_delay = max_delay
+        self.jitter = jitter
+        self.budgets = dict(DEFAULT_RETRY_BUDGETS, **(budgets or {}))
+
+    def attempts_for(self, role: str) -> int:
+        return self.budgets.get(role, self.max_attempts)
+
+    def should_retry(self, role: str, attempts: int) -> bool:
+        # attempts: runs so far, including the one that just failed
+        return attempts < self.attempts_for(role)
+
+    def delay(self, attempts: int, rng) -> float:
+        delay = min(self.max_delay, self.base_delay * self.factor ** max(0, attempts - 1))
+        return delay * (1 + self.jitter * (2 * rng.random() - 1))
+
+class TimerWheel:
+    """
+    Hashed timing wheel: `slots` buckets of `tick` seconds each. schedule()
+    and cancel() are O(1); advance() visits only the buckets for the ticks
+    that passed, and a deadline more than one revolution out just stays in
+    its bucket until its own turn comes round. Ticks count from `start`, so
+    a replay whose clock starts at another instant fires on the same ticks.
+    """
+    def __init__(self, tick: float = 0.5, slots: int = 512, start: float = 0.0):
+        self.tick = tick
+        self.origin = start
+        self.slots: List[Dict[Hashable, int]] = [{} for _ in range(slots)]
+        self.current = 0                        # last tick processed
+        self._where: Dict[Hashable, int] = {}
+
+    def __len__(self):
+        return len(self._where)
+
+    def __contains__(self, key):
+        return key in self._where
+
+    def schedule(self, key: Hashable, deadline: float):
+        self.cancel(key)
+        # Never into a tick already processed; a past deadline fires on the next advance
+        due = max(math.ceil((deadline - self.origin) / self.tick), self.current + 1)
+        slot = due % len(self.slots)
+        self.slots[slot][key] = due
+        self._where[key] = slot
+
+    def cancel(self, key: Hashable) -> bool:
+        slot = self._where.pop(key, None)
+        if slot is None:
+            return False
+        del self.slots[slot][key]
+        return True
+
+    def advance(self, now: float) -> List[Hashable]:
+        """Move the wheel to `now` and return the keys that came due, earliest tick first."""
+        target = int((now - self.origin) // self.tick)
+        if target <= self.current:
+            return []
+        expired = []
+        count = len(self.slots)
+        # After a gap longer than a revolution, one pass over every bucket covers it
+        for due in range(self.current + 1, min(target, self.current + count) + 1):
+            bucket = self.slots[due % count]
+            if not bucket:
+                continue
+            fired = [(key_due, key) for key, key_due in bucket.items() if key_due <= target]
+            for _, key in fired:
+                del bucket[key]
+                del self._where[key]
+            expired.extend(fired)
+        self.current = target
+        expired.sort(key=lambda item: item[0])
+        return [key for _, key in expired]
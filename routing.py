@@ -0,0 +1,86 @@
+import re
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Tuple, Union
+import numpy as np
+from hive_core import logger
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+class CapabilityRouter:
+    """
+    Routes task descriptions to agent roles. Each role declares capability
+    keywords (matched as token prefixes, so "analy" covers "analyze" and
+    "analysis"); a batch of descriptions becomes a token-count matrix that
+    is scored against every role with a single matrix multiply. The leading
+    word usually names the kind of work, so it counts double. Ties go to
+    the role registered first; descriptions matching nothing get
+    default_role. Decisions are kept per description in an LRU cache of
+    cache_size entries.
+    """
+    def __init__(self, capabilities: Dict[str, Union[List[str], Dict[str, float]]], default_role: str = "CODER",
+                 lead_weight: float = 2.0, cache_size: int = 100000):
+        self.roles = list(capabilities)
+        self.default_role = default_role
+        self.lead_weight = lead_weight
+        self.cache_size = cache_size
+        self.vocab: Dict[str, int] = {}
+        entries = []
+        for r, keywords in enumerate(capabilities.values()):
+            if not isinstance(keywords, dict):
+                keywords = {keyword: 1.0 for keyword in keywords}
+            for keyword, weight in keywords.items():
+                column = self.vocab.setdefault(keyword.lower(), len(self.vocab))
+                entries.append((r, column, weight))
+        # roles x vocabulary
+        self.weights = np.zeros((len(self.roles), len(self.vocab)), dtype=np.float32)
+        for r, column, weight in entries:
+            self.weights[r, column] = weight
+        self._token_columns: Dict[str, Tuple[int, ...]] = {}
+        self._cache: "OrderedDict[str, str]" = OrderedDict()
+
+    def route(self, description: str) -> str:
+        return self.route_batch([description])[0]
+
+    def route_batch(self, descriptions: Iterable[str]) -> List[str]:
+        descriptions = list(descriptions)
+        roles = [self._hit(desc) for desc in descriptions]
+        pending = list(dict.fromkeys(desc for desc, role in zip(descriptions, roles) if role is None))
+        if pending:
+            features = np.zeros((len(pending), len(self.vocab)), dtype=np.float32)
+            for i, desc in enumerate(pending):
+                for position, token in enumerate(TOKEN_RE.findall(desc.lower())):
+                    weight = self.lead_weight if position == 0 else 1.0
+                    for column in self._columns(token):
+                        features[i, column] += weight
+            # descriptions x roles
+            scores = features @ self.weights.T
+            best = scores.argmax(axis=1)
+            matched = scores.max(axis=1) > 0
+            decided = {}
+            for desc, index, ok in zip(pending, best, matched):
+                role = self.roles[index] if ok else self.default_role
+                if not ok:
+                    logger.debug(f"No capability matched '{desc}', routing to {role}")
+                decided[desc] = role
+                self._remember(desc, role)
+            roles = [role or decided[desc] for desc, role in zip(descriptions, roles)]
+        return roles
+
+    def _columns(self, token: str) -> Tuple[int, ...]:
+        columns = self._token_columns.get(token)
+        if columns is None:
+            columns = tuple(column for keyword, column in self.vocab.items() if token.startswith(keyword))
+            self._token_columns[token] = columns
+        return columns
+
+    def _hit(self, description: str):
+        # Pop and re-insert rather than move_to_end, which raises if another thread evicted it meanwhile
+        role = self._cache.pop(description, None)
+        if role is not None:
+            self._cache[description] = role
+        return role
+
+    def _remember(self, description: str, role: str):
+        self._cache[description] = role
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
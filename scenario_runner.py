@@ -1,9 +1,16 @@
-import sqlite3
-import uuid
-import time
+import argparse
+import json
+import logging
+import os
 import sys
+import time
+import uuid
+from hive_core import SharedMemory, MessageBus, open_storage
+from storage import ASSIGNED_TO, ATTEMPTS, COMPLETED_AT, CREATED_AT, DEPENDENCIES, ID, NAMESPACE, STATUS
+from clock import make_clock
 
 DB_PATH = "hive_memory.db"
+REPLAY_DB_PATH = "replay_memory.db"
 
 def get_current_session():
     try:
@@ -15,73 +22,197 @@ def get_current_session():
 
 def inject_tasks(tasks, scenario_name):
     session_id = get_current_session()
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
+    memory = SharedMemory(DB_PATH)
     
     print(f"\n=== INJECTING SCENARIO: {scenario_name} ===")
     print(f"Session ID: {session_id}")
     print(f"Injecting {len(tasks)} tasks...")
     
-    for desc, priority in tasks:
-        task_id = str(uuid.uuid4())
-        cursor.execute('''
-            INSERT INTO tasks (id, description, assigned_to, status, priority, dependencies, created_at, namespace, session_id)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (task_id, desc, None, "PENDING", priority, "[]", time.time(), scenario_name, session_id))
-        
-    conn.commit()
-    conn.close()
+    # Entries are (description, priority) or (description, priority, [indexes of prerequisite tasks])
+    memory.create_tasks_bulk(({"key": i, "description": entry[0], "priority": entry[1], "deps": entry[2] if len(entry) > 2 else []}
+                              for i, entry in enumerate(tasks)), namespace=scenario_name, session_id=session_id)
+    memory.close()
     print("Injection complete. Monitor the Dashboard to see the Hive react.")
 
-def scenario_alien_signal():
+def repeat_tasks(tasks, times):
+    # Independent copies of a scenario, dependency indexes shifted per copy
+    repeated = []
+    for copy in range(times):
+        offset = copy * len(tasks)
+        for entry in tasks:
+            deps = [offset + i for i in entry[2]] if len(entry) > 2 else []
+            repeated.append((entry[0], entry[1], deps))
+    return repeated
+
+def blocked_by_dead_letters(memory, session_id):
+    # PENDING tasks that can never run because something upstream was dead-lettered
+    if not memory.get_dead_letters(session_id, limit=1):
+        return 0
+    rows = memory.get_session_tasks(session_id)
+    status = {row[ID]: row[STATUS] for row in rows}
+    deps = {row[ID]: json.loads(row[DEPENDENCIES] or "[]") for row in rows}
+    blocked = set()
+    changed = True
+    while changed:
+        changed = False
+        for task_id, parents in deps.items():
+            if task_id not in blocked and status[task_id] == "PENDING" and any(
+                    status.get(p) == "FAILED" or p in blocked for p in parents):
+                blocked.add(task_id)
+                changed = True
+    return len(blocked)
+
+def percentile(values, p):
+    return values[min(len(values) - 1, int(len(values) * p / 100))] if values else 0.0
+
+def replay_tasks(scenarios, clock, db_path=REPLAY_DB_PATH, timeout=600, storage="sqlite"):
+    """
+    Run scenarios, given as (tasks, name) pairs, side by side in-process on
+    `clock` against a private store, each in its own namespace, and report
+    how the hive scheduled them, in virtual time. Task ids and worker
+    randomness derive from the clock's seed, so a replay is repeatable.
+    storage="memory" keeps everything in-process and skips the database.
+    Returns the headline numbers as a dict.
+    """
+    from queen import QueenAgent
+
+    if storage == "sqlite":
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(db_path + suffix):
+                os.remove(db_path + suffix)
+    memory = open_storage(storage, db_path if storage == "sqlite" else None, clock=clock)
+    bus = MessageBus(clock=clock)
+    names = "+".join(name for _, name in scenarios)
+    session_id = str(uuid.uuid5(uuid.NAMESPACE_URL, f"replay:{names}:{clock.seed}"))
+    total = sum(len(tasks) for tasks, _ in scenarios)
+
+    print(f"\n=== REPLAYING SCENARIO: {names} ({type(clock).__name__}, seed {clock.seed}, {storage} storage) ===")
+    print(f"Replaying {total} tasks...")
+    real_start = time.monotonic()
+    virtual_start = clock.time()
+    for tasks, name in scenarios:
+        memory.create_tasks_bulk(({"key": i, "description": entry[0], "priority": entry[1], "deps": entry[2] if len(entry) > 2 else []}
+                                  for i, entry in enumerate(tasks)), namespace=name, session_id=session_id, batch_id=str(uuid.uuid5(uuid.UUID(session_id), name)))
+    queen = QueenAgent("Queen-Replay", memory, bus, session_id=session_id)
+    try:
+        done = 0
+        while done < total and time.monotonic() - real_start < timeout:
+            time.sleep(0.05)
+            # Dead-lettered tasks are settled too; their dependents then never run
+            counts = memory.status_counts(session_id)
+            done = counts.get("COMPLETED", 0) + counts.get("FAILED", 0)
+            if done and done == total - blocked_by_dead_letters(memory, session_id):
+                break
+    finally:
+        queen.stop()
+        bus.shutdown(wait=False)
+    memory.flush()
+    real_elapsed = time.monotonic() - real_start
+
+    tasks = memory.get_session_tasks(session_id)
+    agent_roles = {agent_id: role for agent_id, role, _, _ in memory.get_all_agents(session_id)}
+    rows = [(task[CREATED_AT], task[COMPLETED_AT], agent_roles.get(task[ASSIGNED_TO]), task[NAMESPACE])
+            for task in tasks if task[STATUS] == "COMPLETED"]
+    retries = sum(task[ATTEMPTS] or 0 for task in tasks)
+    # A completed task with no assignee was reclaimed from its worker and finished by a stale run
+    unassigned = sum(1 for task in tasks if task[STATUS] == "COMPLETED" and task[ASSIGNED_TO] is None)
+    dead = len(memory.get_dead_letters(session_id, limit=total))
+    memory.close()
+    if hasattr(clock, "stop"):
+        clock.stop()
+
+    makespan = max((completed for _, completed, _, _ in rows), default=virtual_start) - virtual_start
+    latencies = sorted(completed - created for created, completed, _, _ in rows)
+    roles = {}
+    for _, _, role, _ in rows:
+        roles[role or "UNKNOWN"] = roles.get(role or "UNKNOWN", 0) + 1
+    print(f"Completed {len(rows)}/{total} tasks ({retries} failed runs retried or dead-lettered, {dead} dead letters)")
+    print(f"Virtual makespan: {makespan:.1f}s  (real {real_elapsed:.1f}s, {makespan / real_elapsed if real_elapsed else 0:.0f}x)")
+    if makespan:
+        print(f"Throughput: {len(rows) / makespan:.2f} tasks/s (virtual)")
+    print(f"Latency p50 {percentile(latencies, 50):.1f}s  p90 {percentile(latencies, 90):.1f}s  max {percentile(latencies, 100):.1f}s")
+    print("Tasks per role: " + ", ".join(f"{role} {count}" for role, count in sorted(roles.items())))
+    if len(scenarios) > 1:
+        for _, name in scenarios:
+            finished = [completed for _, completed, _, namespace in rows if namespace == name]
+            drained = max(finished, default=virtual_start) - virtual_start
+            print(f"  {name}: {len(finished)} tasks, drained at {drained:.1f}s")
+    return {"tasks": total, "completed": len(rows), "retries": retries, "dead_letters": dead, "unassigned": unassigned,
+            "makespan": makespan}
+
+def scenario_alien_signal(run=inject_tasks):
     tasks = [
         ("Research unknown radio signal from Sector 7G", 5),
         ("Analyze signal frequency and modulation patterns", 5),
         ("Visualize signal spectrogram and waveform", 4),
         ("Code decryption algorithm for signal", 5),
-        ("Test decryption algorithm on sample data", 4),
+        ("Test decryption algorithm on sample data", 4, [3]),
         ("Document initial findings and hypothesis", 3),
         ("Cite astronomical references for signal type", 3),
         ("Research linguistic patterns in signal", 4),
         ("Analyze potential mathematical constructs", 5),
         ("Visualize 3D source triangulation", 4)
     ]
-    inject_tasks(tasks, "Alien_Signal_Decoding")
+    run(tasks, "Alien_Signal_Decoding")
 
-def scenario_pandemic_response():
+def scenario_pandemic_response(run=inject_tasks):
     tasks = [
         ("Research viral transmission vectors", 5),
         ("Analyze infection rate data from Region A", 5),
         ("Analyze infection rate data from Region B", 5),
         ("Analyze infection rate data from Region C", 5),
-        ("Visualize global spread heatmap", 5),
+        ("Visualize global spread heatmap", 5, [1, 2, 3]),
         ("Perform statistical modeling of R0 value", 5),
         ("Document public health guidelines", 5),
         ("Cite epidemiological studies", 5),
         ("Code contact tracing application backend", 4),
         ("Design contact tracing app UI", 3),
-        ("Test contact tracing app security", 5)
+        ("Test contact tracing app security", 5, [8, 9])
     ]
-    inject_tasks(tasks, "Pandemic_Response")
+    run(tasks, "Pandemic_Response")
 
-def scenario_startup_sprint():
+def scenario_startup_sprint(run=inject_tasks):
     tasks = []
     # High volume of coding/testing
     for i in range(10):
+        design = len(tasks)
         tasks.append((f"Design Microservice {i}", 3))
-        tasks.append((f"Code Microservice {i} Implementation", 4))
-        tasks.append((f"Test Microservice {i} API", 4))
+        tasks.append((f"Code Microservice {i} Implementation", 4, [design]))
+        tasks.append((f"Test Microservice {i} API", 4, [design + 1]))
     
-    tasks.append(("Document System Architecture", 5))
-    tasks.append(("Visualize System Topology", 3))
-    inject_tasks(tasks, "Startup_Sprint")
+    designs = list(range(0, 30, 3))
+    tasks.append(("Document System Architecture", 5, designs))
+    tasks.append(("Visualize System Topology", 3, designs))
+    run(tasks, "Startup_Sprint")
+
+SCENARIOS = {
+    "alien": scenario_alien_signal,
+    "pandemic": scenario_pandemic_response,
+    "startup": scenario_startup_sprint,
+}
 
 if __name__ == "__main__":
-    if len(sys.argv) < 2:
-        print("Usage: python scenario_runner.py [alien|pandemic|startup]")
+    parser = argparse.ArgumentParser(description="Inject a scenario into the running hive, or replay it offline")
+    parser.add_argument("scenario", choices=sorted(SCENARIOS) + ["all"], help="'all' runs every scenario at once, each in its own namespace")
+    parser.add_argument("--replay", action="store_true", help="run the scenario in-process on a simulated or scaled clock")
+    parser.add_argument("--speed", type=float, help="replay on a scaled clock this many times faster than real time "
+                                                    "(default: discrete-event simulation)")
+    parser.add_argument("--seed", type=int, default=0, help="seed for replay task ids and worker randomness")
+    parser.add_argument("--repeat", type=int, default=1, help="replay this many independent copies of the scenario")
+    parser.add_argument("--storage", choices=["sqlite", "memory"], default="sqlite",
+                        help="replay against a SQLite file or the in-memory engine")
+    parser.add_argument("--verbose", action="store_true", help="keep the hive's INFO logging during a replay")
+    args = parser.parse_args()
+
+    chosen = sorted(SCENARIOS) if args.scenario == "all" else [args.scenario]
+    if not args.replay:
+        for name in chosen:
+            SCENARIOS[name]()
     else:
-        mode = sys.argv[1]
-        if mode == "alien": scenario_alien_signal()
-        elif mode == "pandemic": scenario_pandemic_response()
-        elif mode == "startup": scenario_startup_sprint()
-        else: print("Unknown scenario")
+        if not args.verbose:
+            logging.getLogger("HiveCore").setLevel(logging.WARNING)
+        clock = make_clock("scaled" if args.speed else "simulated", args.speed, args.seed)
+        scenarios = []
+        for name in chosen:
+            SCENARIOS[name](lambda tasks, namespace: scenarios.append((repeat_tasks(tasks, args.repeat), namespace)))
+        replay_tasks(scenarios, clock, storage=args.storage)
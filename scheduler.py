@@ -0,0 +1,348 @@
+import heapq
+import json
+import threading
+from typing import Callable, Dict, Iterable, List, Optional, Set
+from hive_core import logger
+from clock import RealClock
+
+# Node states
+WAITING = "WAITING"   # blocked on at least one parent
+READY = "READY"       # all parents completed, queued for dispatch
+RUNNING = "RUNNING"   # handed to an agent (or owned by someone else)
+FAILED = "FAILED"     # dead-lettered; back to READY if its row turns PENDING again
+
+# Strict priority classes within a namespace, by tasks.priority: a class is
+# only served while every higher one is empty
+PRIORITY_CLASSES = (4, 2)   # priority >= 4 is class 0, >= 2 class 1, the rest class 2
+
+def priority_class(priority: int) -> int:
+    for cls, floor in enumerate(PRIORITY_CLASSES):
+        if priority >= floor:
+            return cls
+    return len(PRIORITY_CLASSES)
+
+class TaskNode:
+    def __init__(self, task_id: str, description: str, priority: int, created_at: float, row=None):
+        self.id = task_id
+        self.description = description
+        self.priority = priority or 0
+        self.priority_class = priority_class(self.priority)
+        self.created_at = created_at or 0.0
+        self.row = row
+        self.deps: List[str] = []
+        self.parents: Set[str] = set()      # parents not yet completed
+        self.children: List[str] = []
+        self.rank = 1                       # length of the longest chain starting here
+        self.state = WAITING
+        self.ready_at = None                # clock time its last parent completed
+        self.namespace = row[9] if row is not None else None
+        self.role = row[13] if row is not None and len(row) > 13 else None   # explicit tasks.role, else routed on add
+        self.attempts = (row[14] or 0) if row is not None and len(row) > 14 else 0
+
+    def as_task(self) -> Dict:
+        return {"id": self.id, "description": self.description, "priority": self.priority, "role": self.role, "attempts": self.attempts}
+
+class DependencyScheduler:
+    """
+    Incremental DAG over the tasks.dependencies column. Tasks are released to
+    their namespace's ready-queue once all their parents have COMPLETED.
+
+    Namespaces share dispatch by weighted fair queueing (stride scheduling):
+    pop_ready() serves the namespace with the lowest pass, and each task it
+    hands out advances that pass by 1/weight. Within a namespace, priority
+    classes are strict; inside a class, tasks go by critical-path rank
+    (longest remaining chain first), then priority, then age. Every
+    namespace keeps one heap per role, so a role with no free agent can be
+    skipped without popping its tasks.
+    """
+    def __init__(self, clock=None, route_batch: Callable[[Iterable[str]], List[str]] = None, weights: Dict[str, float] = None):
+        self.clock = clock or RealClock()
+        self.route_batch = route_batch      # descriptions -> roles, for tasks without an explicit role
+        self.weights = dict(weights or {})  # namespace -> share of dispatch; unlisted namespaces weigh 1
+        self.nodes: Dict[str, TaskNode] = {}
+        self.external: Set[str] = set()     # parents we only know from the DB
+        self._ready: Dict[str, Dict[str, list]] = {}    # namespace -> role -> heap
+        self._ready_count: Dict[str, int] = {}          # READY nodes per namespace
+        self._pass: Dict[str, float] = {}
+        self._vtime = 0.0                   # pass of the last namespace served
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def add_tasks(self, rows: Iterable, lookup_statuses: Callable[[List[str]], Dict[str, str]] = None) -> List[TaskNode]:
+        """
+        Add PENDING task rows (tasks table order) not seen before. Parents that
+        aren't in the graph are resolved with lookup_statuses(ids) -> {id: status}.
+        Returns the new nodes.
+        """
+        with self._lock:
+            added = []
+            for row in rows:
+                existing = self.nodes.get(row[0])
+                if existing is not None and existing.description is None and row[0] in self.external:
+                    # Known so far only as a parent owned elsewhere; now ours to dispatch
+                    self.external.discard(row[0])
+                    node = TaskNode(row[0], row[1], row[4], row[7], row)
+                    node.deps = self._parse_deps(row[5])
+                    node.children = existing.children
+                    self.nodes[node.id] = node
+                    added.append(node)
+                    continue
+                if existing is not None:
+                    if existing.state == FAILED:
+                        # Requeued from the dead-letter queue
+                        existing.attempts = (row[14] or 0) if len(row) > 14 else 0
+                        existing.state = RUNNING
+                        self.retry(existing.id)
+                    elif existing.state == RUNNING:
+                        # Back to PENDING behind our back (a retry or lease released elsewhere): nobody runs it now
+                        self.external.discard(existing.id)
+                        self.retry(existing.id)
+                    continue
+                node = TaskNode(row[0], row[1], row[4], row[7], row)
+                node.deps = self._parse_deps(row[5])
+                self.nodes[node.id] = node
+                added.append(node)
+            if not added:
+                return added
+
+            # Route every new task in one batch; an explicit tasks.role wins
+            unrouted = [node for node in added if node.role is None]
+            if unrouted and self.route_batch:
+                for node, role in zip(unrouted, self.route_batch(node.description for node in unrouted)):
+                    node.role = role
+
+            unknown = {dep for node in added for dep in node.deps if dep not in self.nodes}
+            statuses = lookup_statuses(list(unknown)) if unknown and lookup_statuses else {}
+            for dep in unknown:
+                status = statuses.get(dep)
+                if status is None or status == "COMPLETED":
+                    continue
+                # Running elsewhere (or pending outside our view): track until it completes
+                placeholder = TaskNode(dep, None, 0, 0.0)
+                placeholder.state = RUNNING
+                self.nodes[dep] = placeholder
+                self.external.add(dep)
+
+            for node in added:
+                for dep in node.deps:
+                    parent = self.nodes.get(dep)
+                    if parent is None or dep == node.id:
+                        continue
+                    node.parents.add(dep)
+                    parent.children.append(node.id)
+
+            for node in added:
+                self._propagate_rank(node)
+            for node in added:
+                if not node.parents:
+                    self._push_ready(node)
+            return added
+
+    def pending_count(self) -> int:
+        # Tasks not handed out yet: ready, or waiting on parents
+        with self._lock:
+            return sum(1 for node in self.nodes.values() if node.state in (WAITING, READY) and node.description is not None)
+
+    def ready_counts(self) -> Dict[str, int]:
+        with self._lock:
+            return {namespace: count for namespace, count in self._ready_count.items() if count}
+
+    def set_weight(self, namespace: str, weight: float):
+        with self._lock:
+            self.weights[namespace] = weight
+
+    def pop_ready(self, exclude_roles: Iterable[str] = ()) -> Optional[TaskNode]:
+        """Next task by fair share between namespaces, skipping roles in exclude_roles."""
+        with self._lock:
+            best = None
+            for namespace, queues in self._ready.items():
+                if not self._ready_count.get(namespace):
+                    continue
+                head = self._best_head(queues, exclude_roles)
+                if head is not None and (best is None or (self._pass[namespace], namespace) < (self._pass[best[0]], best[0])):
+                    best = (namespace, head)
+            if best is None:
+                return None
+            namespace, (_, role) = best
+            return self._take(namespace, role)
+
+    def steal(self, role: str) -> Optional[TaskNode]:
+        """
+        Next task for an agent of `role` that just came free, from the longest
+        namespace queue holding one, ahead of the fair-share order.
+        """
+        with self._lock:
+            for namespace in sorted(self._ready_count, key=self._ready_count.get, reverse=True):
+                if not self._ready_count[namespace]:
+                    break
+                heap = self._ready[namespace].get(role)
+                if heap and self._clean(heap):
+                    return self._take(namespace, role)
+            return None
+
+    def requeue(self, task_id: str):
+        # Put a popped task back, e.g. when no agent could take it this tick; its namespace gets the turn back
+        with self._lock:
+            node = self.nodes.get(task_id)
+            if node is not None and node.state == RUNNING and not node.parents:
+                self._pass[node.namespace] = self._pass.get(node.namespace, 0.0) - 1.0 / self.weights.get(node.namespace, 1.0)
+                self._push_ready(node)
+
+    def retry(self, task_id: str):
+        # Requeue a task for another run; its dispatch latency counts from now, not from its first release
+        with self._lock:
+            node = self.nodes.get(task_id)
+            if node is not None and node.state == RUNNING and not node.parents:
+                node.ready_at = None
+                self._push_ready(node)
+
+    def mark_external(self, task_id: str):
+        # Another dispatcher owns this task; poll its status instead of waiting for a result
+        with self._lock:
+            node = self.nodes.get(task_id)
+            if node is not None:
+                self._leave_ready(node, RUNNING)
+                self.external.add(task_id)
+
+    def mark_failed(self, task_id: str):
+        # Dead-lettered: children stay blocked until it is requeued and completes
+        with self._lock:
+            node = self.nodes.get(task_id)
+            if node is not None:
+                self._leave_ready(node, FAILED)
+
+    def task_completed(self, task_id: str) -> List[str]:
+        """Mark a task done and release children whose last parent it was."""
+        with self._lock:
+            node = self.nodes.pop(task_id, None)
+            self.external.discard(task_id)
+            if node is None:
+                return []
+            self._leave_ready(node, RUNNING)
+            released = []
+            for child_id in node.children:
+                child = self.nodes.get(child_id)
+                if child is None:
+                    continue
+                child.parents.discard(task_id)
+                if not child.parents and child.state == WAITING:
+                    self._push_ready(child)
+                    released.append(child_id)
+            return released
+
+    def sync_external(self, lookup_statuses: Callable[[List[str]], Dict[str, str]]):
+        # Check parents owned by another process; cheap since only placeholders are queried
+        with self._lock:
+            if not self.external:
+                return
+            ids = list(self.external)
+        statuses = lookup_statuses(ids)
+        for task_id in ids:
+            status = statuses.get(task_id)
+            if status is None or status == "COMPLETED":
+                self.task_completed(task_id)
+
+    def drop_namespace(self, namespace: str):
+        """
+        Forget a namespace's undispatched tasks once another dispatcher owns
+        it. Ones that tasks of other namespaces wait on stay as external parents.
+        """
+        with self._lock:
+            dropped = {task_id for task_id, node in self.nodes.items()
+                       if node.namespace == namespace and node.state != RUNNING and node.description is not None}
+            for task_id in dropped:
+                node = self.nodes[task_id]
+                self._leave_ready(node, RUNNING)
+                if any(child not in dropped and child in self.nodes for child in node.children):
+                    node.description = None
+                    self.external.add(task_id)
+                else:
+                    del self.nodes[task_id]
+            self._ready.pop(namespace, None)
+            self._ready_count.pop(namespace, None)
+
+    def demand_by_role(self, route: Callable[[str], str]) -> Dict[str, int]:
+        # Tasks still needing an agent (ready or blocked on parents), counted per routed role
+        with self._lock:
+            demand: Dict[str, int] = {}
+            for node in self.nodes.values():
+                if node.state in (RUNNING, FAILED) or node.description is None:
+                    continue
+                if node.role is None:
+                    node.role = route(node.description)
+                demand[node.role] = demand.get(node.role, 0) + 1
+            return demand
+
+    def _push_ready(self, node: TaskNode):
+        namespace = node.namespace
+        if node.state != READY:
+            node.state = READY
+            count = self._ready_count.get(namespace, 0)
+            if not count:
+                # A namespace that sat empty doesn't bank turns for it
+                self._pass[namespace] = max(self._pass.get(namespace, 0.0), self._vtime)
+            self._ready_count[namespace] = count + 1
+        if node.ready_at is None:
+            node.ready_at = self.clock.time()
+        heap = self._ready.setdefault(namespace, {}).setdefault(node.role, [])
+        heapq.heappush(heap, (node.priority_class, -node.rank, -node.priority, node.created_at, node.id))
+
+    def _leave_ready(self, node: TaskNode, state: str):
+        if node.state == READY:
+            self._ready_count[node.namespace] -= 1
+        node.state = state
+
+    def _clean(self, heap: list) -> list:
+        # Drop head entries superseded by a rank change or a state change
+        while heap:
+            node = self.nodes.get(heap[0][4])
+            if node is not None and node.state == READY and -heap[0][1] == node.rank:
+                break
+            heapq.heappop(heap)
+        return heap
+
+    def _best_head(self, queues: Dict[str, list], exclude_roles) -> Optional[tuple]:
+        best = None
+        for role, heap in queues.items():
+            if role in exclude_roles or not self._clean(heap):
+                continue
+            if best is None or heap[0] < best[0]:
+                best = (heap[0], role)
+        return best
+
+    def _take(self, namespace: str, role: str) -> TaskNode:
+        node = self.nodes[heapq.heappop(self._ready[namespace][role])[4]]
+        self._leave_ready(node, RUNNING)
+        self._vtime = self._pass[namespace]
+        self._pass[namespace] += 1.0 / self.weights.get(namespace, 1.0)
+        return node
+
+    def _propagate_rank(self, node: TaskNode):
+        # A node is one longer than its longest child chain; push increases up to ancestors
+        node.rank = max([node.rank] + [self.nodes[c].rank + 1 for c in node.children if c in self.nodes])
+        stack = [node]
+        while stack:
+            current = stack.pop()
+            for parent_id in current.parents:
+                parent = self.nodes.get(parent_id)
+                if parent is not None and parent.rank < current.rank + 1:
+                    if current.rank + 1 > len(self.nodes):
+                        logger.warning(f"Dependency cycle through task {parent_id}; it will never become ready")
+                        return
+                    parent.rank = current.rank + 1
+                    if parent.state == READY:
+                        self._push_ready(parent)
+                    stack.append(parent)
+
+    @staticmethod
+    def _parse_deps(raw) -> List[str]:
+        if not raw:
+            return []
+        try:
+            deps = json.loads(raw)
+        except (TypeError, ValueError):
+            logger.warning(f"Ignoring malformed dependencies: {raw!r}")
+            return []
+        return [str(dep) for dep in deps] if isinstance(deps, list) else []
@@ -0,0 +1,60 @@
+import hashlib
+import os
+import socket
+from typing import Iterable, List, Optional, Set, Tuple
+
+# Pseudo-namespace whose owner runs the session-wide chores (log archival)
+LEADER = "*"
+
+def rendezvous_owner(key: str, members: Iterable[str]) -> Optional[str]:
+    # Highest-random-weight hashing: when a member joins or leaves, only the keys it wins or held move
+    return max(members, key=lambda member: hashlib.blake2b(f"{member}:{key}".encode(), digest_size=8).digest(), default=None)
+
+class ShardCoordinator:
+    """
+    Splits a session's namespaces between the Queens of several hive
+    processes sharing one database. Each Queen heartbeats a membership row in
+    system_state; a namespace belongs to the live member that wins its
+    rendezvous hash, and that member holds a lease on it while it dispatches
+    it. A Queen that loses a namespace in a rebalance gives the lease up, and
+    the new owner only gets it once it is released or has expired, so two
+    Queens never dispatch the same namespace at once.
+    """
+    def __init__(self, memory, session_id: str, member_id: str = None, lease_duration: float = 15.0):
+        self.memory = memory
+        self.session_id = session_id
+        self.member_id = member_id or f"{socket.gethostname()}:{os.getpid()}"
+        self.lease_duration = lease_duration
+        self.refresh_interval = lease_duration / 3
+        self.members: List[str] = []
+        self.owned: Set[str] = set()
+        self.seen: Set[str] = set()         # namespaces the last refresh assigned, to us or to others
+
+    @property
+    def leader(self) -> bool:
+        return LEADER in self.owned
+
+    def owns(self, namespace: str) -> bool:
+        return namespace in self.owned
+
+    def refresh(self, namespaces: Iterable[str]) -> Tuple[Set[str], Set[str]]:
+        """
+        Heartbeat, recompute the partition over the live members, and renew,
+        take or give up shard leases accordingly. Returns (gained, lost).
+        """
+        now = self.memory.clock.time()
+        expires = now + self.lease_duration
+        self.memory.heartbeat_member(self.session_id, self.member_id, expires)
+        self.members = sorted(set(self.memory.live_members(self.session_id, now)) | {self.member_id})
+        self.seen = set(namespaces) | self.owned | {LEADER}
+        wanted = {namespace for namespace in self.seen if rendezvous_owner(namespace, self.members) == self.member_id}
+        self.memory.release_shards(self.session_id, self.owned - wanted, self.member_id)
+        # A wanted shard still leased to its previous owner is taken on a later refresh
+        held = self.memory.acquire_shards(self.session_id, wanted, self.member_id, expires, now)
+        gained, lost = held - self.owned, self.owned - held
+        self.owned = held
+        return gained, lost
+
+    def leave(self):
+        self.memory.leave_session(self.session_id, self.member_id)
+        self.owned = set()
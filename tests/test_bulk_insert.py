@@ -0,0 +1,88 @@
+import io
+import json
+import sqlite3
+import pytest
+import bulk_inject
+from hive_core import BulkInputConsumed, SharedMemory
+from storage import CREATED_AT, DEPENDENCIES, DESCRIPTION, ID, InMemoryStorage
+
+@pytest.fixture(params=["sqlite", "memory"])
+def memory(request, tmp_path):
+    if request.param == "sqlite":
+        store = SharedMemory(str(tmp_path / "hive.db"), write_behind=False, log_archive_dir=str(tmp_path / "logs"))
+    else:
+        store = InMemoryStorage(log_archive_dir=str(tmp_path / "logs"))
+    yield store
+    store.close()
+
+def one_shot(count, seen):
+    for i in range(count):
+        seen.append(i)
+        yield {"key": i, "description": f"Task {i}"}
+
+def test_locked_database_fails_before_reading_the_input(tmp_path):
+    db_path = str(tmp_path / "hive.db")
+    memory = SharedMemory(db_path, write_behind=False, busy_timeout=0.05, max_retries=2, retry_backoff=0.01)
+    other = sqlite3.connect(db_path, timeout=0)
+    other.execute("BEGIN IMMEDIATE")
+    seen = []
+    with pytest.raises(sqlite3.OperationalError, match="locked"):
+        memory.create_tasks_bulk(one_shot(3, seen), session_id="s")
+    # BEGIN IMMEDIATE is what failed, so nothing was read and a caller can retry with the same input
+    assert seen == []
+    other.rollback()
+    assert memory.create_tasks_bulk(one_shot(3, seen), session_id="s") == 3
+    other.close()
+    memory.close()
+
+def test_locked_after_the_input_is_read_is_not_retried(tmp_path, caplog):
+    db_path = str(tmp_path / "hive.db")
+    # In rollback-journal mode a reader's shared lock blocks the commit, after the input is consumed
+    memory = SharedMemory(db_path, write_behind=False, journal_mode="DELETE", busy_timeout=0.05, max_retries=5)
+    reader = sqlite3.connect(db_path, timeout=0)
+    reader.execute("BEGIN")
+    reader.execute("SELECT COUNT(*) FROM tasks").fetchone()
+    seen = []
+    with pytest.raises(BulkInputConsumed):
+        memory.create_tasks_bulk(one_shot(3, seen), session_id="s")
+    assert seen == [0, 1, 2]
+    assert caplog.text.count("retrying") <= 1
+    reader.rollback()
+    assert memory.get_session_tasks("s") == []
+    reader.close()
+    memory.close()
+
+def test_keys_resolve_to_ids_in_either_direction(memory):
+    existing = memory.create_task("Collect the data", session_id="s")
+    batch = "9c5b94b1-35ad-49bb-b118-8e8fc2ce0b8c"
+    count = memory.create_tasks_bulk(iter([
+        {"key": "report", "description": "Write the report", "deps": ["clean", "plot"]},
+        {"key": "clean", "description": "Clean the data", "dep_ids": [existing]},
+        {"key": "plot", "description": "Plot the data", "deps": ["clean"], "priority": 3},
+    ]), session_id="s", batch_id=batch)
+    assert count == 3
+
+    ids = {key: memory.bulk_task_id(batch, key) for key in ("report", "clean", "plot")}
+    rows = {row[ID]: row for row in memory.get_session_tasks("s")}
+    deps = {key: json.loads(rows[task_id][DEPENDENCIES]) for key, task_id in ids.items()}
+    assert deps == {"report": [ids["clean"], ids["plot"]], "clean": [existing], "plot": [ids["clean"]]}
+    # Input order is kept for FIFO dispatch on equal priority
+    created = [rows[ids[key]][CREATED_AT] for key in ("report", "clean", "plot")]
+    assert created == sorted(created)
+
+def test_csv_keys_and_dependency_lists_match_up(memory):
+    # CSV keys arrive as strings and deps as a ;-separated list; ids come out the same either way
+    rows = bulk_inject.read_csv(io.StringIO("key,description,deps,priority\n1,Design the API,,2\n2,Implement the API,1,\n3,Test the API,1; 2,\n"))
+    memory.create_tasks_bulk(rows, session_id="s", batch_id="0d6c6b5e-7f5e-4f7b-9a44-6f0b7c7e2f11")
+    by_description = {row[DESCRIPTION]: row for row in memory.get_session_tasks("s")}
+    design = by_description["Design the API"][ID]
+    implement = by_description["Implement the API"][ID]
+    assert design == memory.bulk_task_id("0d6c6b5e-7f5e-4f7b-9a44-6f0b7c7e2f11", 1)
+    assert json.loads(by_description["Test the API"][DEPENDENCIES]) == [design, implement]
+
+def test_a_bad_row_rolls_the_whole_batch_back(tmp_path):
+    memory = SharedMemory(str(tmp_path / "hive.db"), write_behind=False, log_archive_dir=str(tmp_path / "logs"))
+    with pytest.raises(KeyError):
+        memory.create_tasks_bulk(iter([{"description": "Fine"}, {"priority": 2}]), session_id="s")
+    assert memory.get_session_tasks("s") == []
+    memory.close()
@@ -0,0 +1,35 @@
+import struct
+import pytest
+from hive_core import CODECS, Message, MessageType, StructCodec
+
+@pytest.fixture(params=["json", "struct", "msgpack"])
+def codec(request):
+    if request.param not in CODECS:
+        pytest.skip(f"{request.param} codec unavailable")
+    return CODECS[request.param]()
+
+def assert_same(decoded, msg):
+    for field in Message.__slots__:
+        assert getattr(decoded, field) == getattr(msg, field), field
+
+def test_round_trip(codec):
+    msg = Message("queen-1", "worker-7", MessageType.TASK_ASSIGNMENT,
+                  {"task_id": "t1", "description": "Analyze data", "priority": 5, "deps": ["a", "b"], "score": 0.5}, 41)
+    assert_same(codec.decode(codec.encode(msg)), msg)
+
+def test_round_trip_without_sender_or_parent(codec):
+    msg = Message(None, "worker-7", MessageType.SYSTEM_ALERT, {"alert": "shutdown"})
+    decoded = codec.decode(codec.encode(msg))
+    assert_same(decoded, msg)
+    assert decoded.sender_id is None and decoded.parent_msg_id is None
+
+def test_round_trip_unicode(codec):
+    msg = Message("quëen-☉", "wörker-信号", MessageType.KNOWLEDGE_SHARE,
+                  {"finding": "Signal décodé: 信号 🛸", "tags": ["ελληνικά", "русский"]}, 3)
+    assert_same(codec.decode(codec.encode(msg)), msg)
+
+def test_struct_codec_rejects_non_int_ids():
+    msg = Message("queen-1", "worker-7", MessageType.TASK_RESULT, {})
+    msg.id = "not-a-number"
+    with pytest.raises(struct.error):
+        StructCodec().encode(msg)
@@ -0,0 +1,153 @@
+import json
+import time
+import pytest
+import dashboard
+from clock import ScaledClock
+from hive_core import SharedMemory
+
+@pytest.fixture
+def session(tmp_path, monkeypatch):
+    # The dashboard follows the session named in the working directory's current_session.txt
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "current_session.txt").write_text("s")
+    return "s"
+
+@pytest.fixture
+def memory(session, tmp_path, monkeypatch):
+    # A fast clock so consecutive tasks get distinct created_at values
+    db_path = str(tmp_path / "hive.db")
+    monkeypatch.setattr(dashboard, "DB_PATH", db_path)
+    store = SharedMemory(db_path, write_behind=False, clock=ScaledClock(1000.0), log_archive_dir=str(tmp_path / "logs"))
+    yield store
+    store.close()
+
+@pytest.fixture
+def client():
+    return dashboard.app.test_client()
+
+def wait_for(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+def test_change_feed_survives_a_missing_schema(session, tmp_path, caplog):
+    db_path = str(tmp_path / "hive.db")
+    feed = dashboard.ChangeFeed(db_path, interval=0.01)
+    sub = feed.subscribe(session)
+    wait_for(lambda: "no such table" in caplog.text)
+
+    memory = SharedMemory(db_path, write_behind=False)
+    # Let the poller find the schema and take its starting position
+    time.sleep(0.2)
+    task_id = memory.create_task("Analyze data", session_id=session)
+    delta = sub.get(timeout=5)
+    while "tasks" not in delta:
+        delta = sub.get(timeout=5)
+    assert feed.thread is not None and feed.thread.is_alive()
+    assert [row[0] for row in delta["tasks"]] == [task_id]
+    memory.close()
+
+@pytest.mark.filterwarnings("ignore::pytest.PytestUnhandledThreadExceptionWarning")
+def test_change_feed_restarts_after_its_thread_dies(session, tmp_path, monkeypatch):
+    feed = dashboard.ChangeFeed(str(tmp_path / "hive.db"), interval=0.01)
+    def crash():
+        raise RuntimeError("poller died")
+    monkeypatch.setattr(feed, "_poll", crash)
+    feed.subscribe(session)
+    wait_for(lambda: feed.thread is None)
+    monkeypatch.undo()
+    feed.subscribe(session)
+    assert feed.thread is not None and feed.thread.is_alive()
+
+def sse_events(response):
+    # Parse a streamed text/event-stream body into (event, data) pairs, skipping keepalives
+    buffer = ""
+    for chunk in response.response:
+        buffer += chunk.decode() if isinstance(chunk, bytes) else chunk
+        while "\n\n" in buffer:
+            block, buffer = buffer.split("\n\n", 1)
+            fields = dict(line.split(": ", 1) for line in block.splitlines() if not line.startswith(":"))
+            if fields:
+                yield fields["event"], json.loads(fields["data"])
+
+def test_stream_sends_a_snapshot_then_only_what_changed(session, memory, client, monkeypatch):
+    first = memory.create_task("Design the schema", session_id=session)
+    untouched = memory.create_task("Document the schema", session_id=session)
+    monkeypatch.setattr(dashboard, "feed", dashboard.ChangeFeed(dashboard.DB_PATH, interval=0.01))
+    response = client.get("/api/stream", buffered=False)
+    assert response.mimetype == "text/event-stream"
+    events = sse_events(response)
+    event, snapshot = next(events)
+    assert event == "snapshot"
+    assert [row[0] for row in snapshot["tasks"]] == [untouched, first]
+
+    # Let the poller take its starting position
+    time.sleep(0.2)
+    second = memory.create_task("Implement the schema", session_id=session)
+    memory.assign_task(first, "agent-1")
+    statuses = {}
+    while len(statuses) < 2 or statuses[first] != "IN_PROGRESS":
+        event, delta = next(events)
+        assert event == "delta"
+        statuses.update((row[0], row[3]) for row in delta.get("tasks", []))
+    # Deltas carry only the rows that changed
+    assert statuses == {first: "IN_PROGRESS", second: "PENDING"}
+    response.close()
+
+def test_history_summarizes_sessions_a_page_at_a_time(memory, client, monkeypatch):
+    monkeypatch.setattr(dashboard, "history_cache", {})
+    monkeypatch.setattr(dashboard, "HISTORY_TTL", 0.0)
+    older = [memory.create_task(f"Research topic {i}", session_id="older") for i in range(2)]
+    memory.assign_task(older[0], "agent-1")
+    memory.complete_task(older[0], "done")
+    memory.create_task("Research the follow-up", session_id="newer")
+
+    first = client.get("/api/history?per_page=1").get_json()
+    assert [entry["session_id"] for entry in first["sessions"]] == ["newer"]
+    assert first["has_more"]
+    response = client.get("/api/history?page=2&per_page=1")
+    second = response.get_json()
+    assert not second["has_more"]
+    [entry] = second["sessions"]
+    assert entry["session_id"] == "older" and entry["task_count"] == 2
+    assert entry["status_counts"] == {"COMPLETED": 1, "PENDING": 1}
+
+    # Unchanged since the caller's copy: revalidate without a body
+    etag = response.headers["ETag"]
+    assert client.get("/api/history?page=2&per_page=1", headers={"If-None-Match": etag}).status_code == 304
+    memory.assign_task(older[1], "agent-1")
+    memory.complete_task(older[1], "done")
+    response = client.get("/api/history?page=2&per_page=1", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.get_json()["sessions"][0]["status_counts"] == {"COMPLETED": 2}
+
+def test_data_pages_by_keyset_and_skips_unchanged_versions(session, memory, client):
+    created = [memory.create_task(f"Implement module {i}", session_id=session) for i in range(5)]
+    memory.assign_task(created[1], "agent-1")
+    memory.complete_task(created[1], "done")
+
+    seen, pages, after = [], 0, None
+    while True:
+        data = client.get("/api/data", query_string={"limit": 2, **({"after": after} if after else {})}).get_json()
+        pages += 1
+        seen += [row[0] for row in data["tasks"]]
+        # Only the columns the dashboard shows, never the task result
+        assert all(len(row) == len(dashboard.TASK_COLUMNS.split(",")) for row in data["tasks"])
+        after = data["next_after"]
+        if after is None:
+            break
+    assert pages == 3
+    assert seen == created[::-1]
+    completed = client.get("/api/data", query_string={"status": "COMPLETED"}).get_json()
+    assert [row[0] for row in completed["tasks"]] == [created[1]]
+
+    response = client.get("/api/data", query_string={"limit": 2})
+    version = response.get_json()["version"]
+    assert client.get("/api/data", query_string={"limit": 2, "since_version": version}).status_code == 304
+    assert client.get("/api/data", query_string={"limit": 2}, headers={"If-None-Match": response.headers["ETag"]}).status_code == 304
+    memory.create_task("Implement module 5", session_id=session)
+    response = client.get("/api/data", query_string={"limit": 2, "since_version": version})
+    assert response.status_code == 200
+    assert response.get_json()["version"] != version
+    assert client.get("/api/data", query_string={"after": "yesterday"}).status_code == 400
@@ -0,0 +1,50 @@
+import pickle
+import queue
+import time
+import pytest
+from clock import ScaledClock, SimulatedClock
+from execution import ProcessPool
+from hive_core import Message, MessageBus, MessageType
+from storage import InMemoryStorage
+from workers import CoderAgent
+
+def test_pool_runs_on_the_agents_clock_and_seed(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    clock = ScaledClock(1000.0, seed=4)
+    memory = InMemoryStorage(clock=clock)
+    bus = MessageBus(clock=clock)
+    agent = CoderAgent("Coder-Pool", "CODER", memory, bus, None, "pool-session")
+    tasks = [{"id": f"t{i}", "description": "Implement the parser", "attempts": 0} for i in range(20)]
+    # The thread backend's outcomes for this seed
+    expected = {task["id"]: agent.run_task(task)["status"] for task in tasks}
+    assert "FAILED" in expected.values()
+
+    results = queue.Queue()
+    monkeypatch.setattr(agent, "finish_task", lambda message, outcome: results.put((message.content["id"], outcome["status"])))
+    pool = ProcessPool(max_workers=2, codec="json")
+    try:
+        started = time.monotonic()
+        for task in tasks:
+            pool.submit(agent, Message("queen", agent.id, MessageType.TASK_ASSIGNMENT, task))
+        outcomes = dict(results.get(timeout=60) for _ in tasks)
+        elapsed = time.monotonic() - started
+    finally:
+        pool.shutdown()
+        bus.shutdown(wait=False)
+    assert outcomes == expected
+    # 2-5 clock seconds of work per task; on a real clock 20 tasks over 2 processes would take 20s or more
+    assert elapsed < 15
+
+def test_simulated_clock_cannot_be_sent_to_another_process():
+    clock = SimulatedClock(seed=1)
+    try:
+        with pytest.raises(TypeError):
+            pickle.dumps(clock)
+    finally:
+        clock.stop()
+
+def test_scaled_clock_copy_keeps_its_timeline_and_seed():
+    clock = ScaledClock(50.0, seed=9)
+    copy = pickle.loads(pickle.dumps(clock))
+    assert abs(copy.time() - clock.time()) < 1.0
+    assert copy.rng("t1").random() == clock.rng("t1").random()
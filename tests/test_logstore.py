@@ -0,0 +1,76 @@
+import json
+import logging
+import os
+import sqlite3
+import time
+from clock import ScaledClock
+from hive_core import SharedMemory
+from logstore import LogArchive, LogPolicy, RecentLogs
+
+def test_policy_drops_chatty_levels_and_samples_frequent_actions():
+    policy = LogPolicy()
+    assert not policy.should_store("RESOURCE")
+    assert policy.should_store("TASK_FAILED")
+    # The first DECISION is stored, then one in 20
+    stored = [i for i in range(41) if policy.should_store("DECISION")]
+    assert stored == [0, 20, 40]
+
+    verbose = LogPolicy(level=logging.DEBUG, sample={"DECISION": 1})
+    assert verbose.should_store("RESOURCE")
+    assert all(verbose.should_store("DECISION") for _ in range(5))
+    quiet = LogPolicy(level=logging.WARNING)
+    assert not quiet.should_store("ASSIGNMENT")
+    assert quiet.should_store("DEAD_LETTER")
+
+def test_ring_keeps_the_newest_entries_of_the_most_recent_sessions():
+    recent = RecentLogs(size=3, max_sessions=2)
+    for i in range(5):
+        recent.append("a", ("agent", "STEP", i))
+    assert recent.get("a") == [("agent", "STEP", 4), ("agent", "STEP", 3), ("agent", "STEP", 2)]
+    assert recent.get("a", limit=1) == [("agent", "STEP", 4)]
+
+    recent.append("b", ("agent", "STEP", 0))
+    # Writing to "a" makes "b" the least recently active, so a third session evicts it
+    recent.append("a", ("agent", "STEP", 5))
+    recent.append("c", ("agent", "STEP", 0))
+    assert recent.get("b") == []
+    assert recent.get("a")[0] == ("agent", "STEP", 5)
+    assert recent.get("missing") == []
+
+def row(log_id, timestamp, session_id="s"):
+    return (log_id, "agent", "STEP", "{}", timestamp, "default", session_id)
+
+def test_archive_writes_gzip_segments_and_prunes_them_by_age(tmp_path):
+    archive = LogArchive(str(tmp_path / "logs"))
+    assert archive.write([]) is None
+    old = archive.write([row(1, 100.0), row(2, 100.5, "other")])
+    new = archive.write([row(3, 200.0), row(4, 250.25)])
+    assert os.path.basename(old) == "100-1-2.jsonl.gz"
+    assert [os.path.basename(path) for path in archive.segments()] == ["100-1-2.jsonl.gz", "250-3-4.jsonl.gz"]
+    assert not [name for name in os.listdir(tmp_path / "logs") if name.endswith(".tmp")]
+    assert [entry["id"] for entry in archive.read()] == [1, 2, 3, 4]
+    assert [entry["id"] for entry in archive.read("s")] == [1, 3, 4]
+
+    # A segment goes only once its newest entry is older than the cutoff
+    assert archive.prune(100.9) == 0
+    assert archive.prune(101.0) == 1
+    assert archive.segments() == [new]
+
+def test_shared_memory_rings_every_event_but_stores_and_archives_by_policy(tmp_path):
+    db_path = str(tmp_path / "hive.db")
+    memory = SharedMemory(db_path, write_behind=False, clock=ScaledClock(1.0, start=time.time() - 7200),
+                          log_archive_dir=str(tmp_path / "logs"))
+    for i in range(21):
+        memory.log_action("queen", "DECISION", f"Mode {i}", session_id="s")
+    memory.log_action("queen", "RESOURCE", "No suitable agent", session_id="s")
+    # The ring buffer sees everything; SQLite only what passes the policy
+    assert len(memory.recent_logs("s", limit=50)) == 22
+    conn = sqlite3.connect(db_path)
+    stored = conn.execute("SELECT details FROM logs WHERE session_id = 's' ORDER BY id").fetchall()
+    assert [json.loads(details) for details, in stored] == ["Mode 0", "Mode 20"]
+
+    assert memory.archive_logs(max_age=3600) == 2
+    assert conn.execute("SELECT COUNT(*) FROM logs").fetchone()[0] == 0
+    conn.close()
+    assert [json.loads(entry["details"]) for entry in memory.log_archive.read("s")] == ["Mode 0", "Mode 20"]
+    memory.close()
@@ -0,0 +1,77 @@
+import gc
+import threading
+import urllib.error
+import urllib.request
+import pytest
+import metrics
+
+@pytest.fixture
+def registry():
+    return metrics.Registry()
+
+def test_counters_render_with_help_type_and_escaped_labels(registry):
+    counter = metrics.Counter("jobs_total", "Jobs run", ("role", "status"), registry=registry)
+    counter.inc(labels=("CODER", "COMPLETED"))
+    counter.inc(2, labels=("CODER", "COMPLETED"))
+    counter.inc(0.5, labels=('say "hi"\n', "FAILED"))
+    assert registry.render() == (
+        "# HELP jobs_total Jobs run\n"
+        "# TYPE jobs_total counter\n"
+        'jobs_total{role="CODER",status="COMPLETED"} 3\n'
+        'jobs_total{role="say \\"hi\\"\\n",status="FAILED"} 0.5\n'
+    )
+
+def test_counter_shards_merge_across_threads_including_finished_ones(registry):
+    counter = metrics.Counter("events_total", "Events", registry=registry)
+    def work():
+        for _ in range(1000):
+            counter.inc()
+    threads = [threading.Thread(target=work) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    counter.inc()
+    assert counter.collect() == {(): 4001}
+    # Finished threads' shards are folded in once and not counted twice
+    assert counter.collect() == {(): 4001}
+
+def test_histogram_buckets_are_cumulative_and_upper_inclusive(registry):
+    histogram = metrics.Histogram("latency_seconds", "Latency", ("method",), buckets=(0.1, 1.0), registry=registry)
+    for value in (0.05, 0.1, 0.5, 3.0):
+        histogram.observe(value, ("get",))
+    lines = registry.render().splitlines()
+    assert lines[1] == "# TYPE latency_seconds histogram"
+    assert lines[2:] == [
+        'latency_seconds_bucket{method="get",le="0.1"} 2',
+        'latency_seconds_bucket{method="get",le="1.0"} 3',
+        'latency_seconds_bucket{method="get",le="+Inf"} 4',
+        'latency_seconds_sum{method="get"} 3.65',
+        'latency_seconds_count{method="get"} 4',
+    ]
+
+def test_gauges_are_computed_on_scrape_and_hold_their_owner_weakly(registry):
+    class Pool:
+        def depths(self):
+            return {("default",): 7}
+    gauge = metrics.Gauge("queue_depth", "Queued", ("namespace",), registry=registry)
+    pool = Pool()
+    gauge.set_function(pool.depths)
+    assert 'queue_depth{namespace="default"} 7' in registry.render()
+    del pool
+    gc.collect()
+    assert gauge.collect() == {}
+
+def test_the_exporter_serves_the_registry_over_http():
+    server = metrics.serve(0, "127.0.0.1")
+    try:
+        url = f"http://127.0.0.1:{server.server_address[1]}"
+        with urllib.request.urlopen(f"{url}/metrics") as response:
+            assert response.headers["Content-Type"] == metrics.CONTENT_TYPE
+            assert "# TYPE hive_tasks_finished_total counter" in response.read().decode()
+        with pytest.raises(urllib.error.HTTPError) as error:
+            urllib.request.urlopen(f"{url}/other")
+        assert error.value.code == 404
+    finally:
+        server.shutdown()
+        server.server_close()
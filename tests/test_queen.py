@@ -0,0 +1,127 @@
+import threading
+import pytest
+from clock import RealClock
+from hive_core import MessageBus
+from queen import AgentFactory, AgentRegistry, QueenAgent
+from storage import InMemoryStorage
+
+@pytest.fixture
+def queen():
+    memory = InMemoryStorage()
+    bus = MessageBus(clock=memory.clock)
+    queen = QueenAgent("Queen-Test", memory, bus, session_id="s", role_limits={"CODER": (0, 2)})
+    yield queen
+    queen.stop()
+    bus.shutdown(wait=False)
+    memory.close()
+
+class ManualClock(RealClock):
+    # Monotonic time that only moves when a test says so
+    def __init__(self):
+        super().__init__()
+        self.now = 0.0
+
+    def monotonic(self):
+        return self.now
+
+def halt(queen):
+    # Stop the management loop without shutting the hive down, so a test can drive passes itself
+    queen.running = False
+    queen.memory.notify_change()
+    queen.thread.join()
+    return queen
+
+def test_agent_added_busy_is_never_handed_out():
+    memory = InMemoryStorage()
+    bus = MessageBus(clock=memory.clock)
+    registry = AgentRegistry(memory.clock)
+    idle = AgentFactory.create_agent("CODER", memory, bus, None, "s")
+    fresh = AgentFactory.create_agent("CODER", memory, bus, None, "s")
+    registry.add(idle)
+    registry.add(fresh, busy_with="t1")
+    assert registry.busy_tasks() == {fresh.id: "t1"}
+    assert registry.acquire("CODER", "t2") is idle
+    assert registry.acquire("CODER", "t3") is None
+    registry.release(fresh.id)
+    assert registry.acquire("CODER", "t3") is fresh
+    bus.shutdown(wait=False)
+
+def test_spawning_respects_the_role_ceiling_under_concurrency(queen):
+    barrier = threading.Barrier(8)
+    def spawn(i):
+        barrier.wait()
+        queen.spawn_agent_for_task({"id": f"missing-{i}", "description": "Implement the backend", "role": "CODER"})
+    threads = [threading.Thread(target=spawn, args=(i,)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert queen.registry.role_count("CODER") == 2
+    # Claims of unknown tasks fail, so every spawned agent is free again
+    assert queen.registry.idle_count("CODER") == 2
+
+def test_kept_idlers_get_a_fresh_ttl():
+    clock = ManualClock()
+    memory = InMemoryStorage(clock=clock)
+    bus = MessageBus(clock=clock)
+    queen = halt(QueenAgent("Queen-Test", memory, bus, session_id="s", role_limits={"CODER": (1, 2)}, idle_ttl=10.0))
+    queen.optimize_resources()
+    assert queen.registry.role_count("CODER") == 1
+
+    clock.now += 11.0
+    queen.optimize_resources()
+    # The role minimum keeps the CODER; before, its expiry stayed at 0 and the loop spun
+    assert queen.registry.role_count("CODER") == 1
+    assert queen.registry.next_idle_expiry(queen.idle_ttl) == 10.0
+    queen.stop()
+    bus.shutdown(wait=False)
+    memory.close()
+
+def test_each_pass_fetches_only_tasks_changed_since_the_last(monkeypatch):
+    memory = InMemoryStorage()
+    bus = MessageBus(clock=memory.clock)
+    queen = halt(QueenAgent("Queen-Test", memory, bus, session_id="incremental"))
+    # Paused: passes fetch and schedule but don't dispatch
+    queen.control.set_state("PAUSED")
+    fetched = []
+    fetch = memory.get_pending_tasks_since
+    def spy(*args, **kwargs):
+        rows, seq = fetch(*args, **kwargs)
+        fetched.append(sorted(row[0] for row in rows))
+        return rows, seq
+    monkeypatch.setattr(memory, "get_pending_tasks_since", spy)
+
+    first = sorted(memory.create_task(f"Implement module {i}", session_id="incremental") for i in range(3))
+    queen.check_pending_tasks()
+    later = memory.create_task("Implement module 3", session_id="incremental")
+    queen.check_pending_tasks()
+    queen.check_pending_tasks()
+    assert fetched == [first, [later], []]
+    assert queen.scheduler.pending_count() == 4
+    queen.stop()
+    bus.shutdown(wait=False)
+    memory.close()
+
+def test_a_pass_stops_offering_tasks_to_a_role_at_its_ceiling(tmp_path, monkeypatch):
+    # The spawned workers write their outputs to the working directory
+    monkeypatch.chdir(tmp_path)
+    memory = InMemoryStorage()
+    bus = MessageBus(clock=memory.clock)
+    queen = halt(QueenAgent("Queen-Test", memory, bus, session_id="saturated", role_limits={"CODER": (0, 2)}))
+    offered = []
+    assign = queen.assign_task
+    def spy(task):
+        offered.append(task["id"])
+        return assign(task)
+    monkeypatch.setattr(queen, "assign_task", spy)
+
+    for i in range(5):
+        memory.create_task(f"Implement module {i}", session_id="saturated", role="CODER")
+    queen.check_pending_tasks()
+    # Two spawns fill the ceiling and the third attempt finds it full; the rest wait for the next pass
+    assert len(offered) == 3
+    assert queen.registry.role_count("CODER") == 2
+    assert queen.scheduler.pending_count() == 3
+    queen.stop()
+    bus.shutdown(wait=False)
+    memory.close()
@@ -0,0 +1,97 @@
+import random
+from clock import RealClock
+from hive_core import MessageBus
+from queen import QueenAgent
+from retry import RetryPolicy, TimerWheel
+from storage import ATTEMPTS, ID, STATUS, InMemoryStorage
+
+class ManualClock(RealClock):
+    # Time that only moves when a test says so
+    def __init__(self, now=1000.0):
+        super().__init__(seed=1)
+        self.now = now
+
+    def time(self):
+        return self.now
+
+    def monotonic(self):
+        return self.now
+
+def test_wheel_releases_keys_earliest_tick_first():
+    wheel = TimerWheel(tick=0.5, slots=8)
+    wheel.schedule("late", 3.2)
+    wheel.schedule("early", 0.7)
+    wheel.schedule("middle", 1.9)
+    # More than one revolution (8 ticks = 4s) out: stays put until its own turn
+    wheel.schedule("next-lap", 5.1)
+    assert wheel.advance(0.9) == []
+    assert wheel.advance(3.6) == ["early", "middle", "late"]
+    assert "next-lap" in wheel and len(wheel) == 1
+    assert wheel.advance(5.4) == []
+    assert wheel.advance(5.5) == ["next-lap"]
+
+def test_wheel_reschedules_cancels_and_covers_long_gaps():
+    wheel = TimerWheel(tick=1.0, slots=4)
+    wheel.schedule("a", 2.0)
+    wheel.schedule("a", 9.0)
+    wheel.schedule("b", 3.0)
+    assert wheel.cancel("b") and not wheel.cancel("b")
+    # A deadline already behind the wheel fires on the next advance
+    wheel.advance(5.0)
+    wheel.schedule("overdue", 1.0)
+    assert wheel.advance(6.0) == ["overdue"]
+    # A gap of several revolutions still finds every key
+    wheel.schedule("c", 7.5)
+    assert wheel.advance(100.0) == ["c", "a"]
+    assert len(wheel) == 0
+
+def test_wheel_ticks_count_from_its_start():
+    # Same offsets from two different starts fire on the same advances
+    for start in (1000.0, 1000.3):
+        wheel = TimerWheel(tick=0.5, start=start)
+        wheel.schedule("retry", start + 0.6)
+        assert wheel.advance(start + 0.99) == []
+        assert wheel.advance(start + 1.0) == ["retry"]
+
+def test_policy_budgets_are_per_role_and_backoff_is_capped():
+    policy = RetryPolicy(max_attempts=2, base_delay=1.0, factor=2.0, max_delay=5.0, jitter=0.2, budgets={"TESTER": 3})
+    assert [policy.should_retry("TESTER", n) for n in (1, 2, 3)] == [True, True, False]
+    assert [policy.should_retry("CODER", n) for n in (1, 3, 4)] == [True, True, False]
+    assert [policy.should_retry("ARCHITECT", n) for n in (1, 2)] == [True, False]
+    rng = random.Random(0)
+    for attempts, nominal in ((1, 1.0), (2, 2.0), (3, 4.0), (4, 5.0), (10, 5.0)):
+        assert nominal * 0.8 <= policy.delay(attempts, rng) <= nominal * 1.2
+
+def test_queen_dead_letters_a_task_once_its_role_budget_is_spent():
+    clock = ManualClock()
+    memory = InMemoryStorage(clock=clock)
+    bus = MessageBus(clock=clock)
+    queen = QueenAgent("Queen-Test", memory, bus, session_id="retries", retry_policy=RetryPolicy(budgets={"TESTER": 2}))
+    queen.running = False
+    memory.notify_change()
+    queen.thread.join()
+    # Paused: the pass registers the task without dispatching it
+    queen.control.set_state("PAUSED")
+    task_id = memory.create_task("Test the login flow", session_id="retries", role="TESTER")
+    queen.check_pending_tasks()
+
+    memory.assign_task(task_id, "agent-1")
+    queen.handle_failure(task_id, "flaky")
+    [row] = memory.get_session_tasks("retries")
+    assert row[STATUS] == "RETRY_SCHEDULED" and task_id in queen.retries
+    queen.release_retries()
+    assert memory.get_session_tasks("retries")[0][STATUS] == "RETRY_SCHEDULED"
+    # Backoff is 1s +/- 20%
+    clock.now += 1.5
+    queen.release_retries()
+    assert memory.get_session_tasks("retries")[0][STATUS] == "PENDING"
+
+    memory.assign_task(task_id, "agent-1")
+    queen.handle_failure(task_id, "flaky again")
+    [row] = memory.get_session_tasks("retries")
+    assert row[STATUS] == "FAILED" and row[ATTEMPTS] == 2
+    assert [dead[0] for dead in memory.get_dead_letters("retries")] == [row[ID]]
+    assert task_id not in queen.retries
+    queen.stop()
+    bus.shutdown(wait=False)
+    memory.close()
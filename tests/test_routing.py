@@ -0,0 +1,47 @@
+from queen import AgentFactory
+from routing import CapabilityRouter
+
+def make_router(**kwargs):
+    return CapabilityRouter({
+        "ANALYST": ["analy", "data"],
+        "CODER": ["implement", "code"],
+        "TESTER": ["test"],
+        "AUDITOR": {"audit": 3.0},
+    }, default_role="CODER", **kwargs)
+
+def test_routes_to_the_best_scoring_role():
+    router = make_router()
+    # Keywords match as token prefixes
+    assert router.route("Analysis of the data set") == "ANALYST"
+    # The leading word counts double
+    assert router.route("Test the implementation") == "TESTER"
+    assert router.route("Implement the test harness") == "CODER"
+    # Weighted keywords outrank several plain matches
+    assert router.route("Data code audit") == "AUDITOR"
+    # Nothing matched: the default role
+    assert router.route("Plan the offsite") == "CODER"
+
+def test_ties_go_to_the_role_registered_first():
+    router = CapabilityRouter({"WRITER": ["report"], "EDITOR": ["report"]}, default_role="WRITER")
+    assert router.route("Report on progress") == "WRITER"
+
+def test_a_batch_routes_like_single_calls():
+    descriptions = ["Analyze data", "Write unit tests", "Analyze data", "Security audit", "Lunch"]
+    batch = make_router().route_batch(descriptions)
+    assert batch == [make_router().route(desc) for desc in descriptions]
+    assert batch[0] == batch[2]
+
+def test_the_decision_cache_evicts_the_least_recently_used():
+    router = make_router(cache_size=2)
+    router.route("Analyze data")
+    router.route("Test the login")
+    # A hit makes an entry the most recent again
+    router.route("Analyze data")
+    router.route("Implement the login")
+    assert list(router._cache) == ["Analyze data", "Implement the login"]
+
+def test_agents_declare_the_capabilities_they_are_routed_by():
+    router = AgentFactory.build_router()
+    assert router.route("Analyze Database Performance") == "ANALYST"
+    assert router.route("Write Unit Tests for Auth Module") == "TESTER"
+    assert router.route("Research Competitor Features") == "RESEARCHER"
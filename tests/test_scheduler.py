@@ -0,0 +1,37 @@
+import pytest
+from hive_core import SharedMemory
+from scheduler import DependencyScheduler
+from storage import InMemoryStorage
+
+@pytest.fixture(params=["sqlite", "memory"])
+def memory(request, tmp_path):
+    store = SharedMemory(str(tmp_path / "hive.db"), write_behind=False) if request.param == "sqlite" else InMemoryStorage()
+    yield store
+    store.close()
+
+def test_running_node_whose_row_is_pending_again_is_requeued(memory):
+    task_id = memory.create_task("Write the report", session_id="s")
+    scheduler = DependencyScheduler()
+    scheduler.add_tasks(memory.get_pending_tasks(session_id="s"))
+    assert scheduler.pop_ready().id == task_id
+    # Another Queen released its retry or lease: the row is PENDING but our node still says RUNNING
+    scheduler.add_tasks(memory.get_pending_tasks(session_id="s"))
+    assert scheduler.pop_ready().id == task_id
+
+def test_ready_node_is_not_queued_twice(memory):
+    memory.create_task("Write the report", session_id="s")
+    scheduler = DependencyScheduler()
+    scheduler.add_tasks(memory.get_pending_tasks(session_id="s"))
+    scheduler.add_tasks(memory.get_pending_tasks(session_id="s"))
+    assert scheduler.pop_ready() is not None
+    assert scheduler.pop_ready() is None
+
+def test_reclaim_and_retries_limited_to_namespaces(memory):
+    ours = memory.create_task("Ours", namespace="A", session_id="s")
+    theirs = memory.create_task("Theirs", namespace="B", session_id="s")
+    for task_id in (ours, theirs):
+        assert memory.assign_task(task_id, "agent")
+    assert memory.reclaim_expired_leases("s", now=float("inf"), namespaces={"A"}) == [ours]
+    assert memory.get_task_statuses([ours, theirs]) == {ours: "PENDING", theirs: "IN_PROGRESS"}
+    assert memory.schedule_retry(theirs, "boom", 5.0)
+    assert memory.get_scheduled_retries("s") == [(theirs, 5.0, "B")]
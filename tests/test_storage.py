@@ -0,0 +1,92 @@
+import os
+import sqlite3
+import subprocess
+import sys
+import time
+import pytest
+from clock import ScaledClock
+from hive_core import SharedMemory
+from storage import COMPLETED_AT, DESCRIPTION, ID, InMemoryStorage
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+@pytest.fixture(params=["sqlite", "memory"])
+def memory(request, tmp_path):
+    if request.param == "sqlite":
+        store = SharedMemory(str(tmp_path / "hive.db"), write_behind=False, log_archive_dir=str(tmp_path / "logs"))
+    else:
+        store = InMemoryStorage(log_archive_dir=str(tmp_path / "logs"))
+    yield store
+    store.close()
+
+def finish(memory, description):
+    task_id = memory.create_task(description, session_id="s")
+    memory.assign_task(task_id, "agent-1")
+    memory.complete_task(task_id, "done")
+    memory.log_action("agent-1", "TASK_COMPLETED", description, session_id="s")
+    return task_id
+
+def test_retention_follows_wall_time_not_a_clock_running_ahead(memory):
+    day = 86400
+    memory.clock = ScaledClock(1.0, start=time.time() - 8 * day)
+    old = finish(memory, "Finished eight days ago")
+    # A simulated or scaled hive clock can be far ahead of the wall clock
+    memory.clock = ScaledClock(1.0, start=time.time() + 10 * day)
+    recent = finish(memory, "Finished just now, by the hive's clock")
+
+    assert memory.archive_logs(max_age=3600) == 1
+    memory.prune_memory(days_to_keep=7)
+    tasks = memory.get_session_tasks("s")
+    assert [row[ID] for row in tasks] == [recent]
+    assert tasks[0][COMPLETED_AT] > time.time()
+
+def max_seq(path):
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute("SELECT COALESCE(MAX(seq), 0) FROM changes").fetchone()[0]
+    finally:
+        conn.close()
+
+def test_snapshots_keep_the_change_feed_moving_forward(tmp_path):
+    path = str(tmp_path / "snapshot.db")
+    store = InMemoryStorage(snapshot_path=path, log_archive_dir=str(tmp_path / "logs"))
+    for i in range(3):
+        store.create_task(f"Task {i}", session_id="s")
+    store.dump_memory(path)
+    first = max_seq(path)
+    task_id = finish(store, "Finished after the first snapshot")
+    store.close()
+    second = max_seq(path)
+    assert second > first
+
+    # A reader that took the first snapshot's position only sees what changed since
+    conn = sqlite3.connect(path)
+    changed = {entity_id for entity_id, in conn.execute("SELECT entity_id FROM changes WHERE seq > ? AND entity = 'task'", (first,))}
+    conn.close()
+    assert changed == {task_id}
+
+    # Resuming from the snapshot carries on from its position instead of renumbering the rows
+    resumed = InMemoryStorage(snapshot_path=path, log_archive_dir=str(tmp_path / "logs"))
+    resumed.create_task("Task after resume", session_id="s")
+    resumed.close()
+    assert max_seq(path) == second + 1
+
+def run_main(tmp_path, *args):
+    return subprocess.run([sys.executable, os.path.join(ROOT, "main.py"), *args], cwd=tmp_path,
+                          capture_output=True, text=True, timeout=30)
+
+def test_memory_engine_refuses_to_snapshot_over_the_shared_database(tmp_path):
+    shared = tmp_path / "hive_memory.db"
+    store = SharedMemory(str(shared), write_behind=False, log_archive_dir=str(tmp_path / "logs"))
+    store.create_task("Written by a script", session_id="s")
+    store.close()
+
+    result = run_main(tmp_path, "--storage", "memory", "--db", "hive_memory.db")
+    assert result.returncode == 2
+    assert "file of its own" in result.stderr
+    result = run_main(tmp_path, "--storage", "memory", "--db", str(shared), "--clock", "simulated")
+    assert result.returncode == 2
+
+    store = SharedMemory(str(shared), write_behind=False, log_archive_dir=str(tmp_path / "logs"))
+    assert [row[DESCRIPTION] for row in store.get_session_tasks("s")] == ["Written by a script"]
+    store.close()
@@ -1,10 +1,10 @@
-import sqlite3
 import time
+from hive_core import connect
 
 DB_PATH = "hive_memory.db"
 
 def check_status():
-    conn = sqlite3.connect(DB_PATH)
+    conn = connect(DB_PATH)
     cursor = conn.cursor()
     
     print("\n=== ALIEN SIGNAL SCENARIO STATUS ===")
@@ -1,10 +1,15 @@
-import time
 import random
 import json
 import os
-from hive_core import BaseAgent, Message, MessageType
+import metrics
+from hive_core import BaseAgent, Message, MessageType, TaskCancelled
 
 class WorkerAgent(BaseAgent):
+    # Set by AgentFactory to an execution.ProcessPool to run perform_work out of process
+    pool = None
+    # Randomness for the current task (durations, failures); per-task and seeded when the clock has a seed
+    rng = random
+
     def process_message(self, message: Message):
         if message.msg_type == MessageType.TASK_ASSIGNMENT:
             self.handle_task(message)
@@ -12,91 +17,111 @@ class WorkerAgent(BaseAgent):
     def handle_task(self, message: Message):
         task = message.content
         self.log("TASK_STARTED", f"Started task: {task['description']}")
-        
-        # Check for global pause
-        while self.memory.get_system_state("status", self.session_id) == "PAUSED":
-            time.sleep(1)
-        
+        if self.pool is not None:
+            # Process-hosted: the pool calls finish_task when the work comes back
+            self.pool.submit(self, message)
+            return
+        self.finish_task(message, self.run_task(task))
+
+    def run_task(self, task):
+        # Runs perform_work and returns the TASK_RESULT content; may run in a pool process
+        # A retry gets fresh draws; a first run keeps the plain task-id key
+        self.rng = self.clock.rng(f"{task['id']}:{task['attempts']}" if task.get('attempts') else task['id'])
         try:
+            # Honour a session pause before starting; perform_work checks again between steps
+            self.control.checkpoint()
             # Simulate work with progress
             result_data = self.perform_work(task)
             
             # If perform_work returns a dict with output_path, use it
-            output_path = None
             if isinstance(result_data, dict) and "output_path" in result_data:
-                output_path = result_data["output_path"]
-                result = result_data["status"]
-            else:
-                result = str(result_data)
+                return {"task_id": task['id'], "status": "COMPLETED", "result": result_data["status"], "output_path": result_data["output_path"]}
+            return {"task_id": task['id'], "status": "COMPLETED", "result": str(result_data)}
+        except TaskCancelled as e:
+            return {"task_id": task['id'], "status": "CANCELLED", "error": str(e)}
+        except Exception as e:
+            return {"task_id": task['id'], "status": "FAILED", "error": str(e)}
 
-            self.memory.complete_task(task['id'], result)
+    def finish_task(self, message: Message, outcome):
+        task = message.content
+        status = outcome["status"]
+        metrics.TASKS_FINISHED.inc(labels=(self.role, status))
+        if status == "COMPLETED":
+            output_path = outcome.pop("output_path", None)
+            self.memory.complete_task(task['id'], outcome["result"])
             if output_path:
                 self.memory.update_task_progress(task['id'], 100, output_path)
             else:
                 self.memory.update_task_progress(task['id'], 100)
-                
-            self.send_message(message.sender_id, MessageType.TASK_RESULT, {
-                "task_id": task['id'],
-                "status": "COMPLETED",
-                "result": result
-            })
+            self.send_message(message.sender_id, MessageType.TASK_RESULT, outcome)
             self.log("TASK_COMPLETED", f"Completed task: {task['description']}")
-        except Exception as e:
-            self.log("TASK_FAILED", f"Failed task: {str(e)}")
-            self.send_message(message.sender_id, MessageType.TASK_RESULT, {
-                "task_id": task['id'],
-                "status": "FAILED",
-                "error": str(e)
-            })
+        elif status == "CANCELLED":
+            self.log("TASK_CANCELLED", f"Cancelled task: {outcome['error']}")
+            self.send_message(message.sender_id, MessageType.TASK_RESULT, outcome)
+        else:
+            self.log("TASK_FAILED", f"Failed task: {outcome['error']}")
+            self.send_message(message.sender_id, MessageType.TASK_RESULT, outcome)
 
-    def perform_work(self, task):
-        # Default implementation
-        duration = random.uniform(2.0, 5.0)
-        steps = 5
+    def simulate_progress(self, task, steps=5):
+        # Spread a random duration over `steps`, reporting progress and
+        # honouring pause/cancel between steps
+        duration = self.rng.uniform(2.0, 5.0)
         for i in range(steps):
-            time.sleep(duration / steps)
+            self.control.checkpoint()
+            self.clock.sleep(duration / steps)
             progress = int(((i + 1) / steps) * 100)
             self.memory.update_task_progress(task['id'], progress)
+
+    def perform_work(self, task):
+        # Default implementation
+        self.simulate_progress(task)
         return f"Executed {task['description']}"
 
 class ArchitectAgent(WorkerAgent):
+    capabilities = ["design", "architect", "layout", "topolog", "blueprint", "schema", "ui"]
+
     def perform_work(self, task):
         super().perform_work(task)
         return f"Designed architecture for {task['description']}"
 
 class CoderAgent(WorkerAgent):
+    capabilities = ["code", "implement", "build", "develop", "program", "refactor", "optimiz", "fix", "algorithm", "backend", "api", "integrat"]
+
     def perform_work(self, task):
         super().perform_work(task)
-        if random.random() < 0.1: raise Exception("Syntax Error in generated code")
+        if self.rng.random() < 0.1: raise Exception("Syntax Error in generated code")
         return f"Wrote code for {task['description']}"
 
 class TesterAgent(WorkerAgent):
+    capabilities = ["test", "verif", "validat", "qa", "audit", "security", "check"]
+
     def perform_work(self, task):
         super().perform_work(task)
         return f"Tested {task['description']} - All tests passed"
 
 class AnalystAgent(WorkerAgent):
+    capabilities = ["analy", "assess", "evaluat", "requirement", "data", "performance", "benchmark", "profil"]
+
     def perform_work(self, task):
         super().perform_work(task)
         return f"Analyzed requirements for {task['description']}"
 
 class ResearcherAgent(WorkerAgent):
+    capabilities = ["research", "investigat", "explor", "survey", "gather", "insight", "literature", "competitor"]
+
     def perform_work(self, task):
         super().perform_work(task)
-        if random.random() < 0.1: raise Exception("Source unavailable")
+        if self.rng.random() < 0.1: raise Exception("Source unavailable")
         return f"Gathered insights on {task['description']}"
 
 class VisualizationAgent(WorkerAgent):
+    capabilities = ["visual", "plot", "chart", "graph", "render", "heatmap", "spectrogram", "diagram", "3d", "dashboard"]
+
     def perform_work(self, task):
         # Simulate rendering with progress
-        duration = random.uniform(2.0, 5.0)
-        steps = 5
-        for i in range(steps):
-            time.sleep(duration / steps)
-            progress = int(((i + 1) / steps) * 100)
-            self.memory.update_task_progress(task['id'], progress)
+        self.simulate_progress(task)
             
-        if random.random() < 0.1: raise Exception("Rendering artifact")
+        if self.rng.random() < 0.1: raise Exception("Rendering artifact")
         
         # Generate dummy artifact
         filename = f"plot_{task['id']}.svg"
@@ -106,7 +131,7 @@ class VisualizationAgent(WorkerAgent):
         filepath = os.path.join(output_dir, filename)
         
         # Create a simple SVG
-        color = random.choice(["red", "green", "blue", "orange", "purple"])
+        color = self.rng.choice(["red", "green", "blue", "orange", "purple"])
         svg_content = f'''<svg width="200" height="200" xmlns="http://www.w3.org/2000/svg">
             <rect width="100%" height="100%" fill="#eee" />
             <circle cx="100" cy="100" r="80" fill="{color}" />
@@ -119,17 +144,23 @@ class VisualizationAgent(WorkerAgent):
         return {"status": "Visualized Data", "output_path": filepath}
 
 class StatisticianAgent(WorkerAgent):
+    capabilities = ["statistic", "regress", "varian", "deviation", "probabilit", "distribution", "correlat", "calculat", "r0"]
+
     def perform_work(self, task):
         super().perform_work(task)
-        if random.random() < 0.1: raise Exception("Statistical anomaly")
+        if self.rng.random() < 0.1: raise Exception("Statistical anomaly")
         return f"Performed statistical analysis on {task['description']}"
 
 class DocumentationAgent(WorkerAgent):
+    capabilities = ["document", "report", "guideline", "reproducib", "manual", "readme"]
+
     def perform_work(self, task):
         super().perform_work(task)
         return f"Created reproducible documentation for {task['description']} (Coordinated with CitationAgent)"
 
 class CitationAgent(WorkerAgent):
+    capabilities = ["cite", "citation", "referenc", "bibliograph", "source"]
+
     def perform_work(self, task):
         # Strict Verification Protocol
         steps = [
@@ -140,13 +171,9 @@ class CitationAgent(WorkerAgent):
             "5. LINK: Attaching source URL..."
         ]
         
-        duration = random.uniform(2.0, 5.0)
-        for i, step in enumerate(steps):
-            time.sleep(duration / len(steps))
-            progress = int(((i + 1) / len(steps)) * 100)
-            self.memory.update_task_progress(task['id'], progress)
+        self.simulate_progress(task, len(steps))
             
-        if random.random() < 0.1: raise Exception("Verification failed: Source not found")
+        if self.rng.random() < 0.1: raise Exception("Verification failed: Source not found")
         # Simulated Vancouver Citation
         citation = f"Author AA, Author BB. Study on {task['description']}. J Sci Res. 2024;1(1):1-10. doi:10.1234/example"
         return "\n".join(steps) + f"\nRESULT: {citation}"